@@ -2,6 +2,6 @@
 Pydantic AI agents
 """
 
-from .medical_agent import medical_agent
+from .medical_agent import build_medical_agent, get_medical_agent, run_medical_agent
 
-__all__ = ["medical_agent"]
+__all__ = ["build_medical_agent", "get_medical_agent", "run_medical_agent"]
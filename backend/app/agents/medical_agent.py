@@ -2,19 +2,17 @@
 Medical AI Agent using Pydantic AI
 """
 
-from pydantic_ai import Agent
+from functools import lru_cache
+from typing import TYPE_CHECKING, Union
 from loguru import logger
 
 from app.config import settings
-from .tools import (
-    MedicalContext,
-    get_medications,
-    add_medication,
-    get_appointments,
-    schedule_appointment,
-    log_health_metric,
-    get_health_trends
-)
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+    from pydantic_ai.models import Model
+
+MODEL = 'groq:llama-3.3-70b-versatile'
 
 # System prompt for the medical agent
 SYSTEM_PROMPT = """You are a helpful medical management assistant named MediBot.
@@ -32,33 +30,75 @@ IMPORTANT GUIDELINES:
 3. Be empathetic, clear, and use simple language
 4. Never diagnose conditions - only provide general information
 5. Respect user privacy and handle medical data carefully
+6. When adding a medication returns interaction_warnings, tell the user about each one and suggest confirming with their doctor or pharmacist
+7. When logging a health metric returns alerts, tell the user; for critical alerts advise contacting a doctor promptly or emergency services if they feel unwell
 
 You have access to tools to:
 - View and add medications
+- Check a drug for interactions with the user's active medications
+- List upcoming medication doses (reminders)
+- Report medication adherence (doses taken, missed, streaks)
 - View and schedule appointments
 - Log health metrics
+- List alerts raised for readings that are out of range or unusual for the user
 - Analyze health trends
+- Search medications, appointments and health notes by name, doctor, specialty, location or notes
+- Find the notes most relevant to a question (what the user wrote about symptoms, doctor advice, side effects)
 
-When users ask about their medical data, use the appropriate tools to fetch and display the information.
+When users ask about their medical data, use the appropriate tools to fetch and display the information. To find a particular record, search for it rather than listing everything. When a question may be answered by something the user noted down, search their notes first.
 
 MEDICAL DISCLAIMER: This assistant is for informational purposes only and should not replace professional medical advice, diagnosis, or treatment. Always consult with a qualified healthcare provider for medical concerns.
 """
 
-# Initialize the medical agent with updated Groq model
-medical_agent = Agent(
-    model='groq:llama-3.3-70b-versatile',  # Updated to current model
-    deps_type=MedicalContext,
-    system_prompt=SYSTEM_PROMPT,
-    tools=[
+@lru_cache(maxsize=1)
+def get_medical_agent() -> "Agent":
+    """
+    Build the medical agent on first use
+    
+    pydantic-ai and the Groq client are slow to import and the model needs
+    GROQ_API_KEY, so nothing here runs at import time.
+    """
+    return build_medical_agent(MODEL)
+
+def build_medical_agent(model: Union["Model", str]) -> "Agent":
+    """The medical agent's prompt and tools on `model` (evaluations pass a recording or replaying one)"""
+    from pydantic_ai import Agent
+    from .tools import (
+        MedicalContext,
         get_medications,
         add_medication,
+        check_drug_interactions,
+        get_dose_reminders,
+        get_medication_adherence,
         get_appointments,
         schedule_appointment,
         log_health_metric,
-        get_health_trends
-    ],
-    retries=2
-)
+        get_health_alerts,
+        get_health_trends,
+        search_records,
+        search_notes
+    )
+    
+    return Agent(
+        model=model,
+        deps_type=MedicalContext,
+        system_prompt=SYSTEM_PROMPT,
+        tools=[
+            get_medications,
+            add_medication,
+            check_drug_interactions,
+            get_dose_reminders,
+            get_medication_adherence,
+            get_appointments,
+            schedule_appointment,
+            log_health_metric,
+            get_health_alerts,
+            get_health_trends,
+            search_records,
+            search_notes
+        ],
+        retries=2
+    )
 
 async def run_medical_agent(user_id: str, user_name: str, message: str) -> str:
     """
@@ -73,12 +113,14 @@ async def run_medical_agent(user_id: str, user_name: str, message: str) -> str:
         Agent's response
     """
     try:
+        from .tools import MedicalContext
+        
         context = MedicalContext(
             user_id=user_id,
             user_name=user_name
         )
         
-        result = await medical_agent.run(
+        result = await get_medical_agent().run(
             message,
             deps=context
         )
@@ -86,5 +128,5 @@ async def run_medical_agent(user_id: str, user_name: str, message: str) -> str:
         return result.data
         
     except Exception as e:
-        logger.error(f"Error running medical agent: {e}")
+        logger.error("Error running medical agent: {}", e)
         return "I'm having trouble processing your request right now. Please try again in a moment."
@@ -3,12 +3,21 @@ Tools for the medical AI agent
 """
 
 from typing import List, Dict, Any
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 from loguru import logger
 from pydantic_ai import RunContext
 from pydantic import BaseModel
 
+from app.services.adherence import adherence_summary
+from app.services.anomaly import anomaly_detector
+from app.services.appointment_index import appointment_index, to_utc
+from app.services.changes import record_changed, MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
 from app.services.database import supabase
+from app.services.dose_scheduler import dose_scheduler
+from app.services.interactions import interaction_warnings
+from app.services.notes_index import notes_index
+from app.services.query_cache import medications, upcoming_appointments, health_metrics
+from app.services.search_index import search_index
 
 # Define MedicalContext here to avoid circular import
 class MedicalContext(BaseModel):
@@ -24,13 +33,9 @@ async def get_medications(ctx: RunContext[MedicalContext]) -> List[Dict[str, Any
         List of active medications
     """
     try:
-        response = supabase.table('medications').select('*').eq(
-            'user_id', ctx.deps.user_id
-        ).eq('active', True).execute()
-        
-        return response.data if response.data else []
+        return await medications(ctx.deps.user_id)
     except Exception as e:
-        logger.error(f"Error fetching medications: {e}")
+        logger.error("Error fetching medications: {}", e)
         return []
 
 async def add_medication(
@@ -52,9 +57,12 @@ async def add_medication(
         notes: Additional notes
         
     Returns:
-        Created medication record
+        Created medication record, with any interactions with the user's
+        other active medications under 'interaction_warnings'
     """
     try:
+        warnings = await interaction_warnings(ctx.deps.user_id, name)
+        
         medication_data = {
             'user_id': ctx.deps.user_id,
             'name': name,
@@ -66,11 +74,99 @@ async def add_medication(
         }
         
         response = supabase.table('medications').insert(medication_data).execute()
-        return response.data[0] if response.data else {}
+        if not response.data:
+            return {}
+        
+        record_changed(ctx.deps.user_id, MEDICATIONS, response.data[0])
+        return {**response.data[0], 'interaction_warnings': warnings}
     except Exception as e:
-        logger.error(f"Error adding medication: {e}")
+        logger.error("Error adding medication: {}", e)
         return {"error": str(e)}
 
+async def check_drug_interactions(
+    ctx: RunContext[MedicalContext],
+    medication_name: str
+) -> List[Dict[str, Any]]:
+    """
+    Check a drug against the user's active medications for known interactions
+    
+    Args:
+        medication_name: Drug name (generic or brand, e.g. "ibuprofen" or "Advil")
+        
+    Returns:
+        Interactions found, most severe first (empty if none are known)
+    """
+    try:
+        return await interaction_warnings(ctx.deps.user_id, medication_name)
+    except Exception as e:
+        logger.error("Error checking drug interactions: {}", e)
+        return [{"error": str(e)}]
+
+async def get_dose_reminders(
+    ctx: RunContext[MedicalContext],
+    hours: int = 24
+) -> List[Dict[str, Any]]:
+    """
+    Get the user's upcoming medication doses
+    
+    Args:
+        hours: How many hours ahead to look
+        
+    Returns:
+        List of upcoming doses ordered by due time
+    """
+    now = datetime.now()
+    doses = dose_scheduler.upcoming(ctx.deps.user_id, now + timedelta(hours=hours), now)
+    
+    return [
+        {
+            'medication': dose.name,
+            'dosage': dose.dosage,
+            'due_at': dose.due_at.isoformat()
+        }
+        for dose in doses
+    ]
+
+async def get_medication_adherence(
+    ctx: RunContext[MedicalContext],
+    medication_name: str = "",
+    days: int = 30
+) -> List[Dict[str, Any]]:
+    """
+    Get how consistently the user has taken their medications
+    
+    Args:
+        medication_name: Only report medications whose name contains this text
+        days: Number of days to look back
+        
+    Returns:
+        Adherence percentage, streaks and missed doses per medication
+    """
+    try:
+        to_date = date.today()
+        from_date = to_date - timedelta(days=max(days, 1) - 1)
+        summaries = []
+        for medication in await medications(ctx.deps.user_id):
+            if medication_name and medication_name.lower() not in medication['name'].lower():
+                continue
+            summary = await adherence_summary(medication, from_date, to_date)
+            summaries.append({
+                'medication': medication['name'],
+                'adherence_percent': summary['adherence'],
+                'doses_expected': summary['expected'],
+                'doses_taken': summary['taken'],
+                'doses_missed': summary['missed'],
+                'doses_unrecorded': summary['unrecorded'],
+                'current_streak': summary['current_streak'],
+                'longest_streak': summary['longest_streak'],
+                'missed_doses': [missed.isoformat() for missed in summary['missed_doses']],
+            })
+        
+        return summaries
+    except Exception as e:
+        logger.error("Error fetching medication adherence: {}", e)
+        return []
+
 async def get_appointments(ctx: RunContext[MedicalContext]) -> List[Dict[str, Any]]:
     """
     Get user's upcoming appointments
@@ -79,15 +175,9 @@ async def get_appointments(ctx: RunContext[MedicalContext]) -> List[Dict[str, An
         List of scheduled appointments
     """
     try:
-        response = supabase.table('appointments').select('*').eq(
-            'user_id', ctx.deps.user_id
-        ).eq('status', 'scheduled').gte(
-            'date_time', datetime.now().isoformat()
-        ).order('date_time').execute()
-        
-        return response.data if response.data else []
+        return await upcoming_appointments(ctx.deps.user_id)
     except Exception as e:
-        logger.error(f"Error fetching appointments: {e}")
+        logger.error("Error fetching appointments: {}", e)
         return []
 
 async def schedule_appointment(
@@ -112,6 +202,11 @@ async def schedule_appointment(
         Created appointment record
     """
     try:
+        index = await appointment_index.for_user(ctx.deps.user_id)
+        conflicting_id = index.conflict(to_utc(date_time))
+        if conflicting_id:
+            return {"error": f"This time overlaps existing appointment {conflicting_id}"}
+        
         appointment_data = {
             'user_id': ctx.deps.user_id,
             'doctor_name': doctor_name,
@@ -123,9 +218,13 @@ async def schedule_appointment(
         }
         
         response = supabase.table('appointments').insert(appointment_data).execute()
-        return response.data[0] if response.data else {}
+        if not response.data:
+            return {}
+        
+        record_changed(ctx.deps.user_id, APPOINTMENTS, response.data[0])
+        return response.data[0]
     except Exception as e:
-        logger.error(f"Error scheduling appointment: {e}")
+        logger.error("Error scheduling appointment: {}", e)
         return {"error": str(e)}
 
 async def log_health_metric(
@@ -145,7 +244,8 @@ async def log_health_metric(
         notes: Additional notes
         
     Returns:
-        Created health metric record
+        Created health metric record, with any alerts the reading raised
+        (out of clinical range or unusual for the user) under 'alerts'
     """
     try:
         metric_data = {
@@ -158,11 +258,53 @@ async def log_health_metric(
         }
         
         response = supabase.table('health_metrics').insert(metric_data).execute()
-        return response.data[0] if response.data else {}
+        if not response.data:
+            return {}
+        
+        alerts = await anomaly_detector.observe(ctx.deps.user_id, response.data[0])
+        
+        record_changed(ctx.deps.user_id, HEALTH_METRICS, response.data[0])
+        return {
+            **response.data[0],
+            'alerts': [
+                {'severity': alert['severity'], 'message': alert['message']}
+                for alert in alerts
+            ]
+        }
     except Exception as e:
-        logger.error(f"Error logging health metric: {e}")
+        logger.error("Error logging health metric: {}", e)
         return {"error": str(e)}
 
+async def get_health_alerts(
+    ctx: RunContext[MedicalContext],
+    include_acknowledged: bool = False,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Get alerts raised for the user's health readings
+    
+    Args:
+        include_acknowledged: Also return alerts the user has already seen
+        limit: Maximum number of alerts
+        
+    Returns:
+        Alerts, newest first (severity, message and when the reading was taken)
+    """
+    try:
+        query = supabase.table('health_alerts').select(
+            'metric_type, severity, reason, message, recorded_at, acknowledged'
+        ).eq('user_id', ctx.deps.user_id)
+        
+        if not include_acknowledged:
+            query = query.eq('acknowledged', False)
+        
+        response = query.order('created_at', desc=True).limit(max(1, min(limit, 100))).execute()
+        
+        return response.data if response.data else []
+    except Exception as e:
+        logger.error("Error fetching health alerts: {}", e)
+        return []
+
 async def get_health_trends(
     ctx: RunContext[MedicalContext],
     metric_type: str,
@@ -179,15 +321,93 @@ async def get_health_trends(
         List of health metrics
     """
     try:
-        from_date = (datetime.now() - timedelta(days=days)).isoformat()
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        
+        # Fetched from the start of the hour, so calls within the hour share a cache entry
+        rows = await health_metrics(ctx.deps.user_id, metric_type, since.replace(minute=0, second=0, microsecond=0))
+        # Cached newest first; trends read oldest first
+        return [row for row in reversed(rows) if to_utc(row['recorded_at']) >= since]
+    except Exception as e:
+        logger.error("Error fetching health trends: {}", e)
+        return []
+
+async def search_records(
+    ctx: RunContext[MedicalContext],
+    query: str,
+    kind: str = "",
+    limit: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Search the user's medications, appointments and health metric notes
+    
+    Use this to find a specific record (e.g. "that cardiology visit" or a
+    medication by partial or misspelled name) instead of listing everything.
+    
+    Args:
+        query: Words to look for (names, specialties, locations, notes)
+        kind: Optionally only "medication", "appointment" or "health_metric"
+        limit: Maximum number of results
+        
+    Returns:
+        Matching records, best match first
+    """
+    try:
+        results = await search_index.search(
+            ctx.deps.user_id,
+            query,
+            limit=max(1, min(limit, 50)),
+            kinds=[kind] if kind else None
+        )
         
-        response = supabase.table('health_metrics').select('*').eq(
-            'user_id', ctx.deps.user_id
-        ).eq('metric_type', metric_type).gte(
-            'recorded_at', from_date
-        ).order('recorded_at').execute()
+        return [
+            {
+                'kind': document.kind,
+                'id': document.id,
+                'title': document.title,
+                'details': document.subtitle,
+                'date': document.when.isoformat() if document.when else None,
+                'score': score
+            }
+            for document, score in results
+        ]
+    except Exception as e:
+        logger.error("Error searching records: {}", e)
+        return []
+
+async def search_notes(
+    ctx: RunContext[MedicalContext],
+    query: str,
+    limit: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Find the user's notes most relevant to a question
+    
+    Searches the free-text notes on medications, appointments and health
+    metrics by meaning of the words used (e.g. "what did the cardiologist
+    say about exercise", "dizziness after taking pills"), so you can use
+    what the user wrote down without listing every record.
+    
+    Args:
+        query: A question or description of what to look for
+        limit: Maximum number of notes (default 5)
         
-        return response.data if response.data else []
+    Returns:
+        The most relevant notes with the record they belong to, best first
+    """
+    try:
+        results = await notes_index.search(ctx.deps.user_id, query, limit=max(1, min(limit, 20)))
+        
+        return [
+            {
+                'kind': note.kind,
+                'id': note.id,
+                'record': note.title,
+                'date': note.when.isoformat() if note.when else None,
+                'snippet': text,
+                'similarity': similarity
+            }
+            for note, similarity, text in results
+        ]
     except Exception as e:
-        logger.error(f"Error fetching health trends: {e}")
+        logger.error("Error searching notes: {}", e)
         return []
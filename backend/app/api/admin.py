@@ -0,0 +1,50 @@
+"""
+Admin API routes (clinic administrators only)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from loguru import logger
+
+from app.models.job import Job
+from app.services.auth_service import require_admin
+from app.services.compression import compressed_cache
+from app.services.database import db_breaker
+from app.services.jobs import job_queue
+from app.services.metric_partitions import ARCHIVE_HEALTH_METRICS
+from app.services.query_cache import query_cache
+from app.services.singleflight import read_coalescer
+
+router = APIRouter()
+
+@router.get("/cache")
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    """Query cache hits, misses, evictions and size for the worker process that answers"""
+    return query_cache.stats()
+
+@router.get("/coalescing")
+async def get_coalescing_stats(current_user: dict = Depends(require_admin)):
+    """How many concurrent identical reads shared a database call, for the worker process that answers"""
+    return read_coalescer.stats()
+
+@router.get("/compression")
+async def get_compression_stats(current_user: dict = Depends(require_admin)):
+    """Responses compressed, bytes saved and compressed-body cache hits for the worker process that answers"""
+    return compressed_cache.stats()
+
+@router.get("/database")
+async def get_database_stats(current_user: dict = Depends(require_admin)):
+    """The database circuit breaker's state and counts, for the worker process that answers"""
+    return db_breaker.stats()
+
+@router.post("/health-metrics/archive", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def archive_health_metrics(current_user: dict = Depends(require_admin)):
+    """Start a job moving months of readings past the retention window to the columnar archive"""
+    try:
+        return await job_queue.enqueue(ARCHIVE_HEALTH_METRICS, current_user['id'])
+        
+    except Exception as e:
+        logger.error("Error starting health metric archival: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to start archival"
+        )
@@ -2,17 +2,24 @@
 Appointments API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from loguru import logger
 import uuid
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
 
-from app.models.appointment import Appointment, AppointmentCreate, AppointmentUpdate
+from app.models.appointment import Appointment, AppointmentCreate, AppointmentUpdate, FreeSlot
+from app.models.sync import SyncChanges
+from app.services.appointment_index import appointment_index, to_utc
 from app.services.auth_service import get_current_user
+from app.services.changes import record_changed, record_deleted, APPOINTMENTS
 from app.services.database import supabase
+from app.services.query_cache import appointments as cached_appointments
+from app.services.serialization import MsgPackRoute, list_response
+from app.services.sync import SyncExpired, changes as sync_changes, sync_response
+from app.services.versioning import conditional_get
 
-router = APIRouter()
+router = APIRouter(route_class=MsgPackRoute)
 
 def serialize_dates(data: dict) -> dict:
     """Convert date/time objects to ISO format strings"""
@@ -24,25 +31,102 @@ def serialize_dates(data: dict) -> dict:
             serialized[key] = value.isoformat()
     return serialized
 
+async def ensure_no_conflict(user_id: str, date_time: datetime, exclude_id: Optional[str] = None):
+    """Raise 409 if the slot starting at date_time overlaps another scheduled appointment"""
+    index = await appointment_index.for_user(user_id)
+    conflicting_id = index.conflict(to_utc(date_time), exclude_id)
+    
+    if conflicting_id:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Appointment overlaps existing appointment {conflicting_id}"
+        )
+
 @router.get("/", response_model=List[Appointment])
 async def get_appointments(
+    request: Request,
+    response: Response,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get user's appointments"""
+    """Get user's appointments, optionally within a date range"""
+    not_modified = conditional_get(request, response, current_user['id'], APPOINTMENTS, from_time, to_time)
+    if not_modified:
+        return not_modified
+    
     try:
-        response = supabase.table('appointments').select('*').eq(
-            'user_id', current_user['id']
-        ).order('date', desc=False).execute()
+        rows = await cached_appointments(current_user['id'], from_time, to_time)
         
-        return response.data if response.data else []
+        return list_response(request, rows, Appointment, response)
         
     except Exception as e:
-        logger.error(f"Error fetching appointments: {e}")
+        logger.error("Error fetching appointments: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch appointments"
         )
 
+@router.get("/sync", response_model=SyncChanges[Appointment])
+async def sync_appointments(
+    request: Request,
+    since: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get appointments changed and deleted since the previous sync (`since` is its cursor; omit it for all appointments)"""
+    try:
+        page = await sync_changes(current_user['id'], APPOINTMENTS, since)
+        
+        return sync_response(request, page, Appointment)
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except SyncExpired as e:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"{e}; sync again without a cursor"
+        )
+    except Exception as e:
+        logger.error("Error syncing appointments: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to sync appointments"
+        )
+
+@router.get("/free-slots", response_model=List[FreeSlot])
+async def get_free_slots(
+    from_time: datetime = Query(..., alias="from"),
+    to_time: datetime = Query(..., alias="to"),
+    duration_minutes: Optional[int] = Query(None, ge=5, le=24 * 60),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get gaps between the user's scheduled appointments within a time window"""
+    start, end = to_utc(from_time), to_utc(to_time)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'to' must be after 'from'"
+        )
+    
+    try:
+        index = await appointment_index.for_user(current_user['id'])
+        length = timedelta(minutes=duration_minutes) if duration_minutes else None
+        
+        return [
+            FreeSlot(start=slot_start, end=slot_end)
+            for slot_start, slot_end in index.free_slots(start, end, length)
+        ]
+        
+    except Exception as e:
+        logger.error("Error computing free slots: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compute free slots"
+        )
+
 @router.post("/", response_model=Appointment, status_code=status.HTTP_201_CREATED)
 async def create_appointment(
     appointment: AppointmentCreate,
@@ -50,6 +134,8 @@ async def create_appointment(
 ):
     """Create a new appointment"""
     try:
+        await ensure_no_conflict(current_user['id'], appointment.date_time)
+        
         appointment_dict = appointment.dict()
         
         # Convert dates/times to ISO strings
@@ -68,12 +154,14 @@ async def create_appointment(
                 detail="Failed to create appointment"
             )
         
+        record_changed(current_user['id'], APPOINTMENTS, response.data[0])
+        
         return response.data[0]
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating appointment: {e}")
+        logger.error("Error creating appointment: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create appointment: {str(e)}"
@@ -102,16 +190,23 @@ async def update_appointment(
         update_dict = appointment_update.dict(exclude_unset=True)
         update_data = serialize_dates(update_dict)
         
+        # Re-check for double-booking when the result is a scheduled appointment
+        merged = {**existing.data[0], **update_data}
+        if merged.get('status', 'scheduled') == 'scheduled':
+            await ensure_no_conflict(current_user['id'], to_utc(merged['date_time']), appointment_id)
+        
         response = supabase.table('appointments').update(update_data).eq(
             'id', appointment_id
         ).execute()
         
+        record_changed(current_user['id'], APPOINTMENTS, response.data[0])
+        
         return response.data[0]
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating appointment: {e}")
+        logger.error("Error updating appointment: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update appointment"
@@ -138,10 +233,12 @@ async def delete_appointment(
         # Delete
         supabase.table('appointments').delete().eq('id', appointment_id).execute()
         
+        record_deleted(current_user['id'], APPOINTMENTS, appointment_id)
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting appointment: {e}")
+        logger.error("Error deleting appointment: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete appointment"
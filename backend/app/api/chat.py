@@ -33,7 +33,7 @@ async def chat(
         return ChatResponse(response=response)
         
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.error("Chat error: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process chat message"
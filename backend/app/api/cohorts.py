@@ -0,0 +1,105 @@
+"""
+Cohort analytics API routes (clinic administrators only)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional, Tuple
+from loguru import logger
+from datetime import datetime, timedelta, timezone
+
+from app.models.cohort import ThresholdShare, CohortDistribution
+from app.models.health_metric import MetricType
+from app.services.auth_service import require_admin
+
+router = APIRouter()
+
+# Window used when `from` is not given
+DEFAULT_WEEKS = 12
+
+def _window(start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """[start, end) in UTC; naive times are taken as UTC"""
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = start or end - timedelta(weeks=DEFAULT_WEEKS)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="from must be before to"
+        )
+    
+    return start, end
+
+@router.get("/threshold-share", response_model=ThresholdShare)
+async def get_threshold_share(
+    metric_type: MetricType,
+    channel: Optional[str] = None,
+    threshold: Optional[float] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Share of patients whose mean reading in the window is at or above a threshold
+    
+    E.g. `metric_type=blood_pressure&channel=systolic&threshold=140`. The
+    channel defaults to the metric's first (systolic for blood pressure), the
+    threshold to the channel's clinical high threshold and the window to the
+    last 12 weeks.
+    """
+    start, end = _window(start, end)
+    
+    try:
+        # Imported on first use: it loads NumPy, which would slow down startup
+        from app.services import cohorts
+        
+        return await cohorts.threshold_share(metric_type.value, channel, threshold, start, end)
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error computing threshold share: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compute threshold share"
+        )
+
+@router.get("/weekly-distribution", response_model=CohortDistribution)
+async def get_weekly_distribution(
+    metric_type: MetricType,
+    channel: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Readings, mean and 10th-90th percentiles per week (weeks start on Monday, UTC)
+    
+    Percentiles come from fixed-width histogram bins (1 mmHg for blood
+    pressure, 2 mg/dL for blood sugar), so they are exact to within one bin.
+    """
+    start, end = _window(start, end)
+    
+    try:
+        # Imported on first use: it loads NumPy, which would slow down startup
+        from app.services import cohorts
+        
+        return await cohorts.weekly_distribution(metric_type.value, channel, start, end)
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error computing weekly distribution: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compute weekly distribution"
+        )
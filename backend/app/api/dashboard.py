@@ -0,0 +1,76 @@
+"""
+Dashboard API routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from loguru import logger
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.dashboard import Dashboard
+from app.models.health_metric import MetricType
+from app.models.medication import DoseReminder
+from app.services.auth_service import get_current_user
+from app.services.database import supabase, execute
+from app.services.dose_scheduler import dose_scheduler
+from app.services.query_cache import medications, upcoming_appointments
+
+router = APIRouter()
+
+@router.get("/", response_model=Dashboard)
+async def get_dashboard(
+    appointments_limit: int = Query(5, ge=1, le=50),
+    doses_hours: int = Query(24, ge=1, le=24 * 14),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get everything the dashboard shows in one request"""
+    user_id = current_user['id']
+    
+    try:
+        metrics_count_query = supabase.table('health_metrics').select(
+            'id', count='exact'
+        ).eq('user_id', user_id).limit(1)
+        
+        latest_metric_queries = [
+            supabase.table('health_metrics').select('*').eq(
+                'user_id', user_id
+            ).eq('metric_type', metric_type.value).order('recorded_at', desc=True).limit(1)
+            for metric_type in MetricType
+        ]
+        
+        active_medications, appointments, metrics_count, *latest_metrics = await asyncio.gather(
+            medications(user_id),
+            upcoming_appointments(user_id, appointments_limit),
+            execute(metrics_count_query),
+            *(execute(query) for query in latest_metric_queries)
+        )
+        
+        now = datetime.now()
+        due_doses = dose_scheduler.upcoming(user_id, now + timedelta(hours=doses_hours), now)
+        
+        return Dashboard(
+            active_medications=active_medications,
+            upcoming_appointments=appointments,
+            latest_metrics={
+                metric_type.value: response.data[0]
+                for metric_type, response in zip(MetricType, latest_metrics)
+                if response.data
+            },
+            metrics_logged=metrics_count.count or 0,
+            due_doses=[
+                DoseReminder(
+                    medication_id=dose.medication_id,
+                    name=dose.name,
+                    dosage=dose.dosage,
+                    due_at=dose.due_at
+                )
+                for dose in due_doses
+            ]
+        )
+        
+    except Exception as e:
+        logger.error("Error fetching dashboard: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch dashboard"
+        )
@@ -0,0 +1,209 @@
+"""
+Documents API routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from typing import List, Optional
+from loguru import logger
+
+from app.config import settings
+from app.models.document import Document, DocumentCategory, DocumentUploaded
+from app.services.auth_service import get_current_user
+from app.services.changes import record_deleted, DOCUMENTS
+from app.services.database import supabase, execute
+from app.services.documents import document_store, receive_upload, save_upload
+from app.services.files import FileRangeResponse, content_disposition
+from app.services.serialization import list_response
+from app.services.versioning import etag_matches
+
+router = APIRouter()
+
+# Types browsers may display in place; anything else (HTML, SVG, ...) is downloaded
+INLINE_TYPES = {"application/pdf", "image/png", "image/jpeg", "image/gif", "image/webp", "text/plain"}
+
+async def _get_document(document_id: str, user_id: str) -> dict:
+    result = await execute(
+        supabase.table('documents').select('*').eq('id', document_id).eq('user_id', user_id)
+    )
+    
+    if not result.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    return result.data[0]
+
+@router.get("/", response_model=List[Document])
+async def get_documents(
+    request: Request,
+    category: Optional[DocumentCategory] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get user's documents, newest first"""
+    try:
+        query = supabase.table('documents').select('*').eq('user_id', current_user['id'])
+        
+        if category:
+            query = query.eq('category', category.value)
+        
+        result = await execute(query.order('created_at', desc=True))
+        
+        return list_response(request, result.data, Document)
+        
+    except Exception as e:
+        logger.error("Error fetching documents: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch documents"
+        )
+
+@router.post("/", response_model=DocumentUploaded, status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload a document as multipart/form-data
+    
+    Fields: `file` (required), `title`, `category` and `notes`. The file is
+    streamed to storage as it arrives. Re-uploading identical content returns
+    the existing document with `duplicate: true` and status 200.
+    """
+    upload = await receive_upload(request, document_store, settings.MAX_DOCUMENT_MB * 1024 * 1024)
+    
+    try:
+        category = DocumentCategory(upload.fields.get('category') or DocumentCategory.OTHER)
+    except ValueError:
+        upload.writer.discard()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"category must be one of: {', '.join(c.value for c in DocumentCategory)}"
+        )
+    
+    try:
+        document, duplicate = await save_upload(
+            current_user['id'],
+            upload,
+            title=upload.fields.get('title') or upload.filename,
+            category=category.value,
+            notes=upload.fields.get('notes') or None
+        )
+        
+        if duplicate:
+            response.status_code = status.HTTP_200_OK
+        
+        return {**document, 'duplicate': duplicate}
+        
+    except Exception as e:
+        upload.writer.discard()
+        logger.error("Error uploading document: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to upload document"
+        )
+
+@router.get("/{document_id}", response_model=Document)
+async def get_document(
+    document_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a document's details"""
+    try:
+        return await _get_document(document_id, current_user['id'])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching document: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch document"
+        )
+
+@router.api_route("/{document_id}/content", methods=["GET", "HEAD"], response_class=Response)
+async def download_document(
+    document_id: str,
+    request: Request,
+    download: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Download a document's file
+    
+    Supports `Range: bytes=start-end` (206 Partial Content), `If-Range` and
+    `If-None-Match`. PDFs, images and plain text are shown inline unless
+    `download=true`.
+    """
+    try:
+        document = await _get_document(document_id, current_user['id'])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching document: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch document"
+        )
+    
+    # Content never changes for a given hash, so it makes a strong ETag
+    etag = f'"{document["sha256"]}"'
+    headers = {"Cache-Control": "private, max-age=86400", "X-Content-Type-Options": "nosniff"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **headers})
+    
+    path = document_store.path(document['sha256'])
+    if not path.is_file():
+        logger.error("Document {} is missing its file {}", document_id, path)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document file not found"
+        )
+    
+    inline = not download and document['content_type'] in INLINE_TYPES
+    headers["Content-Disposition"] = content_disposition(document['filename'], inline)
+    
+    return FileRangeResponse(
+        str(path),
+        size=int(document['size_bytes']),
+        media_type=document['content_type'] if inline else "application/octet-stream",
+        request_headers=request.headers,
+        etag=etag,
+        headers=headers,
+        send_body=request.method != "HEAD"
+    )
+
+@router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(
+    document_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete a document (its file is removed once no document refers to it)"""
+    try:
+        document = await _get_document(document_id, current_user['id'])
+        
+        async with document_store.lock(document['sha256']):
+            await execute(
+                supabase.table('documents').delete().eq('id', document_id).eq('user_id', current_user['id'])
+            )
+            
+            remaining = await execute(
+                supabase.table('documents').select('id').eq('sha256', document['sha256']).limit(1)
+            )
+            if not remaining.data:
+                await document_store.remove(document['sha256'])
+        
+        record_deleted(current_user['id'], DOCUMENTS, document_id)
+        
+        return None
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error deleting document: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete document"
+        )
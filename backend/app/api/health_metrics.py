@@ -2,53 +2,151 @@
 Health Metrics API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from loguru import logger
+import asyncio
 import uuid
 from datetime import datetime
 
-from app.models.health_metric import HealthMetric, HealthMetricCreate
+from app.models.health_metric import HealthMetric, HealthMetricCreate, HealthMetricLogged, HealthAlert
+from app.models.sync import SyncChanges
+from app.services.anomaly import anomaly_detector
+from app.services.appointment_index import to_utc
 from app.services.auth_service import get_current_user
-from app.services.database import supabase
+from app.services.changes import record_changed, record_deleted, HEALTH_METRICS
+from app.services.database import supabase, execute
+from app.services.query_cache import health_metrics as cached_health_metrics
+from app.services.serialization import MsgPackRoute, list_response
+from app.services.sync import SyncExpired, changes as sync_changes, sync_response
+from app.services.versioning import conditional_get
 
-router = APIRouter()
+router = APIRouter(route_class=MsgPackRoute)
+
+# Readings per batch upload
+MAX_BATCH_READINGS = 1000
 
 @router.get("/", response_model=List[HealthMetric])
 async def get_health_metrics(
+    request: Request,
+    response: Response,
     metric_type: str = None,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get user's health metrics"""
+    """Get user's health metrics, newest first, optionally recorded within a date range"""
+    not_modified = conditional_get(request, response, current_user['id'], HEALTH_METRICS, metric_type, from_time, to_time)
+    if not_modified:
+        return not_modified
+    
     try:
-        query = supabase.table('health_metrics').select('*').eq('user_id', current_user['id'])
+        rows = await cached_health_metrics(current_user['id'], metric_type, from_time, to_time)
         
-        if metric_type:
-            query = query.eq('metric_type', metric_type)
+        return list_response(request, rows, HealthMetric, response)
         
-        response = query.order('recorded_at', desc=True).execute()
+    except Exception as e:
+        logger.error("Error fetching health metrics: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch health metrics"
+        )
+
+@router.get("/sync", response_model=SyncChanges[HealthMetric])
+async def sync_health_metrics(
+    request: Request,
+    since: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get readings logged and deleted since the previous sync (`since` is its cursor; omit it for all readings)"""
+    try:
+        page = await sync_changes(current_user['id'], HEALTH_METRICS, since)
         
-        return response.data if response.data else []
+        return sync_response(request, page, HealthMetric)
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except SyncExpired as e:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"{e}; sync again without a cursor"
+        )
     except Exception as e:
-        logger.error(f"Error fetching health metrics: {e}")
+        logger.error("Error syncing health metrics: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to fetch health metrics"
+            detail="Failed to sync health metrics"
+        )
+
+@router.get("/alerts", response_model=List[HealthAlert])
+async def get_health_alerts(
+    include_acknowledged: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get alerts raised for the user's readings, newest first"""
+    try:
+        query = supabase.table('health_alerts').select('*').eq('user_id', current_user['id'])
+        
+        if not include_acknowledged:
+            query = query.eq('acknowledged', False)
+        
+        result = await execute(query.order('created_at', desc=True).limit(limit))
+        
+        return result.data or []
+        
+    except Exception as e:
+        logger.error("Error fetching health alerts: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch health alerts"
+        )
+
+@router.post("/alerts/{alert_id}/acknowledge", response_model=HealthAlert)
+async def acknowledge_health_alert(
+    alert_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Mark an alert as seen"""
+    try:
+        result = await execute(
+            supabase.table('health_alerts').update({'acknowledged': True}).eq(
+                'id', alert_id
+            ).eq('user_id', current_user['id'])
+        )
+        
+        if not result.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Health alert not found"
+            )
+        
+        return result.data[0]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error acknowledging health alert: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to acknowledge health alert"
         )
 
-@router.post("/", response_model=HealthMetric, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=HealthMetricLogged, status_code=status.HTTP_201_CREATED)
 async def create_health_metric(
     metric: HealthMetricCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    """Log a new health metric"""
+    """Log a new health metric (the response lists any alerts the reading raised)"""
     try:
         metric_data = {
             'id': str(uuid.uuid4()),
             'user_id': current_user['id'],
             **metric.dict(),
-            'recorded_at': metric.recorded_at or datetime.now()
+            'recorded_at': (metric.recorded_at or datetime.now()).isoformat()
         }
         
         response = supabase.table('health_metrics').insert(metric_data).execute()
@@ -59,17 +157,80 @@ async def create_health_metric(
                 detail="Failed to log health metric"
             )
         
-        return response.data[0]
+        # A failed check must not lose the reading
+        try:
+            alerts = await anomaly_detector.observe(current_user['id'], response.data[0])
+        except Exception as e:
+            logger.error("Error checking health metric: {}", e)
+            alerts = []
+        
+        record_changed(current_user['id'], HEALTH_METRICS, response.data[0])
+        
+        return {**response.data[0], 'alerts': alerts}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating health metric: {e}")
+        logger.error("Error creating health metric: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to log health metric"
         )
 
+@router.post("/batch", response_model=List[HealthMetricLogged], status_code=status.HTTP_201_CREATED)
+async def create_health_metrics_batch(
+    metrics: List[HealthMetricCreate] = Body(..., min_length=1, max_length=MAX_BATCH_READINGS),
+    current_user: dict = Depends(get_current_user)
+):
+    """Log several readings at once, e.g. a device's backlog (the response lists them in order with their alerts)"""
+    try:
+        now = datetime.now()
+        metrics_data = [
+            {
+                'id': str(uuid.uuid4()),
+                'user_id': current_user['id'],
+                **metric.dict(),
+                'recorded_at': (metric.recorded_at or now).isoformat()
+            }
+            for metric in metrics
+        ]
+        
+        # Load the statistics first: seeding them from history after the insert would count the batch twice
+        for metric_type in {metric.metric_type.value for metric in metrics}:
+            try:
+                await anomaly_detector.state_for(current_user['id'], metric_type)
+            except Exception as e:
+                logger.error("Error loading health metric statistics: {}", e)
+        
+        response = await execute(supabase.table('health_metrics').insert(metrics_data))
+        
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to log health metrics"
+            )
+        
+        # Checked in the order they were taken; a failed check must not lose the readings
+        rows = sorted(response.data, key=lambda row: to_utc(row['recorded_at']))
+        try:
+            alerts = await anomaly_detector.observe_batch(current_user['id'], rows)
+        except Exception as e:
+            logger.error("Error checking health metrics: {}", e)
+            alerts = {}
+        for row in rows:
+            record_changed(current_user['id'], HEALTH_METRICS, row)
+        
+        return [{**row, 'alerts': alerts.get(str(row['id']), [])} for row in response.data]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating health metrics: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to log health metrics"
+        )
+
 @router.delete("/{metric_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_health_metric(
     metric_id: str,
@@ -82,19 +243,28 @@ async def delete_health_metric(
             'id', metric_id
         ).eq('user_id', current_user['id']).execute()
         
-        if not existing.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Health metric not found"
-            )
+        if existing.data:
+            supabase.table('health_metrics').delete().eq('id', metric_id).execute()
+        else:
+            # Readings of archived months are only in the archive
+            # (imported on first use: it loads NumPy, which would slow down startup)
+            from app.services.metric_archive import metric_archive
+            
+            if not await asyncio.to_thread(metric_archive.delete_readings, current_user['id'], [metric_id]):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Health metric not found"
+                )
+        
+        # Alerts have no foreign key to the partitioned table, so they go explicitly
+        supabase.table('health_alerts').delete().eq('metric_id', metric_id).eq('user_id', current_user['id']).execute()
         
-        # Delete
-        supabase.table('health_metrics').delete().eq('id', metric_id).execute()
+        record_deleted(current_user['id'], HEALTH_METRICS, metric_id)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting health metric: {e}")
+        logger.error("Error deleting health metric: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete health metric"
@@ -0,0 +1,111 @@
+"""
+Background jobs API routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import List, Optional
+from loguru import logger
+
+from app.models.job import Job, JobCreate, JobStatus
+import app.services.exports  # Registers the export_data job handler
+from app.services.auth_service import get_current_user
+from app.services.database import supabase, execute
+from app.services.jobs import job_queue
+from app.services.serialization import list_response
+
+router = APIRouter()
+
+@router.get("/", response_model=List[Job])
+async def get_jobs(
+    request: Request,
+    job_status: Optional[JobStatus] = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get user's jobs, newest first"""
+    try:
+        query = supabase.table('jobs').select('*').eq('user_id', current_user['id'])
+        
+        if job_status:
+            query = query.eq('status', job_status.value)
+        
+        result = await execute(query.order('created_at', desc=True).limit(limit))
+        
+        return list_response(request, result.data, Job)
+        
+    except Exception as e:
+        logger.error("Error fetching jobs: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch jobs"
+        )
+
+@router.post("/", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job: JobCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a background job; poll GET /jobs/{id} (or watch the live updates socket) for its result"""
+    try:
+        return await job_queue.enqueue(job.kind.value, current_user['id'], job.payload)
+        
+    except Exception as e:
+        logger.error("Error creating job: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create job"
+        )
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a job's status and result"""
+    try:
+        result = await execute(
+            supabase.table('jobs').select('*').eq('id', job_id).eq('user_id', current_user['id'])
+        )
+        
+        if not result.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Job not found"
+            )
+        
+        return result.data[0]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching job: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch job"
+        )
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Cancel a job that hasn't started yet"""
+    try:
+        cancelled = await job_queue.cancel(job_id, current_user['id'])
+        
+        if cancelled is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Only queued jobs can be cancelled"
+            )
+        
+        return cancelled
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error cancelling job: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cancel job"
+        )
@@ -0,0 +1,54 @@
+"""
+Live updates WebSocket route
+"""
+
+from fastapi import APIRouter, HTTPException, WebSocket, status
+from typing import Optional
+import json
+
+from app.services.auth_service import decode_token
+from app.services.push import connection_manager
+
+router = APIRouter()
+
+def _user_id_from(websocket: WebSocket, token: Optional[str]) -> Optional[str]:
+    """User id from the `token` query parameter or an Authorization: Bearer header"""
+    if not token:
+        authorization = websocket.headers.get('authorization', '')
+        if authorization.lower().startswith('bearer '):
+            token = authorization[7:]
+    if not token:
+        return None
+    try:
+        return decode_token(token).get('sub')
+    except HTTPException:
+        return None
+
+@router.websocket("/ws")
+async def live_updates(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Push the user's changes as JSON messages:
+    
+    - {"type": "change", "resource": "health_metrics", "id": ..., "deleted": false, "record": {...}}
+    - {"type": "dose_due", "medication_id": ..., "name": ..., "dosage": ..., "due_at": ...}
+    - {"type": "heartbeat"} periodically, and {"type": "pong"} in reply to "ping"
+    - {"type": "resync"} when the client fell behind and should refetch
+    """
+    user_id = _user_id_from(websocket, token)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    connection = connection_manager.connect(websocket, user_id)
+    connection.push(json.dumps({'type': 'hello'}))
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message.get('text') == 'ping':
+                connection.push(json.dumps({'type': 'pong'}))
+    finally:
+        connection_manager.disconnect(connection)
@@ -2,17 +2,28 @@
 Medications API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from loguru import logger
 import uuid
-from datetime import date
+from datetime import date, datetime, timedelta
 
-from app.models.medication import Medication, MedicationCreate, MedicationUpdate
+from app.models.medication import Medication, MedicationCreate, MedicationCreated, MedicationUpdate, DoseReminder
+from app.models.interaction import InteractionWarning
+from app.models.dose_event import DoseEvent, DoseEventCreate, AdherenceSummary
+from app.models.sync import SyncChanges
+from app.services.adherence import record_dose, adherence_summary
 from app.services.auth_service import get_current_user
+from app.services.changes import record_changed, MEDICATIONS
 from app.services.database import supabase
+from app.services.dose_scheduler import dose_scheduler
+from app.services.interactions import interaction_warnings
+from app.services.query_cache import medications as cached_medications
+from app.services.serialization import MsgPackRoute, list_response
+from app.services.sync import SyncExpired, changes as sync_changes, sync_response
+from app.services.versioning import conditional_get
 
-router = APIRouter()
+router = APIRouter(route_class=MsgPackRoute)
 
 def serialize_dates(data: dict) -> dict:
     """Convert date objects to ISO format strings"""
@@ -24,34 +35,106 @@ def serialize_dates(data: dict) -> dict:
 
 @router.get("/", response_model=List[Medication])
 async def get_medications(
+    request: Request,
+    response: Response,
     active_only: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """Get user's medications"""
+    not_modified = conditional_get(request, response, current_user['id'], MEDICATIONS, active_only)
+    if not_modified:
+        return not_modified
+    
     try:
-        query = supabase.table('medications').select('*').eq('user_id', current_user['id'])
+        rows = await cached_medications(current_user['id'], active_only)
         
-        if active_only:
-            query = query.eq('active', True)
+        return list_response(request, rows, Medication, response)
         
-        response = query.order('created_at', desc=True).execute()
+    except Exception as e:
+        logger.error("Error fetching medications: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch medications"
+        )
+
+@router.get("/sync", response_model=SyncChanges[Medication])
+async def sync_medications(
+    request: Request,
+    since: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get medications changed and deleted since the previous sync (`since` is its cursor; omit it for all medications)"""
+    try:
+        page = await sync_changes(current_user['id'], MEDICATIONS, since)
         
-        return response.data if response.data else []
+        return sync_response(request, page, Medication)
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except SyncExpired as e:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"{e}; sync again without a cursor"
+        )
     except Exception as e:
-        logger.error(f"Error fetching medications: {e}")
+        logger.error("Error syncing medications: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to fetch medications"
+            detail="Failed to sync medications"
+        )
+
+@router.get("/reminders", response_model=List[DoseReminder])
+async def get_dose_reminders(
+    hours: int = Query(24, ge=1, le=24 * 14),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the user's upcoming doses within the next `hours` hours"""
+    now = datetime.now()
+    doses = dose_scheduler.upcoming(current_user['id'], now + timedelta(hours=hours), now)
+    
+    return [
+        DoseReminder(
+            medication_id=dose.medication_id,
+            name=dose.name,
+            dosage=dose.dosage,
+            due_at=dose.due_at
         )
+        for dose in doses
+    ]
 
-@router.post("/", response_model=Medication, status_code=status.HTTP_201_CREATED)
+@router.get("/interactions", response_model=List[InteractionWarning])
+async def check_interactions(
+    name: str = Query(..., min_length=1, max_length=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """Check a drug against the user's active medications before adding it"""
+    try:
+        return await interaction_warnings(current_user['id'], name)
+        
+    except Exception as e:
+        logger.error("Error checking interactions: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to check interactions"
+        )
+
+@router.post("/", response_model=MedicationCreated, status_code=status.HTTP_201_CREATED)
 async def create_medication(
     medication: MedicationCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    """Create a new medication"""
+    """Create a new medication (the response lists interactions with other active medications)"""
     try:
+        # A failed check must not block adding the medication
+        try:
+            warnings = await interaction_warnings(current_user['id'], medication.name)
+        except Exception as e:
+            logger.error("Error checking interactions: {}", e)
+            warnings = []
+        
         medication_dict = medication.dict()
         
         # Convert dates to ISO strings
@@ -70,12 +153,14 @@ async def create_medication(
                 detail="Failed to create medication"
             )
         
-        return response.data[0]
+        record_changed(current_user['id'], MEDICATIONS, response.data[0])
+        
+        return {**response.data[0], 'interaction_warnings': warnings}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating medication: {e}")
+        logger.error("Error creating medication: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create medication: {str(e)}"
@@ -84,26 +169,32 @@ async def create_medication(
 @router.get("/{medication_id}", response_model=Medication)
 async def get_medication(
     medication_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific medication"""
+    not_modified = conditional_get(request, response, current_user['id'], MEDICATIONS, medication_id)
+    if not_modified:
+        return not_modified
+    
     try:
-        response = supabase.table('medications').select('*').eq(
+        result = supabase.table('medications').select('*').eq(
             'id', medication_id
         ).eq('user_id', current_user['id']).execute()
         
-        if not response.data:
+        if not result.data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Medication not found"
             )
         
-        return response.data[0]
+        return result.data[0]
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching medication: {e}")
+        logger.error("Error fetching medication: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch medication"
@@ -136,12 +227,14 @@ async def update_medication(
             'id', medication_id
         ).execute()
         
+        record_changed(current_user['id'], MEDICATIONS, response.data[0])
+        
         return response.data[0]
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating medication: {e}")
+        logger.error("Error updating medication: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update medication"
@@ -166,15 +259,77 @@ async def delete_medication(
             )
         
         # Soft delete
-        supabase.table('medications').update({'active': False}).eq(
+        response = supabase.table('medications').update({'active': False}).eq(
             'id', medication_id
         ).execute()
         
+        if response.data:
+            record_changed(current_user['id'], MEDICATIONS, response.data[0])
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting medication: {e}")
+        logger.error("Error deleting medication: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete medication"
         )
+
+@router.post("/{medication_id}/doses", response_model=DoseEvent, status_code=status.HTTP_201_CREATED)
+async def log_dose(
+    medication_id: str,
+    dose: DoseEventCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Mark a scheduled dose as taken or missed"""
+    try:
+        existing = supabase.table('medications').select('*').eq(
+            'id', medication_id
+        ).eq('user_id', current_user['id']).execute()
+        
+        if not existing.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Medication not found"
+            )
+        
+        return await record_dose(existing.data[0], dose.status.value, dose.scheduled_for)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error logging dose: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to log dose"
+        )
+
+@router.get("/{medication_id}/adherence", response_model=AdherenceSummary)
+async def get_adherence(
+    medication_id: str,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get adherence statistics for a medication (default: last 30 days)"""
+    try:
+        existing = supabase.table('medications').select('*').eq(
+            'id', medication_id
+        ).eq('user_id', current_user['id']).execute()
+        
+        if not existing.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Medication not found"
+            )
+        
+        return await adherence_summary(existing.data[0], from_date, to_date)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error computing adherence: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compute adherence"
+        )
@@ -0,0 +1,48 @@
+"""
+Search API routes
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from loguru import logger
+
+from app.models.search import SearchKind, SearchResult
+from app.services.auth_service import get_current_user
+from app.services.search_index import search_index
+
+router = APIRouter()
+
+@router.get("/", response_model=List[SearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[List[SearchKind]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Search the user's medications, appointments and health metric notes (typo tolerant)"""
+    try:
+        results = await search_index.search(
+            current_user['id'],
+            q,
+            limit=limit,
+            kinds=[k.value for k in kind] if kind else None
+        )
+        
+        return [
+            SearchResult(
+                kind=document.kind,
+                id=document.id,
+                title=document.title,
+                subtitle=document.subtitle,
+                when=document.when,
+                score=score
+            )
+            for document, score in results
+        ]
+        
+    except Exception as e:
+        logger.error("Error searching records: {}", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search records"
+        )
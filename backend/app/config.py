@@ -5,7 +5,7 @@ Application configuration
 import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 # Explicitly load .env file
 load_dotenv()
@@ -25,6 +25,13 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str = ""
     SUPABASE_SERVICE_KEY: str = ""
     
+    # Database resilience: seconds a request may wait on the database, and
+    # how many failures in a row stop requests for DB_BREAKER_RESET_SECONDS
+    # (read lists are then served from the query cache where possible)
+    DB_TIMEOUT_SECONDS: float = 10.0
+    DB_BREAKER_FAILURES: int = 5
+    DB_BREAKER_RESET_SECONDS: float = 30.0
+    
     # LLM
     GROQ_API_KEY: str = ""
     OPENROUTER_API_KEY: str = ""
@@ -34,6 +41,60 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Appointments (used for double-booking checks and free slots)
+    APPOINTMENT_DURATION_MINUTES: int = 30
+    
+    # Drug interaction dataset (defaults to app/data/drug_interactions.json)
+    DRUG_INTERACTIONS_PATH: str = ""
+    
+    # Uploaded documents (content-addressed files on local disk)
+    DOCUMENT_STORAGE_DIR: str = "storage/documents"
+    MAX_DOCUMENT_MB: int = 512
+    
+    # Background jobs: worker tasks per process, retries with exponential
+    # backoff, and how long running jobs get to finish on shutdown
+    JOB_CONCURRENCY: int = 2
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_SECONDS: float = 5.0
+    JOB_RETRY_MAX_SECONDS: float = 300.0
+    JOB_POLL_SECONDS: float = 5.0
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_DRAIN_SECONDS: float = 20.0
+    
+    # Health metrics: monthly partitions created ahead of time; months older
+    # than the retention window are archived to compressed columnar files
+    # (shared between hosts, like DOCUMENT_STORAGE_DIR) by the
+    # archive_health_metrics job
+    HEALTH_METRICS_PARTITIONS_AHEAD: int = 3
+    HEALTH_METRICS_RETENTION_MONTHS: int = 24
+    HEALTH_METRICS_ARCHIVE_DIR: str = "storage/health_metrics_archive"
+    
+    # Read-through cache for per-user list queries (per worker process)
+    QUERY_CACHE_MB: int = 64
+    
+    # Response compression: smallest body compressed, and memory for compressed
+    # bodies of ETag'd responses reused across requests (per worker process)
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_CACHE_MB: int = 32
+    
+    # Incremental sync: days deletions are remembered; clients with older
+    # cursors must sync again from the start
+    SYNC_TOMBSTONE_DAYS: int = 30
+    
+    # Workers (uvicorn reads WEB_CONCURRENCY too); >1 enables the invalidation bus
+    WEB_CONCURRENCY: int = 1
+    INVALIDATION_BUS_DIR: str = "/tmp/medical-ai-bus"
+    
+    # Live updates WebSocket
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_HEARTBEAT_SECONDS: float = 30.0
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    
+    # Logging: JSON lines (always on in production) and 1-in-N sampling of
+    # debug lines per logger, e.g. {"app.services.auth_service": 100}
+    LOG_JSON: bool = False
+    LOG_DEBUG_SAMPLING: Dict[str, int] = {"app.services.auth_service": 100}
+    
     # CORS
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:3000",
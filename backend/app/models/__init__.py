@@ -3,9 +3,17 @@ Pydantic models for request/response validation
 """
 
 from .user import User, UserCreate, UserLogin, UserResponse
-from .medication import Medication, MedicationCreate, MedicationUpdate
-from .appointment import Appointment, AppointmentCreate, AppointmentUpdate
-from .health_metric import HealthMetric, HealthMetricCreate
+from .medication import Medication, MedicationCreate, MedicationCreated, MedicationUpdate, DoseReminder
+from .interaction import InteractionSeverity, InteractionWarning
+from .appointment import Appointment, AppointmentCreate, AppointmentUpdate, FreeSlot
+from .health_metric import HealthMetric, HealthMetricCreate, HealthMetricLogged, HealthAlert, AlertSeverity
+from .dose_event import DoseStatus, DoseEvent, DoseEventCreate, AdherenceSummary
+from .dashboard import Dashboard
+from .search import SearchKind, SearchResult
+from .document import DocumentCategory, Document, DocumentUploaded
+from .job import JobKind, JobStatus, JobCreate, Job
+from .cohort import ThresholdShare, WeeklyDistribution, CohortDistribution
+from .sync import SyncChanges
 
 __all__ = [
     "User",
@@ -14,10 +22,36 @@ __all__ = [
     "UserResponse",
     "Medication",
     "MedicationCreate",
+    "MedicationCreated",
     "MedicationUpdate",
+    "InteractionSeverity",
+    "InteractionWarning",
+    "DoseReminder",
     "Appointment",
     "AppointmentCreate",
     "AppointmentUpdate",
+    "FreeSlot",
     "HealthMetric",
     "HealthMetricCreate",
+    "HealthMetricLogged",
+    "HealthAlert",
+    "AlertSeverity",
+    "DoseStatus",
+    "DoseEvent",
+    "DoseEventCreate",
+    "AdherenceSummary",
+    "Dashboard",
+    "SearchKind",
+    "SearchResult",
+    "DocumentCategory",
+    "Document",
+    "DocumentUploaded",
+    "JobKind",
+    "JobStatus",
+    "JobCreate",
+    "Job",
+    "ThresholdShare",
+    "WeeklyDistribution",
+    "CohortDistribution",
+    "SyncChanges",
 ]
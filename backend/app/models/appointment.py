@@ -38,3 +38,7 @@ class Appointment(AppointmentBase):
     
     class Config:
         from_attributes = True
+
+class FreeSlot(BaseModel):
+    start: datetime
+    end: datetime
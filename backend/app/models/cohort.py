@@ -0,0 +1,39 @@
+"""
+Cohort analytics models
+"""
+
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date, datetime
+
+from .health_metric import MetricType
+
+class ThresholdShare(BaseModel):
+    metric_type: MetricType
+    channel: str  # e.g. "systolic" for blood pressure
+    unit: str
+    threshold: float
+    start: datetime
+    end: datetime
+    patients: int  # Patients with readings in the window
+    patients_above: int  # Of those, patients whose mean reading is at or above the threshold
+    share: Optional[float] = None  # patients_above / patients; None without patients
+    readings: int
+
+class WeeklyDistribution(BaseModel):
+    week: date  # Monday
+    readings: int
+    mean: float
+    p10: float
+    p25: float
+    p50: float
+    p75: float
+    p90: float
+
+class CohortDistribution(BaseModel):
+    metric_type: MetricType
+    channel: str
+    unit: str
+    start: datetime
+    end: datetime
+    weeks: List[WeeklyDistribution]  # Weeks without readings are left out
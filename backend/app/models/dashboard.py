@@ -0,0 +1,17 @@
+"""
+Dashboard models
+"""
+
+from pydantic import BaseModel
+from typing import Dict, List
+
+from .medication import Medication, DoseReminder
+from .appointment import Appointment
+from .health_metric import HealthMetric
+
+class Dashboard(BaseModel):
+    active_medications: List[Medication]
+    upcoming_appointments: List[Appointment]
+    latest_metrics: Dict[str, HealthMetric]  # Keyed by metric type
+    metrics_logged: int
+    due_doses: List[DoseReminder]
@@ -0,0 +1,33 @@
+"""
+Document models
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class DocumentCategory(str, Enum):
+    PRESCRIPTION = "prescription"
+    LAB_REPORT = "lab_report"
+    IMAGING = "imaging"
+    INSURANCE = "insurance"
+    OTHER = "other"
+
+class Document(BaseModel):
+    id: str
+    user_id: str
+    title: str
+    category: DocumentCategory
+    filename: str
+    content_type: str
+    size_bytes: int
+    sha256: str
+    notes: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class DocumentUploaded(Document):
+    duplicate: bool = False  # The user had already uploaded identical content
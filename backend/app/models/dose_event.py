@@ -0,0 +1,38 @@
+"""
+Dose event and adherence models
+"""
+
+from pydantic import BaseModel
+from typing import List
+from datetime import date, datetime
+from enum import Enum
+
+class DoseStatus(str, Enum):
+    TAKEN = "taken"
+    MISSED = "missed"
+
+class DoseEventCreate(BaseModel):
+    status: DoseStatus
+    scheduled_for: datetime
+
+class DoseEvent(DoseEventCreate):
+    id: str
+    medication_id: str
+    user_id: str
+    recorded_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AdherenceSummary(BaseModel):
+    medication_id: str
+    from_date: date
+    to_date: date
+    expected: int
+    taken: int
+    missed: int
+    unrecorded: int
+    adherence: float  # Percentage of expected doses that were taken
+    current_streak: int
+    longest_streak: int
+    missed_doses: List[datetime]
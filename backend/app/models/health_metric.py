@@ -3,7 +3,7 @@ Health Metric models
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -32,3 +32,28 @@ class HealthMetric(HealthMetricBase):
     
     class Config:
         from_attributes = True
+
+class AlertSeverity(str, Enum):
+    WARNING = "warning"
+    CRITICAL = "critical"
+
+class HealthAlert(BaseModel):
+    id: str
+    user_id: str
+    metric_id: str
+    metric_type: MetricType
+    channel: str  # e.g. "systolic" for blood pressure
+    value: float  # In the threshold's unit (mg/dL, °C, ...)
+    severity: AlertSeverity
+    reason: str  # "threshold" (clinical range) or "unusual" (far from the user's own history)
+    message: str
+    z_score: Optional[float] = None
+    recorded_at: datetime
+    acknowledged: bool = False
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class HealthMetricLogged(HealthMetric):
+    alerts: List[HealthAlert] = []
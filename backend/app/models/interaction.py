@@ -0,0 +1,20 @@
+"""
+Drug interaction models
+"""
+
+from pydantic import BaseModel
+from enum import Enum
+
+class InteractionSeverity(str, Enum):
+    CONTRAINDICATED = "contraindicated"
+    MAJOR = "major"
+    MODERATE = "moderate"
+    MINOR = "minor"
+
+class InteractionWarning(BaseModel):
+    medication_id: str  # The existing medication it interacts with
+    medication_name: str
+    drug: str  # Generic name matched in the new medication
+    interacting_drug: str  # Generic name matched in the existing medication
+    severity: InteractionSeverity
+    description: str
@@ -0,0 +1,40 @@
+"""
+Background job models
+"""
+
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+from enum import Enum
+
+class JobKind(str, Enum):
+    EXPORT_DATA = "export_data"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    payload: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    id: str
+    user_id: str
+    kind: str
+    payload: Dict[str, Any] = {}
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None  # Last failure, kept while the job is retried
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
@@ -3,9 +3,11 @@ Medication models
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date
 
+from .interaction import InteractionWarning
+
 class MedicationBase(BaseModel):
     name: str
     dosage: str
@@ -34,3 +36,12 @@ class Medication(MedicationBase):
     
     class Config:
         from_attributes = True
+
+class MedicationCreated(Medication):
+    interaction_warnings: List[InteractionWarning] = []
+
+class DoseReminder(BaseModel):
+    medication_id: str
+    name: str
+    dosage: str
+    due_at: datetime
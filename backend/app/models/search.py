@@ -0,0 +1,21 @@
+"""
+Search models
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class SearchKind(str, Enum):
+    MEDICATION = "medication"
+    APPOINTMENT = "appointment"
+    HEALTH_METRIC = "health_metric"
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: str
+    title: str
+    subtitle: str
+    when: Optional[datetime] = None
+    score: float  # Share of the query's trigrams found in the record, 0-1
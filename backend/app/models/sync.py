@@ -0,0 +1,14 @@
+"""
+Incremental sync models
+"""
+
+from pydantic import BaseModel
+from typing import Generic, List, TypeVar
+
+RecordT = TypeVar("RecordT")
+
+class SyncChanges(BaseModel, Generic[RecordT]):
+    changed: List[RecordT]  # Created or updated since the cursor (may repeat rows already sent)
+    deleted: List[str]  # Ids deleted since the cursor
+    cursor: str  # Pass as `since` on the next sync
+    has_more: bool  # More changes are waiting; sync again right away
@@ -19,6 +19,7 @@ class UserLogin(BaseModel):
 
 class User(UserBase):
     id: str
+    is_admin: bool = False  # Clinic administrator (cohort analytics)
     created_at: datetime
     
     class Config:
@@ -0,0 +1,323 @@
+"""
+Dose adherence tracking
+
+Every medication keeps two bitmaps (taken, missed) over its expected doses:
+bit i is the i-th dose since the medication's start date, following the
+structured schedule parsed from its frequency. Adherence, streaks and
+missed-dose lists over any range are computed with masks and popcounts on
+these integers instead of scanning dose event rows.
+
+Bitmaps are saved only if the row is unchanged since it was loaded (its
+updated_at), so two doses recorded at once cannot drop each other's bit;
+the loser reloads and records again.
+"""
+
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from loguru import logger
+
+from app.services.database import execute, supabase
+from app.services.dose_scheduler import DoseSchedule, parse_frequency, parse_date
+
+# Used for as-needed / unrecognised frequencies so doses can still be logged
+FALLBACK_SCHEDULE = parse_frequency("once daily")
+
+# Doses may be logged this far ahead of their scheduled time (taken early)
+DOSE_GRACE = timedelta(days=1)
+
+# Attempts to save a dose's bitmaps while other doses are being recorded
+SAVE_ATTEMPTS = 5
+
+# Rows per request: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+
+def _to_local(moment: datetime) -> datetime:
+    """Dose times are naive local times, like the scheduler's"""
+    if moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def _longest_run(bits: int) -> int:
+    """Length of the longest run of set bits (one shift-and per run length)"""
+    run = 0
+    while bits:
+        bits &= bits >> 1
+        run += 1
+    return run
+
+
+@dataclass
+class AdherenceBitmap:
+    """Taken/missed bitmaps for one medication, indexed by dose number"""
+    medication_id: str
+    user_id: str
+    origin: date
+    schedule: DoseSchedule
+    taken: int = 0
+    missed: int = 0
+    # updated_at of the loaded row (None if there was none)
+    updated_at: Optional[str] = None
+
+    @property
+    def slots_per_day(self) -> int:
+        return self.schedule.doses_per_day
+
+    def index_of(self, scheduled_for: datetime) -> int:
+        """Dose number of a scheduled dose time"""
+        days = (scheduled_for.date() - self.origin).days
+        if days < 0:
+            raise ValueError("Dose is before the medication start date")
+        if days % self.schedule.every_days:
+            raise ValueError("No dose is scheduled on that day")
+        return (days // self.schedule.every_days) * self.slots_per_day + self.schedule.slot_for(scheduled_for)
+
+    def dose_time(self, index: int) -> datetime:
+        """Scheduled time of a dose number"""
+        day = self.origin + timedelta(days=(index // self.slots_per_day) * self.schedule.every_days)
+        return datetime.combine(day, self.schedule.times_of_day[index % self.slots_per_day])
+
+    def first_index_on_or_after(self, day: date) -> int:
+        """Dose number of the first dose on or after `day`"""
+        days = max((day - self.origin).days, 0)
+        return -(-days // self.schedule.every_days) * self.slots_per_day
+
+    def due_until(self, now: datetime) -> int:
+        """Number of doses due at or before `now`"""
+        days = (now.date() - self.origin).days
+        if days < 0:
+            return 0
+        full_days, remainder = divmod(days, self.schedule.every_days)
+        if remainder:
+            return (full_days + 1) * self.slots_per_day
+        due_today = sum(1 for dose_time in self.schedule.times_of_day if dose_time <= now.time())
+        return full_days * self.slots_per_day + due_today
+
+    def record(self, scheduled_for: datetime, taken: bool) -> int:
+        """Mark a dose as taken or missed and return its dose number"""
+        bit = 1 << self.index_of(scheduled_for)
+        if taken:
+            self.taken |= bit
+            self.missed &= ~bit
+        else:
+            self.missed |= bit
+            self.taken &= ~bit
+        return bit.bit_length() - 1
+
+    def summarize(
+        self,
+        from_date: date,
+        to_date: date,
+        now: Optional[datetime] = None,
+        end_date: Optional[date] = None
+    ) -> dict:
+        """Adherence statistics for the doses due between two dates (inclusive)"""
+        if end_date is not None:
+            to_date = min(to_date, end_date)
+        start = self.first_index_on_or_after(from_date)
+        stop = min(self.first_index_on_or_after(to_date + timedelta(days=1)), self.due_until(now or datetime.now()))
+        if stop <= start:
+            return {
+                'expected': 0, 'taken': 0, 'missed': 0, 'unrecorded': 0, 'adherence': 0.0,
+                'current_streak': 0, 'longest_streak': 0, 'missed_doses': [],
+            }
+
+        mask = ((1 << (stop - start)) - 1) << start
+        taken = self.taken & mask
+        missed = self.missed & mask
+        expected = stop - start
+        taken_count = taken.bit_count()
+        missed_count = missed.bit_count()
+
+        # Current streak: taken doses counting back from the most recent due dose
+        not_taken = ~taken & mask
+        current_streak = stop - not_taken.bit_length() if not_taken else expected
+
+        missed_doses: List[datetime] = []
+        remaining = missed
+        while remaining:
+            lowest = remaining & -remaining
+            missed_doses.append(self.dose_time(lowest.bit_length() - 1))
+            remaining ^= lowest
+
+        return {
+            'expected': expected,
+            'taken': taken_count,
+            'missed': missed_count,
+            'unrecorded': expected - taken_count - missed_count,
+            'adherence': round(100.0 * taken_count / expected, 1),
+            'current_streak': current_streak,
+            'longest_streak': _longest_run(taken),
+            'missed_doses': missed_doses,
+        }
+
+    def to_row(self) -> dict:
+        return {
+            'medication_id': self.medication_id,
+            'user_id': self.user_id,
+            'origin': self.origin.isoformat(),
+            'slots_per_day': self.slots_per_day,
+            'every_days': self.schedule.every_days,
+            'taken': format(self.taken, 'x'),
+            'missed': format(self.missed, 'x'),
+        }
+
+
+def _schedule_for(medication: dict) -> DoseSchedule:
+    return parse_frequency(medication.get('frequency', '')) or FALLBACK_SCHEDULE
+
+
+def _empty_bitmap(medication: dict) -> AdherenceBitmap:
+    return AdherenceBitmap(
+        medication_id=str(medication['id']),
+        user_id=str(medication['user_id']),
+        origin=parse_date(medication.get('start_date')) or date.today(),
+        schedule=_schedule_for(medication),
+    )
+
+
+def _check_dose_time(medication: dict, scheduled_for: datetime) -> None:
+    """Bound dose times from above (bit numbers grow with them)"""
+    if scheduled_for > datetime.now() + DOSE_GRACE:
+        raise ValueError("Dose is scheduled in the future")
+    end_date = parse_date(medication.get('end_date'))
+    if end_date is not None and scheduled_for.date() > end_date:
+        raise ValueError("Dose is after the medication end date")
+
+
+async def _dose_events(medication_id: str) -> List[dict]:
+    """All of a medication's dose events in the order they were recorded, a page at a time"""
+    events: List[dict] = []
+    while True:
+        # Ordered by id as well, so events sharing a timestamp keep their order between pages
+        page = (await execute(
+            supabase.table('dose_events').select('status, scheduled_for').eq(
+                'medication_id', medication_id
+            ).order('recorded_at').order('id').range(len(events), len(events) + PAGE_ROWS - 1)
+        )).data or []
+        events.extend(page)
+        if len(page) < PAGE_ROWS:
+            return events
+
+
+async def _rebuild_from_events(medication: dict) -> AdherenceBitmap:
+    """Replay the dose event log (used when the schedule layout changed)"""
+    bitmap = _empty_bitmap(medication)
+
+    for event in await _dose_events(bitmap.medication_id):
+        try:
+            scheduled_for = _to_local(datetime.fromisoformat(event['scheduled_for']))
+            _check_dose_time(medication, scheduled_for)
+            bitmap.record(scheduled_for, event['status'] == 'taken')
+        except ValueError:
+            continue
+
+    return bitmap
+
+
+async def load_adherence(medication: dict) -> AdherenceBitmap:
+    """Load a medication's bitmaps, rebuilding them if its schedule changed"""
+    bitmap = _empty_bitmap(medication)
+    response = await execute(
+        supabase.table('medication_adherence').select('*').eq('medication_id', bitmap.medication_id)
+    )
+
+    if not response.data:
+        return bitmap
+
+    row = response.data[0]
+    if (
+        row['origin'] != bitmap.origin.isoformat()
+        or row['slots_per_day'] != bitmap.slots_per_day
+        or row['every_days'] != bitmap.schedule.every_days
+    ):
+        bitmap = await _rebuild_from_events(medication)
+        bitmap.updated_at = row['updated_at']
+        # Not saved if a dose was recorded meanwhile; recording one reloads then
+        await save_adherence(bitmap)
+        return bitmap
+
+    bitmap.taken = int(row['taken'] or '0', 16)
+    bitmap.missed = int(row['missed'] or '0', 16)
+    bitmap.updated_at = row['updated_at']
+    return bitmap
+
+
+async def save_adherence(bitmap: AdherenceBitmap) -> bool:
+    """Save the bitmaps if their row is unchanged since they were loaded"""
+    if bitmap.updated_at is None:
+        response = await execute(supabase.table('medication_adherence').upsert(
+            bitmap.to_row(), on_conflict='medication_id', ignore_duplicates=True
+        ))
+    else:
+        response = await execute(supabase.table('medication_adherence').update(bitmap.to_row()).eq(
+            'medication_id', bitmap.medication_id
+        ).eq('updated_at', bitmap.updated_at))
+
+    if not response.data:
+        return False
+    bitmap.updated_at = response.data[0]['updated_at']
+    return True
+
+
+async def record_dose(medication: dict, dose_status: str, scheduled_for: datetime) -> dict:
+    """Append a dose event and update the medication's bitmaps"""
+    bitmap = await load_adherence(medication)
+    scheduled_for = _to_local(scheduled_for)
+
+    try:
+        _check_dose_time(medication, scheduled_for)
+        bitmap.record(scheduled_for, dose_status == 'taken')
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    event = {
+        'id': str(uuid.uuid4()),
+        'medication_id': bitmap.medication_id,
+        'user_id': bitmap.user_id,
+        'status': dose_status,
+        'scheduled_for': bitmap.dose_time(bitmap.index_of(scheduled_for)).isoformat(),
+    }
+    
+    for _ in range(SAVE_ATTEMPTS):
+        if await save_adherence(bitmap):
+            break
+        # Another dose was saved since we loaded: record ours on top of it
+        bitmap = await load_adherence(medication)
+        bitmap.record(scheduled_for, dose_status == 'taken')
+    else:
+        logger.warning("Could not save adherence bitmaps for medication {} after {} attempts",
+                       bitmap.medication_id, SAVE_ATTEMPTS)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Other doses are being recorded for this medication; try again"
+        )
+
+    response = await execute(supabase.table('dose_events').insert(event))
+
+    return response.data[0] if response.data else event
+
+
+async def adherence_summary(
+    medication: dict,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None
+) -> dict:
+    """Adherence summary for a medication over a date range (default: last 30 days)"""
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=29)
+
+    bitmap = await load_adherence(medication)
+    summary = bitmap.summarize(from_date, to_date, end_date=parse_date(medication.get('end_date')))
+
+    return {
+        'medication_id': bitmap.medication_id,
+        'from_date': from_date,
+        'to_date': to_date,
+        **summary,
+    }
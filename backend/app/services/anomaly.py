@@ -0,0 +1,309 @@
+"""
+Streaming anomaly detection for health metrics
+
+Each (user, metric type) keeps running statistics per measured channel
+(blood pressure has systolic and diastolic): a Welford count/mean/M2 for the
+long-term mean and variance, and an EWMA of recent readings. Every new
+reading is checked in O(1) against:
+
+- clinical thresholds (e.g. systolic >= 180 mmHg is critical), and
+- the user's own history: a z-score of 3 or more against the long-term or
+  recent (EWMA) level, once enough readings have been seen.
+
+The statistics are stored as a flat float array per (user, metric type) in
+metric_stats, so they survive restarts; alerts go to health_alerts.
+"""
+
+import math
+import re
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.services.changes import Change, subscribe, subscribe_reset, HEALTH_METRICS
+from app.services.database import execute, supabase
+
+# Readings needed before a user's own statistics are trusted
+MIN_SAMPLES = 10
+# Readings more than this many standard deviations from the mean are unusual
+Z_THRESHOLD = 3.0
+# Weight of the newest reading in the EWMA
+EWMA_ALPHA = 0.2
+# Readings replayed to seed statistics for users who logged data before this existed
+BOOTSTRAP_READINGS = 500
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+@dataclass(frozen=True)
+class ClinicalRange:
+    label: str
+    unit: str
+    critical_low: Optional[float] = None
+    low: Optional[float] = None
+    high: Optional[float] = None
+    critical_high: Optional[float] = None
+
+
+# Channels per metric type, in the order their statistics are stored
+CHANNELS: Dict[str, Tuple[str, ...]] = {
+    "blood_pressure": ("systolic", "diastolic"),
+    "blood_sugar": ("blood_sugar",),
+    "weight": ("weight",),
+    "temperature": ("temperature",),
+    "heart_rate": ("heart_rate",),
+    "oxygen_saturation": ("oxygen_saturation",),
+}
+
+# Adult reference ranges; weight has none, so only unusual changes are flagged
+THRESHOLDS: Dict[str, ClinicalRange] = {
+    "systolic": ClinicalRange("Systolic blood pressure", "mmHg", critical_low=80, low=90, high=140, critical_high=180),
+    "diastolic": ClinicalRange("Diastolic blood pressure", "mmHg", critical_low=50, low=60, high=90, critical_high=120),
+    "blood_sugar": ClinicalRange("Blood sugar", "mg/dL", critical_low=54, low=70, high=180, critical_high=300),
+    "temperature": ClinicalRange("Temperature", "°C", critical_low=35.0, low=36.0, high=38.0, critical_high=39.5),
+    "heart_rate": ClinicalRange("Heart rate", "bpm", critical_low=40, low=50, high=100, critical_high=130),
+    "oxygen_saturation": ClinicalRange("Oxygen saturation", "%", critical_low=90, low=94),
+    "weight": ClinicalRange("Weight", ""),
+}
+
+
+def parse_channels(metric_type: str, value: str, unit: str = "") -> Dict[str, float]:
+    """Numeric channel values of a reading, converted to the threshold units"""
+    channels = CHANNELS.get(metric_type)
+    numbers = [float(number) for number in _NUMBER.findall(value or "")]
+    if not channels or len(numbers) < len(channels):
+        return {}
+
+    values = dict(zip(channels, numbers))
+    unit = (unit or "").strip().lower()
+    if metric_type == "blood_sugar" and "mmol" in unit:
+        values["blood_sugar"] *= 18.0
+    elif metric_type == "temperature" and ("f" in unit.replace("°", "") or values["temperature"] > 45):
+        values["temperature"] = (values["temperature"] - 32) * 5 / 9
+    return values
+
+
+class RunningStats:
+    """Welford mean/variance plus an EWMA, updated in O(1) per reading"""
+
+    __slots__ = ("count", "mean", "m2", "ewma")
+
+    def __init__(self, count: float = 0, mean: float = 0.0, m2: float = 0.0, ewma: float = 0.0):
+        self.count = int(count)
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.ewma = x if self.count == 1 else EWMA_ALPHA * x + (1 - EWMA_ALPHA) * self.ewma
+
+    def to_list(self) -> List[float]:
+        return [self.count, self.mean, self.m2, self.ewma]
+
+
+def _format(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def evaluate(channel: str, value: float, stats: RunningStats) -> Optional[dict]:
+    """Alert for one channel reading (checked against statistics before the reading)"""
+    limits = THRESHOLDS[channel]
+    unit = f" {limits.unit}" if limits.unit else ""
+
+    # Most severe bound first; sign +1 means "at or above", -1 "at or below"
+    for bound, severity, sign in (
+        (limits.critical_high, "critical", 1),
+        (limits.critical_low, "critical", -1),
+        (limits.high, "warning", 1),
+        (limits.low, "warning", -1),
+    ):
+        if bound is not None and sign * (value - bound) >= 0:
+            direction = "at" if value == bound else "above" if sign > 0 else "below"
+            level = "critical " if severity == "critical" else ""
+            return {
+                'severity': severity,
+                'reason': 'threshold',
+                'message': f"{limits.label} {_format(value)}{unit} is {direction} the {level}threshold of {_format(bound)}{unit}",
+            }
+
+    std = stats.std
+    if stats.count < MIN_SAMPLES or std == 0:
+        return None
+    long_term = (value - stats.mean) / std
+    recent = (value - stats.ewma) / std
+    z = long_term if abs(long_term) >= abs(recent) else recent
+    if abs(z) < Z_THRESHOLD:
+        return None
+
+    return {
+        'severity': 'warning',
+        'reason': 'unusual',
+        'message': (
+            f"{limits.label} {_format(value)}{unit} is unusually {'high' if z > 0 else 'low'} for you "
+            f"(usually {_format(stats.mean)} ± {_format(std)}{unit}, recently {_format(stats.ewma)}{unit})"
+        ),
+        'z_score': round(z, 2),
+    }
+
+
+class MetricState:
+    """Running statistics for each channel of one user's metric type"""
+
+    def __init__(self, metric_type: str, values: Optional[List[float]] = None):
+        self.metric_type = metric_type
+        channels = CHANNELS[metric_type]
+        values = values if values and len(values) == 4 * len(channels) else [0.0] * (4 * len(channels))
+        self.channels = {
+            channel: RunningStats(*values[4 * i:4 * i + 4])
+            for i, channel in enumerate(channels)
+        }
+
+    def observe(self, values: Dict[str, float]) -> List[dict]:
+        """Check a reading, then fold it into the statistics"""
+        alerts = []
+        for channel, value in values.items():
+            stats = self.channels[channel]
+            alert = evaluate(channel, value, stats)
+            if alert is not None:
+                alerts.append({**alert, 'channel': channel, 'value': value})
+            stats.update(value)
+        return alerts
+
+    def to_list(self) -> List[float]:
+        return [number for stats in self.channels.values() for number in stats.to_list()]
+
+
+class AnomalyDetector:
+    """Per-user metric statistics, cached for the most recent users"""
+
+    def __init__(self, max_states: int = 20000):
+        self.max_states = max_states
+        self._states: "OrderedDict[Tuple[str, str], MetricState]" = OrderedDict()
+
+    async def _load(self, user_id: str, metric_type: str, exclude_id: Optional[str]) -> MetricState:
+        response = await execute(
+            supabase.table('metric_stats').select('state').eq(
+                'user_id', user_id
+            ).eq('metric_type', metric_type)
+        )
+        if response.data:
+            return MetricState(metric_type, response.data[0]['state'])
+
+        # First reading since stats were introduced: seed from the user's history
+        state = MetricState(metric_type)
+        query = supabase.table('health_metrics').select('value, unit').eq(
+            'user_id', user_id
+        ).eq('metric_type', metric_type)
+        if exclude_id:
+            query = query.neq('id', exclude_id)
+        history = await execute(query.order('recorded_at', desc=True).limit(BOOTSTRAP_READINGS))
+        for row in reversed(history.data or []):
+            values = parse_channels(metric_type, row['value'], row['unit'])
+            for channel, value in values.items():
+                state.channels[channel].update(value)
+        return state
+
+    async def state_for(self, user_id: str, metric_type: str, exclude_id: Optional[str] = None) -> MetricState:
+        key = (user_id, metric_type)
+        state = self._states.get(key)
+        if state is not None:
+            self._states.move_to_end(key)
+            return state
+
+        state = await self._load(user_id, metric_type, exclude_id)
+        state = self._states.setdefault(key, state)
+        if len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        return state
+
+    def evict(self, user_id: str, metric_type: str) -> None:
+        self._states.pop((user_id, metric_type), None)
+
+    async def observe(self, user_id: str, metric: dict) -> List[dict]:
+        """Check a just-logged reading, update and persist the statistics and store any alerts"""
+        return (await self.observe_batch(user_id, [metric])).get(str(metric['id']), [])
+
+    async def observe_batch(self, user_id: str, metrics: List[dict]) -> Dict[str, List[dict]]:
+        """
+        Check readings logged together, in the order given, so each is compared
+        with the ones before it
+
+        The statistics are saved once per metric type and the alerts in one
+        insert. Returns the alerts by reading id.
+        """
+        states: Dict[str, MetricState] = {}
+        now = datetime.now(timezone.utc).isoformat()
+        alerts = []
+        for metric in metrics:
+            metric_type = str(metric['metric_type'])
+            values = parse_channels(metric_type, metric['value'], metric.get('unit', ''))
+            if not values:
+                continue
+
+            state = states.get(metric_type)
+            if state is None:
+                state = states[metric_type] = await self.state_for(user_id, metric_type, exclude_id=str(metric['id']))
+            alerts.extend(
+                {
+                    'id': str(uuid.uuid4()),
+                    'user_id': user_id,
+                    'metric_id': str(metric['id']),
+                    'metric_type': metric_type,
+                    'recorded_at': str(metric.get('recorded_at') or now),
+                    'acknowledged': False,
+                    'created_at': now,
+                    **alert,
+                }
+                for alert in state.observe(values)
+            )
+
+        if states:
+            await execute(
+                supabase.table('metric_stats').upsert([
+                    {'user_id': user_id, 'metric_type': metric_type, 'state': state.to_list()}
+                    for metric_type, state in states.items()
+                ], on_conflict='user_id,metric_type')
+            )
+
+        if not alerts:
+            return {}
+
+        response = await execute(supabase.table('health_alerts').insert(alerts))
+        for alert in alerts:
+            logger.warning("Health alert for user {}: {}", user_id, alert['message'])
+
+        by_metric: Dict[str, List[dict]] = {}
+        for alert in response.data or alerts:
+            by_metric.setdefault(str(alert['metric_id']), []).append(alert)
+        return by_metric
+
+
+anomaly_detector = AnomalyDetector()
+
+
+def _on_metric_change(change: Change) -> None:
+    # Another worker updated these statistics; reload them from metric_stats
+    if change.remote and change.record:
+        anomaly_detector.evict(change.user_id, str(change.record.get('metric_type')))
+
+
+def _on_reset(user_id: str, resource: str) -> None:
+    if resource == HEALTH_METRICS:
+        for metric_type in CHANNELS:
+            anomaly_detector.evict(user_id, metric_type)
+
+
+subscribe(HEALTH_METRICS, _on_metric_change)
+subscribe_reset(_on_reset)
@@ -0,0 +1,172 @@
+"""
+Per-user appointment interval index
+
+Keeps each user's scheduled appointment start times in a sorted array so
+double-booking checks and free-slot queries are binary searches rather than
+scans over every appointment. Every appointment occupies a fixed slot of
+APPOINTMENT_DURATION_MINUTES (appointments have no end time), which is what
+makes the neighbouring-start check sufficient for overlap detection.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.config import settings
+from app.services.changes import Change, subscribe, subscribe_reset, APPOINTMENTS
+from app.services.database import execute, supabase
+
+# Rows per request: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+
+def to_utc(value: Union[datetime, str]) -> datetime:
+    """Parse/normalise a timestamp to aware UTC (naive values are taken as UTC, like Postgres does)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class UserAppointmentIndex:
+    """Sorted start times of one user's scheduled appointments"""
+
+    def __init__(self, duration: timedelta):
+        self.duration = duration
+        self._starts: List[datetime] = []
+        self._ids: List[str] = []
+        self._by_id: Dict[str, datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, appointment_id: str, start: datetime) -> None:
+        self.remove(appointment_id)
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ids.insert(position, appointment_id)
+        self._by_id[appointment_id] = start
+
+    def remove(self, appointment_id: str) -> None:
+        start = self._by_id.pop(appointment_id, None)
+        if start is None:
+            return
+        position = bisect_left(self._starts, start)
+        while self._ids[position] != appointment_id:
+            position += 1
+        del self._starts[position]
+        del self._ids[position]
+
+    def conflict(self, start: datetime, exclude_id: Optional[str] = None) -> Optional[str]:
+        """Id of an appointment overlapping a slot starting at `start`, if any"""
+        position = bisect_right(self._starts, start - self.duration)
+        while position < len(self._starts) and self._starts[position] < start + self.duration:
+            if self._ids[position] != exclude_id:
+                return self._ids[position]
+            position += 1
+        return None
+
+    def between(self, start: datetime, end: datetime) -> List[Tuple[str, datetime]]:
+        """(id, start) of appointments starting in [start, end)"""
+        low = bisect_left(self._starts, start)
+        high = bisect_left(self._starts, end)
+        return list(zip(self._ids[low:high], self._starts[low:high]))
+
+    def free_slots(
+        self,
+        start: datetime,
+        end: datetime,
+        length: Optional[timedelta] = None
+    ) -> List[Tuple[datetime, datetime]]:
+        """Gaps of at least `length` between appointments within [start, end)"""
+        length = length or self.duration
+        slots: List[Tuple[datetime, datetime]] = []
+        cursor = start
+
+        position = bisect_right(self._starts, start - self.duration)
+        while position < len(self._starts) and self._starts[position] < end:
+            busy_from = self._starts[position]
+            if busy_from - cursor >= length:
+                slots.append((cursor, busy_from))
+            cursor = max(cursor, busy_from + self.duration)
+            position += 1
+
+        if end - cursor >= length:
+            slots.append((cursor, end))
+        return slots
+
+
+class AppointmentIndex:
+    """Per-user indexes, loaded on first use and kept for the most recent users"""
+
+    def __init__(self, duration: timedelta, max_users: int = 10000):
+        self.duration = duration
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserAppointmentIndex]" = OrderedDict()
+
+    async def for_user(self, user_id: str) -> UserAppointmentIndex:
+        index = self._users.get(user_id)
+        if index is not None:
+            self._users.move_to_end(user_id)
+            return index
+
+        index = UserAppointmentIndex(self.duration)
+        last_id = None
+        while True:
+            query = supabase.table('appointments').select('id, date_time').eq(
+                'user_id', user_id
+            ).eq('status', 'scheduled')
+            if last_id is not None:
+                # Keyset pagination on id, so rows written meanwhile cannot shift a page
+                query = query.gt('id', last_id)
+            page = (await execute(query.order('id').limit(PAGE_ROWS))).data or []
+            for row in page:
+                index.add(str(row['id']), to_utc(row['date_time']))
+            if len(page) < PAGE_ROWS:
+                break
+            last_id = page[-1]['id']
+
+        self._users[user_id] = index
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return index
+
+    def apply(self, appointment: dict) -> None:
+        """Reflect a created/updated appointment row in an already-loaded index"""
+        index = self._users.get(str(appointment['user_id']))
+        if index is None:
+            return
+        if appointment.get('status', 'scheduled') == 'scheduled':
+            index.add(str(appointment['id']), to_utc(appointment['date_time']))
+        else:
+            index.remove(str(appointment['id']))
+
+    def discard(self, user_id: str, appointment_id: str) -> None:
+        index = self._users.get(user_id)
+        if index is not None:
+            index.remove(appointment_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's index so it is reloaded on next use"""
+        self._users.pop(user_id, None)
+
+
+appointment_index = AppointmentIndex(timedelta(minutes=settings.APPOINTMENT_DURATION_MINUTES))
+
+
+def _on_appointment_change(change: Change) -> None:
+    if change.deleted:
+        appointment_index.discard(change.user_id, change.record_id)
+    else:
+        appointment_index.apply(change.record)
+
+
+def _on_reset(user_id: str, resource: str) -> None:
+    if resource == APPOINTMENTS:
+        appointment_index.invalidate(user_id)
+
+
+subscribe(APPOINTMENTS, _on_appointment_change)
+subscribe_reset(_on_reset)
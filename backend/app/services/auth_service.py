@@ -2,6 +2,7 @@
 Authentication service
 """
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -11,7 +12,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from loguru import logger
 
 from app.config import settings
-from app.services.database import supabase
+from app.services.database import DatabaseUnavailable, execute, supabase
 
 # Password hashing - using argon2 which has no length limit
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
@@ -19,23 +20,28 @@ pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 # HTTP Bearer token
 security = HTTPBearer()
 
+# Users authenticated recently, so their requests can still be served (from
+# cached data) while the database is unavailable
+KNOWN_USERS = 10_000
+_known_users: "OrderedDict[str, dict]" = OrderedDict()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        logger.error(f"Password verification error: {e}")
+        logger.error("Password verification error: {}", e)
         return False
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     try:
-        logger.debug(f"Hashing password of length: {len(password)} chars")
+        logger.debug("Hashing password of length: {} chars", len(password))
         hashed = pwd_context.hash(password)
-        logger.debug(f"Successfully hashed password")
+        logger.debug("Successfully hashed password")
         return hashed
     except Exception as e:
-        logger.error(f"Password hashing error: {e}")
+        logger.error("Password hashing error: {}", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to hash password: {str(e)}"
@@ -80,12 +86,35 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     
     # Fetch user from database
-    response = supabase.table('users').select('*').eq('id', user_id).execute()
+    try:
+        response = await execute(supabase.table('users').select('*').eq('id', user_id))
+    except DatabaseUnavailable:
+        # The token is valid: trust the user's last known row until the database is back
+        user = _known_users.get(user_id)
+        if user is None:
+            raise
+        return user
     
     if not response.data:
+        _known_users.pop(user_id, None)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    return response.data[0]
+    user = response.data[0]
+    _known_users[user_id] = user
+    _known_users.move_to_end(user_id)
+    if len(_known_users) > KNOWN_USERS:
+        _known_users.popitem(last=False)
+    return user
+
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """Get the current user, who must be a clinic administrator"""
+    if not current_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+    
+    return current_user
@@ -0,0 +1,80 @@
+"""
+In-process change feed for user data
+
+Write paths publish one Change per created/updated/deleted row; caches,
+indexes and version counters subscribe to the resources they derive from
+instead of being called individually from every handler.
+
+When changes to a user's resource may have been missed (another worker
+could not deliver them), a reset is published instead: subscribers drop
+whatever they derived from that user's resource and reload it on next use.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+MEDICATIONS = "medications"
+APPOINTMENTS = "appointments"
+HEALTH_METRICS = "health_metrics"
+DOCUMENTS = "documents"
+JOBS = "jobs"
+
+
+@dataclass(frozen=True)
+class Change:
+    user_id: str
+    resource: str
+    record_id: str
+    record: Optional[dict] = None  # The row after the write; None when deleted
+    remote: bool = False  # Published by another worker process
+
+    @property
+    def deleted(self) -> bool:
+        return self.record is None
+
+
+ChangeHandler = Callable[[Change], None]
+ResetHandler = Callable[[str, str], None]
+
+_handlers: Dict[str, List[ChangeHandler]] = {}
+_reset_handlers: List[ResetHandler] = []
+
+
+def subscribe(resource: str, handler: ChangeHandler) -> None:
+    """Call `handler` for every change to `resource` ("*" for all resources)"""
+    _handlers.setdefault(resource, []).append(handler)
+
+
+def publish(change: Change) -> None:
+    """Deliver a change to its subscribers; one failing subscriber does not block the rest"""
+    for handler in _handlers.get(change.resource, []) + _handlers.get("*", []):
+        try:
+            handler(change)
+        except Exception as e:
+            logger.error("Change handler {} failed: {}", getattr(handler, '__name__', handler), e)
+
+
+def record_changed(user_id: str, resource: str, record: dict) -> None:
+    """Publish a created or updated row"""
+    publish(Change(str(user_id), resource, str(record['id']), record))
+
+
+def record_deleted(user_id: str, resource: str, record_id: str) -> None:
+    """Publish a deleted row"""
+    publish(Change(str(user_id), resource, str(record_id)))
+
+
+def subscribe_reset(handler: ResetHandler) -> None:
+    """Call `handler(user_id, resource)` when changes to a user's resource may have been missed"""
+    _reset_handlers.append(handler)
+
+
+def publish_reset(user_id: str, resource: str) -> None:
+    """Make subscribers drop what they derived from a user's resource"""
+    for handler in _reset_handlers:
+        try:
+            handler(str(user_id), resource)
+        except Exception as e:
+            logger.error("Reset handler {} failed: {}", getattr(handler, '__name__', handler), e)
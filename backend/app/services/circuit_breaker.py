@@ -0,0 +1,129 @@
+"""
+Circuit breaker
+
+Stops calls to a dependency that keeps failing, so callers fail at once
+instead of each waiting out a timeout:
+
+- closed: calls go through; `failure_threshold` failures in a row open it
+- open: calls raise CircuitOpen without being made, for `reset_seconds`
+- half-open: the first call after that is let through as a probe (the
+  others are still refused); its success closes the breaker, its failure
+  opens it again
+
+Callers report each call's outcome with success() or failure(), or
+release() when it ended without one (cancelled). Listeners registered with
+on_close() run when the breaker closes after being open, in the thread that
+reported the success. Safe to use from several threads.
+"""
+
+import threading
+import time
+from typing import Callable, List
+
+from loguru import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """A call was refused because the breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._listeners: List[Callable[[], None]] = []
+        self.calls = 0
+        self.rejected = 0
+        self.failed = 0
+        self.opened = 0
+
+    def acquire(self) -> None:
+        """Admit a call, or raise CircuitOpen"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+            elif self.state != CLOSED:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._retry_after())
+            self.calls += 1
+
+    def success(self) -> None:
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+            listeners = list(self._listeners) if recovered else []
+        if recovered:
+            logger.info("{} circuit closed", self.name)
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error("{} circuit listener failed: {}", self.name, e)
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failed += 1
+            self._probing = False
+            self._failures += 1
+            failures = self._failures
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                opened = True
+            else:
+                opened = False
+        if opened:
+            logger.warning("{} circuit opened after {} failures; retrying in {}s",
+                           self.name, failures, self.reset_seconds)
+
+    def release(self) -> None:
+        """End an admitted call whose outcome is unknown (the probe slot is freed)"""
+        with self._lock:
+            self._probing = False
+
+    def _retry_after(self) -> float:
+        if self.state == OPEN:
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+        return 0.0
+
+    def retry_after(self) -> float:
+        """Seconds until a call may be let through again (0 when closed)"""
+        with self._lock:
+            return self._retry_after()
+
+    def on_close(self, listener: Callable[[], None]) -> None:
+        """Call `listener` whenever the breaker closes after being open or half-open"""
+        self._listeners.append(listener)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'retry_after': round(self._retry_after(), 1),
+                'calls': self.calls,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'opened': self.opened,
+            }
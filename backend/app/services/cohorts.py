@@ -0,0 +1,330 @@
+"""
+Cohort analytics over health metrics
+
+Population views for clinic administrators, computed where the readings
+are instead of by fetching them:
+
+- threshold share: of the patients with readings in a window, how many have
+  a mean reading at or above a threshold (SQL: cohort_threshold_share)
+- weekly distribution: readings, mean and percentiles per week. The
+  database reduces the window to a fixed-bin histogram per week
+  (cohort_weekly_histogram: one row per week with its non-empty bins, so a
+  window of MAX_WEEKS fits in one response under PostgREST's row cap) and
+  the percentiles are interpolated from the histogram with NumPy.
+
+Readings are parsed into numbers once, when they are written, into the
+primary_value/secondary_value columns of health_metrics (threshold units,
+as in anomaly.parse_channels). WeeklyHistogram and PatientMeans build the
+same aggregates from columnar chunks of readings in one vectorized pass
+per chunk, for sources other than the database: windows reaching into
+months archived out of the database (metric_archive) add those months'
+readings to the database's aggregates.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.anomaly import CHANNELS, THRESHOLDS
+from app.services.database import execute, supabase
+from app.services.metric_archive import metric_archive
+
+# Percentiles reported per week
+QUANTILES = (0.10, 0.25, 0.50, 0.75, 0.90)
+# Longest window a weekly distribution covers
+MAX_WEEKS = 260
+# Rows per request for per-patient sums: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+# Weeks are numbered from Monday 1969-12-29, so they start on Mondays like date_trunc('week')
+_WEEK_ORIGIN = date(1969, 12, 29)
+_EPOCH_OFFSET_DAYS = (date(1970, 1, 1) - _WEEK_ORIGIN).days
+
+
+@dataclass(frozen=True)
+class Bins:
+    """`count` equal bins over [low, high), plus one below and one at or above (as width_bucket)"""
+    low: float
+    high: float
+    count: int
+
+    @property
+    def width(self) -> float:
+        return (self.high - self.low) / self.count
+
+    def bucket(self, values: np.ndarray) -> np.ndarray:
+        buckets = np.floor((values - self.low) / self.width).astype(np.int64) + 1
+        return np.clip(buckets, 0, self.count + 1)
+
+
+# Histogram bins per channel, in threshold units
+BINS: Dict[str, Bins] = {
+    "systolic": Bins(50, 250, 200),
+    "diastolic": Bins(30, 150, 120),
+    "blood_sugar": Bins(20, 620, 300),
+    "temperature": Bins(33, 43, 200),
+    "heart_rate": Bins(20, 220, 200),
+    "oxygen_saturation": Bins(70, 100, 60),
+    "weight": Bins(20, 250, 460),
+}
+
+
+def channel_position(metric_type: str, channel: Optional[str]) -> int:
+    """1 for a metric's first number (primary_value), 2 for its second; ValueError if unknown"""
+    channels = CHANNELS.get(metric_type, ())
+    if channel is None and channels:
+        return 1
+    if channel not in channels:
+        raise ValueError(f"channel must be one of: {', '.join(channels)}")
+    return channels.index(channel) + 1
+
+
+def week_number(day: date) -> int:
+    return (day - _WEEK_ORIGIN).days // 7
+
+
+def week_start(number: int) -> date:
+    return _WEEK_ORIGIN + timedelta(weeks=number)
+
+
+def week_span(start: datetime, end: datetime) -> int:
+    """Number of weeks [start, end) touches"""
+    first = week_number(start.astimezone(timezone.utc).date())
+    return max(week_number((end - timedelta(microseconds=1)).astimezone(timezone.utc).date()) - first + 1, 0)
+
+
+class WeeklyHistogram:
+    """Readings per (week, bin) and their sum per week, between two instants"""
+
+    def __init__(self, bins: Bins, start: datetime, end: datetime):
+        self.bins = bins
+        self.first_week = week_number(start.astimezone(timezone.utc).date())
+        weeks = week_span(start, end)
+        self.counts = np.zeros((weeks, bins.count + 2), dtype=np.int64)
+        self.sums = np.zeros(weeks, dtype=np.float64)
+
+    def add_rows(self, rows: List[dict]) -> None:
+        """Merge rows of cohort_weekly_histogram (week, buckets, counts, readings, total)"""
+        for row in rows:
+            week = week_number(date.fromisoformat(str(row['week'])[:10])) - self.first_week
+            if 0 <= week < len(self.sums):
+                self.counts[week, np.array(row['buckets'], dtype=np.int64)] += np.array(row['counts'], dtype=np.int64)
+                self.sums[week] += float(row['total'])
+
+    def add(self, recorded_at: np.ndarray, values: np.ndarray) -> None:
+        """Add a chunk of readings: `recorded_at` as datetime64 (UTC), `values` as floats"""
+        weeks = (recorded_at.astype("datetime64[D]").astype(np.int64) + _EPOCH_OFFSET_DAYS) // 7 - self.first_week
+        keep = (weeks >= 0) & (weeks < len(self.sums)) & np.isfinite(values)
+        if not keep.all():
+            weeks, values = weeks[keep], values[keep]
+
+        width = self.bins.count + 2
+        flat = weeks * width + self.bins.bucket(values)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.sums += np.bincount(weeks, weights=values, minlength=len(self.sums))
+
+    def percentiles(self) -> np.ndarray:
+        """(weeks, len(QUANTILES)) percentiles, interpolated linearly within bins"""
+        readings = self.counts.sum(axis=1)
+        cumulative = self.counts.cumsum(axis=1)
+        result = np.empty((len(readings), len(QUANTILES)))
+        rows = np.arange(len(readings))
+        for column, quantile in enumerate(QUANTILES):
+            target = quantile * readings
+            # First bucket whose cumulative count reaches the target
+            bucket = (cumulative < target[:, None]).sum(axis=1).clip(0, self.bins.count + 1)
+            before = np.where(bucket > 0, cumulative[rows, bucket - 1], 0)
+            inside = self.counts[rows, bucket]
+            fraction = np.divide(target - before, inside, out=np.zeros(len(rows)), where=inside > 0)
+            value = self.bins.low + (bucket - 1 + fraction) * self.bins.width
+            # Readings outside the bins are reported at the bins' edges
+            result[:, column] = np.clip(value, self.bins.low, self.bins.high)
+        return result
+
+    def weeks(self) -> List[dict]:
+        """Weeks with readings, oldest first"""
+        readings = self.counts.sum(axis=1)
+        percentiles = self.percentiles()
+        return [
+            {
+                'week': week_start(self.first_week + i),
+                'readings': int(readings[i]),
+                'mean': round(float(self.sums[i] / readings[i]), 2),
+                **{
+                    f"p{round(quantile * 100)}": round(float(percentiles[i, column]), 2)
+                    for column, quantile in enumerate(QUANTILES)
+                },
+            }
+            for i in np.flatnonzero(readings).tolist()
+        ]
+
+
+class PatientMeans:
+    """Per-patient reading counts and sums, for patients numbered 0..n-1"""
+
+    def __init__(self):
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+
+    def add(self, patients: np.ndarray, values: np.ndarray) -> None:
+        keep = np.isfinite(values)
+        if not keep.all():
+            patients, values = patients[keep], values[keep]
+        size = max(len(self.counts), int(patients.max()) + 1 if len(patients) else 0)
+        counts = np.bincount(patients, minlength=size)
+        sums = np.bincount(patients, weights=values, minlength=size)
+        counts[:len(self.counts)] += self.counts
+        sums[:len(self.sums)] += self.sums
+        self.counts, self.sums = counts, sums
+
+    def add_totals(self, patients: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        """Add readings already counted and summed per patient"""
+        size = max(len(self.counts), int(patients.max()) + 1 if len(patients) else 0)
+        # Counts as float weights are exact up to 2**53
+        new_counts = np.bincount(patients, weights=counts, minlength=size).astype(np.int64)
+        new_sums = np.bincount(patients, weights=sums, minlength=size)
+        new_counts[:len(self.counts)] += self.counts
+        new_sums[:len(self.sums)] += self.sums
+        self.counts, self.sums = new_counts, new_sums
+
+    def share(self, threshold: float) -> dict:
+        seen = self.counts > 0
+        means = self.sums[seen] / self.counts[seen]
+        return {
+            'patients': int(seen.sum()),
+            'patients_above': int((means >= threshold).sum()),
+            'readings': int(self.counts.sum()),
+        }
+
+
+def _share_with_archive(
+    patient_sums: List[dict],
+    metric_type: str,
+    position: int,
+    threshold: float,
+    start: datetime,
+    end: datetime
+) -> dict:
+    """Threshold share over the database's per-patient sums (cohort_patient_sums) plus archived readings"""
+    numbers: Dict[str, int] = {}
+    means = PatientMeans()
+    if patient_sums:
+        means.add_totals(
+            np.array([numbers.setdefault(str(row['user_id']), len(numbers)) for row in patient_sums]),
+            np.array([float(row['readings']) for row in patient_sums]),
+            np.array([float(row['total']) for row in patient_sums]),
+        )
+    for users, codes, _, values in metric_archive.readings(metric_type, position, start, end):
+        patients = np.array([numbers.setdefault(user, len(numbers)) for user in users], dtype=np.int64)
+        means.add(patients[codes], values)
+    return means.share(threshold)
+
+
+async def _patient_sums(metric_type: str, position: int, start: datetime, end: datetime) -> List[dict]:
+    """Every row of cohort_patient_sums, a page at a time"""
+    rows: List[dict] = []
+    while True:
+        query = supabase.rpc('cohort_patient_sums', {
+            'p_metric_type': metric_type,
+            'p_channel': position,
+            'p_from': start.isoformat(),
+            'p_to': end.isoformat(),
+        })
+        if rows:
+            # Keyset pagination on the grouping column, which the database pushes into the aggregate
+            query = query.gt('user_id', rows[-1]['user_id'])
+        page = (await execute(query.order('user_id').limit(PAGE_ROWS))).data or []
+        rows.extend(page)
+        if len(page) < PAGE_ROWS:
+            return rows
+
+
+def _add_archived(histogram: WeeklyHistogram, metric_type: str, position: int, start: datetime, end: datetime) -> None:
+    for _, _, recorded_at, values in metric_archive.readings(metric_type, position, start, end):
+        histogram.add(recorded_at, values)
+
+
+async def threshold_share(
+    metric_type: str,
+    channel: Optional[str],
+    threshold: Optional[float],
+    start: datetime,
+    end: datetime
+) -> dict:
+    """
+    Patients with readings between `start` and `end`, and how many average
+    at or above `threshold` (by default the channel's clinical high threshold)
+    """
+    position = channel_position(metric_type, channel)
+    channel = CHANNELS[metric_type][position - 1]
+    if threshold is None:
+        threshold = THRESHOLDS[channel].high
+        if threshold is None:
+            raise ValueError(f"threshold is required for {channel}")
+
+    if metric_archive.months_between(start, end):
+        # A patient's readings may be split between archived months and the database
+        patient_sums = await _patient_sums(metric_type, position, start, end)
+        counts = await asyncio.to_thread(
+            _share_with_archive, patient_sums, metric_type, position, threshold, start, end
+        )
+    else:
+        response = await execute(supabase.rpc('cohort_threshold_share', {
+            'p_metric_type': metric_type,
+            'p_channel': position,
+            'p_threshold': threshold,
+            'p_from': start.isoformat(),
+            'p_to': end.isoformat(),
+        }))
+        counts = (response.data or [{}])[0]
+    patients = int(counts.get('patients') or 0)
+    above = int(counts.get('patients_above') or 0)
+
+    return {
+        'metric_type': metric_type,
+        'channel': channel,
+        'unit': THRESHOLDS[channel].unit,
+        'threshold': threshold,
+        'start': start,
+        'end': end,
+        'patients': patients,
+        'patients_above': above,
+        'share': round(above / patients, 4) if patients else None,
+        'readings': int(counts.get('readings') or 0),
+    }
+
+
+async def weekly_distribution(metric_type: str, channel: Optional[str], start: datetime, end: datetime) -> dict:
+    """Readings, mean and percentiles per week between `start` and `end`"""
+    position = channel_position(metric_type, channel)
+    channel = CHANNELS[metric_type][position - 1]
+    bins = BINS[channel]
+    # Checked before the histogram is allocated (weeks x bins)
+    if week_span(start, end) > MAX_WEEKS:
+        raise ValueError(f"window must be at most {MAX_WEEKS} weeks")
+    histogram = WeeklyHistogram(bins, start, end)
+
+    response = await execute(supabase.rpc('cohort_weekly_histogram', {
+        'p_metric_type': metric_type,
+        'p_channel': position,
+        'p_low': bins.low,
+        'p_high': bins.high,
+        'p_buckets': bins.count,
+        'p_from': start.isoformat(),
+        'p_to': end.isoformat(),
+    }))
+    histogram.add_rows(response.data or [])
+    if metric_archive.months_between(start, end):
+        await asyncio.to_thread(_add_archived, histogram, metric_type, position, start, end)
+
+    return {
+        'metric_type': metric_type,
+        'channel': channel,
+        'unit': THRESHOLDS[channel].unit,
+        'start': start,
+        'end': end,
+        'weeks': histogram.weeks(),
+    }
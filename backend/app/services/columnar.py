@@ -0,0 +1,176 @@
+"""
+Compact MessagePack encoding for lists of rows
+
+Mobile and device clients can ask for MessagePack instead of JSON
+(`Accept: application/msgpack`, see serialization). Lists are then sent as
+one column-oriented table instead of a map per row, so field names appear
+once and each column is encoded by what it holds:
+
+- "dict": columns with few distinct values (user ids, types, units,
+  statuses, ...) as an index into the column's `dictionary`
+- "uuid": other ids as 16-byte binaries instead of 36-character strings
+- "time": timestamps (UTC) as integers in the column's `unit` ("s", "ms"
+  or "us", the coarsest that loses nothing): the first row's since the Unix
+  epoch, every later one as the difference from the previous non-null
+  value; nil for NULL
+- "plain": anything else, as is
+
+    {"rows": 2, "columns": [
+        {"name": "id", "encoding": "uuid", "values": [<16 bytes>, <16 bytes>]},
+        {"name": "recorded_at", "encoding": "time", "unit": "s", "values": [1718000000, -3600]},
+        {"name": "unit", "encoding": "dict", "dictionary": ["mmHg"], "values": [0, 0]},
+        ...
+    ]}
+
+Lists come out ordered by time, so the deltas are small integers that
+MessagePack writes in one to five bytes. decode_table() is the reference
+decoder; clients may upload tables in the same format.
+"""
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, List, Optional
+
+import msgpack
+
+from app.services.appointment_index import to_utc
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# Microseconds per time unit, coarsest first
+TIME_UNITS = {"s": 1_000_000, "ms": 1_000, "us": 1}
+# UUIDs as str(uuid.UUID(...)) writes them; only these round-trip through 16 bytes unchanged
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def _microseconds(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = to_utc(moment)
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+def _uuid_bytes(values: List[Any]) -> Optional[List[Optional[bytes]]]:
+    """The values as 16-byte UUIDs, or None unless every one is a UUID string in canonical form"""
+    match = _UUID.fullmatch
+    if not all(value is None or (isinstance(value, str) and match(value)) for value in values):
+        return None
+    return [None if value is None else bytes.fromhex(value.replace("-", "")) for value in values]
+
+
+def _uuid_string(value: bytes) -> str:
+    digits = bytes(value).hex()
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def _time_column(name: str, values: List[Optional[datetime]]) -> dict:
+    try:
+        micros = [None if value is None else (value - _EPOCH) // _MICROSECOND for value in values]
+    except TypeError:  # Naive datetimes
+        micros = [None if value is None else _microseconds(value) for value in values]
+    present = [value for value in micros if value is not None]
+    unit = next(unit for unit, size in TIME_UNITS.items() if all(value % size == 0 for value in present))
+    size = TIME_UNITS[unit]
+
+    deltas = []
+    previous = 0
+    for value in micros:
+        if value is None:
+            deltas.append(None)
+            continue
+        deltas.append((value - previous) // size)
+        previous = value
+    return {"name": name, "encoding": "time", "unit": unit, "values": deltas}
+
+
+def _dictionary_column(name: str, values: List[Any]) -> Optional[dict]:
+    """The column as indexes into its distinct values, or None if over half the values are distinct"""
+    try:
+        distinct = list(dict.fromkeys(values))
+    except TypeError:  # Unhashable values (lists, maps)
+        return None
+    if len(distinct) * 2 > len(values):
+        return None
+    index = {value: code for code, value in enumerate(distinct)}
+    return {"name": name, "encoding": "dict", "dictionary": distinct, "values": [index[value] for value in values]}
+
+
+def encode_column(name: str, values: List[Any]) -> dict:
+    """Encode one column's values (Python objects as a model dumps them)"""
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, datetime) and all(value is None or isinstance(value, datetime) for value in values):
+        return _time_column(name, values)
+
+    if isinstance(first, (Enum, date)):
+        values = [
+            value.value if isinstance(value, Enum)
+            else value.isoformat() if isinstance(value, date)
+            else value
+            for value in values
+        ]
+
+    column = _dictionary_column(name, values)
+    if column is not None:
+        return column
+
+    if isinstance(first, str):
+        ids = _uuid_bytes(values)
+        if ids is not None:
+            return {"name": name, "encoding": "uuid", "values": ids}
+
+    return {"name": name, "encoding": "plain", "values": values}
+
+
+def encode_table(rows: List[dict], names: List[str]) -> dict:
+    """Column-oriented table of rows as a model dumps them (Python mode), one column per name"""
+    return {
+        "rows": len(rows),
+        "columns": [encode_column(name, [row.get(name) for row in rows]) for name in names],
+    }
+
+
+def _decode_column(column: dict, rows: int) -> List[Any]:
+    encoding = column.get("encoding", "plain")
+    values = column["values"]
+    if len(values) != rows:
+        raise ValueError(f"column {column.get('name')!r} has {len(values)} values for {rows} rows")
+
+    if encoding == "plain":
+        return list(values)
+    if encoding == "uuid":
+        return [None if value is None else _uuid_string(value) for value in values]
+    if encoding == "dict":
+        dictionary = column["dictionary"]
+        return [None if value is None else dictionary[value] for value in values]
+    if encoding == "time":
+        size = TIME_UNITS[column["unit"]]
+        decoded = []
+        previous = 0
+        for value in values:
+            if value is None:
+                decoded.append(None)
+                continue
+            previous += value * size
+            decoded.append(_EPOCH + timedelta(microseconds=previous))
+        return decoded
+    raise ValueError(f"unknown column encoding {encoding!r}")
+
+
+def decode_table(table: dict) -> List[dict]:
+    """Rows of a table made by encode_table (ids as strings, times as aware UTC datetimes)"""
+    rows = table["rows"]
+    columns = {column["name"]: _decode_column(column, rows) for column in table["columns"]}
+    return [dict(zip(columns, row)) for row in zip(*columns.values())] if columns else [{} for _ in range(rows)]
+
+
+def is_table(data: Any) -> bool:
+    return isinstance(data, dict) and set(data) == {"rows", "columns"}
+
+
+def pack(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack(content: bytes) -> Any:
+    """Decode a MessagePack document (timestamps as aware datetimes)"""
+    return msgpack.unpackb(content, raw=False, timestamp=3)
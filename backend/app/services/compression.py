@@ -0,0 +1,341 @@
+"""
+Response compression
+
+CompressionMiddleware compresses response bodies for clients that send
+Accept-Encoding: with zstd or brotli when their packages (zstandard,
+brotli) are installed, and gzip otherwise, choosing by the client's
+q-values and then in that order. Responses are sent as they are when they
+are:
+
+- smaller than COMPRESSION_MIN_BYTES, already encoded, or not a text-like
+  type (JSON, MessagePack, text, XML, SVG); images, PDFs and archives are
+  compressed already
+- partial (206, 416 or any Content-Range), answers to HEAD, or marked
+  Cache-Control: no-transform
+
+Streamed bodies (file downloads) are compressed chunk by chunk and flushed
+after each one, so clients get data as it is produced; files handed to
+the server for zero-copy sending are read and compressed instead. A
+compressed response loses Content-Length and Accept-Ranges, gets
+Vary: Accept-Encoding, and its ETag is made weak, since its bytes differ
+from the uncompressed ones.
+
+Bodies sent in one piece with an ETag (the list endpoints) are kept
+compressed in an LRU cache of COMPRESSION_CACHE_MB keyed by (ETag,
+encoding), so a payload that many clients fetch is compressed once. A
+cached body is only reused if the new body's digest matches, so a reused
+ETag can never serve stale bytes.
+"""
+
+import asyncio
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from app.config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+# Bodies at least this large are compressed in a worker thread
+THREAD_BYTES = 64 * 1024
+# Chunk size when reading files handed over for zero-copy sending
+FILE_CHUNK_BYTES = 256 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/msgpack",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# compress(data), flush() (everything so far, stream stays open), finish()
+Compressor = Tuple[Callable[[bytes], bytes], Callable[[], bytes], Callable[[], bytes]]
+
+
+def _gzip() -> Compressor:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _brotli() -> Compressor:
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd() -> Compressor:
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), compressor.flush
+
+
+# Available encodings, preferred first
+ENCODERS: Dict[str, Callable[[], Compressor]] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = _zstd
+if brotli is not None:
+    ENCODERS["br"] = _brotli
+ENCODERS["gzip"] = _gzip
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The available encoding the client rates highest (ties go to ours), or None for identity"""
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in ENCODERS:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body"""
+    compress_chunk, _, finish = ENCODERS[encoding]()
+    return compress_chunk(body) + finish()
+
+
+def _compressible(headers: MutableHeaders, status: int) -> bool:
+    if status < 200 or status in (204, 206, 304, 416):
+        return False
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", "").lower():
+        return False
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith("+json")
+
+
+class CompressedCache:
+    """Compressed bodies per (ETag, encoding), LRU-evicted within `max_bytes`"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, bytes]]" = OrderedDict()
+
+    def get(self, etag: str, encoding: str, digest: bytes) -> Optional[bytes]:
+        entry = self._entries.get((etag, encoding))
+        if entry is None or entry[0] != digest:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((etag, encoding))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, etag: str, encoding: str, digest: bytes, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop((etag, encoding), None)
+        if old is not None:
+            self.bytes -= len(old[1])
+        self._entries[(etag, encoding)] = (digest, body)
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def count(self, size: int, compressed_size: int) -> None:
+        """Record a compressed response"""
+        self.responses += 1
+        self.bytes_in += size
+        self.bytes_out += compressed_size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'encodings': list(ENCODERS),
+            'responses': self.responses,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+        }
+
+
+compressed_cache = CompressedCache(settings.COMPRESSION_CACHE_MB * 1024 * 1024)
+
+
+async def _in_thread_if_large(function: Callable[[bytes], bytes], data: bytes) -> bytes:
+    if len(data) >= THREAD_BYTES:
+        return await asyncio.to_thread(function, data)
+    return function(data)
+
+
+class _CompressingSend:
+    """Wraps one response's `send`, deciding at its first body bytes whether to compress"""
+
+    def __init__(self, send, encoding: str, minimum_size: int, cache: CompressedCache):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.start: Optional[dict] = None
+        self.passthrough = False
+        self.buffer = b""
+        self.compressor: Optional[Compressor] = None
+        self.size = 0
+        self.compressed_size = 0
+
+    async def __call__(self, message: dict) -> None:
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.start = message
+            self.passthrough = not _compressible(MutableHeaders(scope=message), message["status"])
+            if self.passthrough:
+                await self.send(message)
+        elif self.passthrough:
+            await self.send(message)
+        elif kind == "http.response.body":
+            await self._body(message.get("body", b""), message.get("more_body", False))
+        elif kind == "http.response.pathsend":
+            await self._file(message["path"], 0, None, False)
+        elif kind == "http.response.zerocopysend":
+            await self._file(message["file"], message.get("offset") or 0, message.get("count"), message.get("more_body", False))
+        else:
+            await self.send(message)
+
+    def _compressed_start(self, content_length: Optional[int]) -> dict:
+        headers = MutableHeaders(scope=self.start)
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "accept-ranges" in headers:
+            del headers["accept-ranges"]
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = f"W/{etag}"
+        if content_length is None:
+            if "content-length" in headers:
+                del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        return self.start
+
+    async def _body(self, body: bytes, more_body: bool) -> None:
+        if self.compressor is None:
+            self.buffer += body
+            if not more_body:
+                await self._whole(self.buffer)
+                return
+            if len(self.buffer) < self.minimum_size:
+                return
+            # Large and still coming: compress as it streams
+            body, self.buffer = self.buffer, b""
+            self.compressor = ENCODERS[self.encoding]()
+            await self.send(self._compressed_start(None))
+
+        compress_chunk, flush, finish = self.compressor
+        chunk = await _in_thread_if_large(compress_chunk, body)
+        chunk += flush() if more_body else finish()
+        self.size += len(body)
+        self.compressed_size += len(chunk)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            self.cache.count(self.size, self.compressed_size)
+
+    async def _whole(self, body: bytes) -> None:
+        if len(body) < self.minimum_size:
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        etag = MutableHeaders(scope=self.start).get("etag")
+        compressed = None
+        if etag:
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            compressed = self.cache.get(etag, self.encoding, digest)
+        if compressed is None:
+            compressed = await _in_thread_if_large(lambda data: compress(data, self.encoding), body)
+            if etag:
+                self.cache.put(etag, self.encoding, digest, compressed)
+
+        self.cache.count(len(body), len(compressed))
+        await self.send(self._compressed_start(len(compressed)))
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    async def _file(self, file, offset: int, count: Optional[int], more_body: bool) -> None:
+        """Read a file handed over for zero-copy sending (a path or an open file) through the compressor"""
+        fd = await asyncio.to_thread(os.open, file, os.O_RDONLY) if isinstance(file, (str, os.PathLike)) else file.fileno()
+        try:
+            if count is None:
+                count = os.fstat(fd).st_size - offset
+            position, end = offset, offset + count
+            while position < end:
+                chunk = await asyncio.to_thread(os.pread, fd, min(FILE_CHUNK_BYTES, end - position), position)
+                if not chunk:
+                    # The file shrank underneath us; the client gets a short body
+                    break
+                position += len(chunk)
+                if position >= end:
+                    await self._body(chunk, more_body)
+                    return
+                await self._body(chunk, True)
+            await self._body(b"", more_body)
+        finally:
+            if isinstance(file, (str, os.PathLike)):
+                os.close(fd)
+
+
+class CompressionMiddleware:
+    """Compresses responses for clients that accept it (see the module docstring)"""
+
+    def __init__(self, app, minimum_size: int = 1024, cache: CompressedCache = compressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = next((value for key, value in scope["headers"] if key == b"accept-encoding"), None)
+        encoding = choose_encoding(accept_encoding.decode("latin-1") if accept_encoding else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size, self.cache))
@@ -1,25 +1,130 @@
 """
 Database service using Supabase
+
+Every PostgREST request goes through `db_breaker`: requests time out after
+DB_TIMEOUT_SECONDS, and after DB_BREAKER_FAILURES timeouts, connection
+errors or gateway errors (502-504) in a row, requests fail at once with
+DatabaseUnavailable for DB_BREAKER_RESET_SECONDS, when one is let through
+to check whether the database is back.
 """
 
-from supabase import create_client, Client
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Optional
 from app.config import settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.services.singleflight import read_coalescer, read_key
 from loguru import logger
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_KEY
-)
+if TYPE_CHECKING:
+    from supabase import Client
+
+_client: Optional["Client"] = None
+_client_lock = threading.Lock()
+
+# PostgREST answers with these when it cannot reach or wait for Postgres
+_UNAVAILABLE_STATUSES = (502, 503, 504)
+
+db_breaker = CircuitBreaker("Database", settings.DB_BREAKER_FAILURES, settings.DB_BREAKER_RESET_SECONDS)
+
+class DatabaseUnavailable(Exception):
+    """The database timed out, could not be reached, or its circuit is open"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
 
-logger.info("Supabase client initialized")
+class _GuardedTransport:
+    """The PostgREST client's HTTP transport, behind `db_breaker`"""
+    
+    def __init__(self, transport):
+        self.transport = transport
+    
+    def handle_request(self, request):
+        import httpx
+        
+        try:
+            db_breaker.acquire()
+        except CircuitOpen as e:
+            raise DatabaseUnavailable(str(e), e.retry_after) from None
+        
+        try:
+            response = self.transport.handle_request(request)
+        except httpx.TransportError as e:
+            db_breaker.failure()
+            raise DatabaseUnavailable(f"Database request failed: {e!r}", db_breaker.retry_after()) from e
+        except BaseException:
+            db_breaker.release()
+            raise
+        
+        if response.status_code in _UNAVAILABLE_STATUSES:
+            response.close()
+            db_breaker.failure()
+            raise DatabaseUnavailable(f"Database unavailable (HTTP {response.status_code})", db_breaker.retry_after())
+        db_breaker.success()
+        return response
+    
+    def close(self):
+        self.transport.close()
+    
+    def __enter__(self):
+        self.transport.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.transport.__exit__(*exc_info)
+
+def get_supabase() -> "Client":
+    """Create the Supabase client on first use (importing supabase is slow)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import ClientOptions, create_client
+                
+                _client = create_client(
+                    settings.SUPABASE_URL,
+                    settings.SUPABASE_KEY,
+                    options=ClientOptions(postgrest_client_timeout=settings.DB_TIMEOUT_SECONDS)
+                )
+                session = _client.postgrest.session
+                session._transport = _GuardedTransport(session._transport)
+                logger.info("Supabase client initialized")
+    return _client
+
+class _LazySupabase:
+    """Stand-in for the client so modules can import `supabase` before it exists"""
+    
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
+
+supabase = _LazySupabase()
+
+async def execute(query):
+    """
+    Run a Supabase query without blocking the event loop
+    
+    Identical reads already in flight share one call; a write makes later
+    reads of its table start afresh. Raises DatabaseUnavailable when the
+    database is down or too slow (see the module docstring).
+    """
+    key = read_key(query)
+    if key is not None:
+        return await read_coalescer.do(key, lambda: asyncio.to_thread(query.execute))
+    
+    try:
+        return await asyncio.to_thread(query.execute)
+    finally:
+        table = str(getattr(query, 'path', '')).lstrip('/')
+        read_coalescer.forget(lambda key: key[0] == table)
 
 async def init_database():
     """Initialize database tables if they don't exist"""
     try:
         # Tables are created via Supabase dashboard or SQL migrations
         # This function can be used for any initialization logic
+        get_supabase()
         logger.info("Database initialized")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: {}", e)
         raise
@@ -0,0 +1,349 @@
+"""
+Content-addressed document storage
+
+Uploads are streamed straight from the multipart request body to a temporary
+file in DOCUMENT_STORAGE_DIR, hashed on the way, and then moved to
+<sha256[:2]>/<sha256>. Identical content is stored once however many
+documents refer to it. Memory per upload is bounded by the flush size plus
+one request chunk, whatever the file size.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import settings
+from app.services.changes import record_changed, DOCUMENTS
+from app.services.database import execute, supabase
+
+# Buffered upload bytes written (and hashed) per worker-thread hop
+FLUSH_BYTES = 1024 * 1024
+# Largest accepted value for a plain (non-file) form field
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class BlobWriter:
+    """
+    Accumulates one upload, hashing and writing it to a temporary file
+
+    Writes are pipelined: a full buffer is handed to a worker thread while
+    the next one fills, so parsing overlaps with hashing and disk I/O and at
+    most two buffers are held.
+    """
+
+    def __init__(self, temp_path: Path):
+        self.temp_path = temp_path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+        self._writing: Optional[asyncio.Future] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.size += len(data)
+
+    def _write_buffer(self, data: bytearray) -> None:
+        if self._file is None:
+            self._file = open(self.temp_path, "wb")
+        # hashlib and file writes release the GIL for large buffers
+        self._hash.update(data)
+        self._file.write(data)
+
+    async def flush(self) -> None:
+        """Start writing the buffered bytes (after the previous write has finished)"""
+        if self._writing is not None:
+            await self._writing
+        data, self._buffer = self._buffer, bytearray()
+        self._writing = asyncio.ensure_future(asyncio.to_thread(self._write_buffer, data))
+
+    async def close(self) -> str:
+        """Write what is left and return the content hash"""
+        await self.flush()
+        await self._writing
+        self._writing = None
+        await asyncio.to_thread(self._file.close)
+        return self._hash.hexdigest()
+
+    def discard(self) -> None:
+        if self._writing is not None and not self._writing.done():
+            # Let the in-flight write finish before removing its file
+            self._writing.add_done_callback(self._discard_after)
+            return
+        if self._file is not None:
+            self._file.close()
+        self.temp_path.unlink(missing_ok=True)
+
+    def _discard_after(self, writing: asyncio.Future) -> None:
+        if not writing.cancelled():
+            writing.exception()
+        self.discard()
+
+
+class DocumentStore:
+    """Blobs on local disk, addressed by their sha256"""
+
+    def __init__(self, root: str, lock_stripes: int = 64):
+        self.root = Path(root)
+        # Placing and removing a blob are serialized per hash, so deleting the
+        # last document never races with a new upload of the same content
+        self._locks = [asyncio.Lock() for _ in range(lock_stripes)]
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def lock(self, sha256: str) -> asyncio.Lock:
+        return self._locks[int(sha256[:8], 16) % len(self._locks)]
+
+    def writer(self) -> BlobWriter:
+        temp_dir = self.root / "tmp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return BlobWriter(temp_dir / f"{uuid.uuid4().hex}.part")
+
+    def _place(self, temp_path: Path, sha256: str) -> bool:
+        target = self.path(sha256)
+        if target.exists():
+            temp_path.unlink(missing_ok=True)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, target)
+        return True
+
+    async def place(self, writer: BlobWriter, sha256: str) -> bool:
+        """Move a finished upload into place; False if the content was already stored"""
+        return await asyncio.to_thread(self._place, writer.temp_path, sha256)
+
+    async def remove(self, sha256: str) -> None:
+        await asyncio.to_thread(self.path(sha256).unlink, True)
+
+
+@dataclass
+class Upload:
+    """A streamed multipart upload: the stored file and the other form fields"""
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    writer: BlobWriter
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+def _disposition(headers: Dict[bytes, bytes]) -> Tuple[str, Optional[str]]:
+    """Form field name and filename (None for plain fields) of a part"""
+    _, params = parse_options_header(headers.get(b"content-disposition", b""))
+    name = params.get(b"name", b"").decode("utf-8", "replace")
+    filename = params.get(b"filename")
+    return name, None if filename is None else os.path.basename(filename.decode("utf-8", "replace"))
+
+
+async def receive_upload(request: Request, store: DocumentStore, max_bytes: int, file_field: str = "file") -> Upload:
+    """
+    Stream a multipart/form-data request with one file part into `store`
+
+    The caller places the blob (`store.place`) or discards it (`writer.discard`).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected a multipart/form-data upload"
+        )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MAX_FIELD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Documents are limited to {max_bytes // (1024 * 1024)} MB"
+        )
+
+    writer: Optional[BlobWriter] = None
+    fields: Dict[str, str] = {}
+    file_info: Dict[str, str] = {}
+    part = {"headers": {}, "field": b"", "value": b"", "name": "", "filename": None, "data": bytearray()}
+
+    def on_part_begin() -> None:
+        part.update(headers={}, name="", filename=None, data=bytearray())
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        part["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        part["value"] += data[start:end]
+
+    def on_header_end() -> None:
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"], part["value"] = b"", b""
+
+    def on_headers_finished() -> None:
+        nonlocal writer
+        part["name"], part["filename"] = _disposition(part["headers"])
+        if part["filename"] is None:
+            return
+        if part["name"] != file_field or writer is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Upload exactly one file in the '{file_field}' field"
+            )
+        writer = store.writer()
+        file_info["filename"] = part["filename"]
+        file_info["content_type"] = part["headers"].get(b"content-type", b"").decode("latin-1").strip()
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if part["filename"] is not None:
+            writer.write(data[start:end])
+            return
+        part["data"] += data[start:end]
+        if len(part["data"]) > MAX_FIELD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Form field '{part['name']}' is too long"
+            )
+
+    def on_part_end() -> None:
+        if part["filename"] is None:
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    def on_end() -> None:
+        part["complete"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if writer is None:
+                continue
+            if writer.size > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Documents are limited to {max_bytes // (1024 * 1024)} MB"
+                )
+            if writer.pending >= FLUSH_BYTES:
+                await writer.flush()
+        parser.finalize()
+
+        if not part.get("complete"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Incomplete multipart upload"
+            )
+        if writer is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Upload exactly one file in the '{file_field}' field"
+            )
+        sha256 = await writer.close()
+    except HTTPException:
+        if writer is not None:
+            writer.discard()
+        raise
+    except Exception as e:
+        if writer is not None:
+            writer.discard()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed multipart upload"
+        ) from e
+
+    return Upload(
+        filename=file_info["filename"] or "document",
+        content_type=file_info["content_type"] or "application/octet-stream",
+        size=writer.size,
+        sha256=sha256,
+        writer=writer,
+        fields=fields,
+    )
+
+
+document_store = DocumentStore(settings.DOCUMENT_STORAGE_DIR)
+
+
+async def save_upload(
+    user_id: str,
+    upload: Upload,
+    title: str,
+    category: str,
+    notes: Optional[str] = None
+) -> Tuple[dict, bool]:
+    """
+    Store an upload's content and create its document
+
+    Returns (document, duplicate): when the user already has a document with
+    identical content, that document is returned and the upload discarded.
+    """
+    async with document_store.lock(upload.sha256):
+        existing = await execute(
+            supabase.table('documents').select('*').eq(
+                'user_id', user_id
+            ).eq('sha256', upload.sha256)
+        )
+        if existing.data:
+            upload.writer.discard()
+            return existing.data[0], True
+
+        placed = await document_store.place(upload.writer, upload.sha256)
+        document_data = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'title': title[:255],
+            'category': category,
+            'filename': upload.filename[:255],
+            'content_type': upload.content_type[:255],
+            'size_bytes': upload.size,
+            'sha256': upload.sha256,
+            'notes': notes,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+
+        try:
+            result = await execute(supabase.table('documents').insert(document_data))
+        except Exception:
+            if placed:
+                await document_store.remove(upload.sha256)
+            raise
+
+    document = result.data[0] if result.data else document_data
+    record_changed(user_id, DOCUMENTS, document)
+    return document, False
+
+
+async def save_bytes(
+    user_id: str,
+    data: bytes,
+    filename: str,
+    content_type: str,
+    title: str,
+    category: str,
+    notes: Optional[str] = None
+) -> Tuple[dict, bool]:
+    """Store generated content (exports, reports) as a document of the user"""
+    writer = document_store.writer()
+    writer.write(data)
+    try:
+        sha256 = await writer.close()
+    except Exception:
+        writer.discard()
+        raise
+    upload = Upload(filename=filename, content_type=content_type, size=len(data), sha256=sha256, writer=writer)
+    return await save_upload(user_id, upload, title, category, notes)
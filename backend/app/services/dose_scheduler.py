@@ -0,0 +1,448 @@
+"""
+Medication dose scheduling
+
+Parses free-text medication frequencies into structured schedules and keeps
+the next due dose of every active medication in a min-heap, so due doses are
+emitted in O(log n) each instead of scanning the medications table.
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from loguru import logger
+
+from app.services.changes import Change, subscribe, subscribe_reset, MEDICATIONS
+from app.services.database import execute, supabase
+
+# Default clock times used when a frequency only says how many doses per day
+DEFAULT_DOSE_TIMES: Dict[int, Tuple[time, ...]] = {
+    1: (time(8, 0),),
+    2: (time(8, 0), time(20, 0)),
+    3: (time(8, 0), time(14, 0), time(20, 0)),
+    4: (time(8, 0), time(12, 0), time(16, 0), time(20, 0)),
+}
+
+# Anchor for interval schedules such as "every 8 hours"
+FIRST_DOSE_TIME = time(8, 0)
+
+_WORD_COUNTS = {
+    "once": 1, "one": 1, "twice": 2, "two": 2, "three": 3, "thrice": 3,
+    "four": 4, "five": 5, "six": 6,
+}
+
+_ABBREVIATIONS = {
+    "qd": 1, "od": 1, "daily": 1, "bid": 2, "bd": 2, "tid": 3, "tds": 3, "qid": 4,
+}
+
+_AS_NEEDED = re.compile(r"\b(prn|as needed|when needed|if needed)\b")
+_TIMES_PER_DAY = re.compile(
+    r"\b(\d+|once|one|twice|two|three|thrice|four|five|six)\s*(?:x|times?)?\s*(?:a|per|each|every|/)?\s*(?:day|daily)\b"
+)
+_EVERY_HOURS = re.compile(r"\b(?:every|q)\s*(\d+)\s*(?:-\s*\d+\s*)?(?:h|hr|hrs|hours?)\b")
+_EVERY_DAYS = re.compile(r"\bevery\s*(\d+)\s*days?\b")
+
+
+@dataclass(frozen=True)
+class DoseSchedule:
+    """Structured dosing schedule: clock times on every `every_days`-th day"""
+    times_of_day: Tuple[time, ...]
+    every_days: int = 1
+
+    @property
+    def doses_per_day(self) -> int:
+        return len(self.times_of_day)
+
+    def next_after(
+        self,
+        after: datetime,
+        start_date: date,
+        end_date: Optional[date] = None
+    ) -> Optional[datetime]:
+        """First dose strictly after `after`, or None once the course has ended"""
+        day = max(after.date(), start_date)
+        offset = (day - start_date).days % self.every_days
+        if offset:
+            day += timedelta(days=self.every_days - offset)
+
+        while end_date is None or day <= end_date:
+            for dose_time in self.times_of_day:
+                due = datetime.combine(day, dose_time)
+                if due > after:
+                    return due
+            day += timedelta(days=self.every_days)
+
+        return None
+
+    def slot_for(self, moment: datetime) -> int:
+        """Index of the dose slot within its day closest to `moment`"""
+        minutes = moment.hour * 60 + moment.minute
+        return min(
+            range(len(self.times_of_day)),
+            key=lambda i: abs(self.times_of_day[i].hour * 60 + self.times_of_day[i].minute - minutes)
+        )
+
+
+def _spread_times(count: int) -> Tuple[time, ...]:
+    """Clock times for `count` doses spread over waking hours"""
+    if count in DEFAULT_DOSE_TIMES:
+        return DEFAULT_DOSE_TIMES[count]
+    step = (14 * 60) // (count - 1)
+    return tuple(
+        time((8 * 60 + i * step) // 60, (8 * 60 + i * step) % 60) for i in range(count)
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_frequency(frequency: str) -> Optional[DoseSchedule]:
+    """
+    Parse a free-text frequency into a DoseSchedule
+
+    Understands phrases like "twice daily", "3 times a day", "every 8 hours",
+    "every other day", "weekly", "at bedtime" and the common BID/TID/QID/q6h
+    abbreviations. Returns None for as-needed or unrecognised frequencies,
+    which simply get no reminders.
+    """
+    text = (frequency or "").strip().lower()
+    if not text or _AS_NEEDED.search(text):
+        return None
+
+    every_days = 1
+    if re.search(r"\b(every other day|alternate days|qod)\b", text):
+        every_days = 2
+    elif re.search(r"\b(weekly|once a week|every week)\b", text):
+        every_days = 7
+    elif re.search(r"\b(monthly|once a month|every month)\b", text):
+        every_days = 30
+    else:
+        match = _EVERY_DAYS.search(text)
+        if match:
+            every_days = max(int(match.group(1)), 1)
+
+    match = _EVERY_HOURS.search(text)
+    if match:
+        hours = int(match.group(1))
+        if hours <= 0:
+            return None
+        if hours >= 24:
+            if hours % 24:
+                return None
+            return DoseSchedule((FIRST_DOSE_TIME,), every_days=hours // 24)
+        if 24 % hours:
+            return None
+        first = FIRST_DOSE_TIME.hour
+        return DoseSchedule(
+            tuple(sorted(time((first + i * hours) % 24, 0) for i in range(24 // hours))),
+            every_days=every_days
+        )
+
+    if re.search(r"\b(bedtime|nightly|qhs|at night)\b", text):
+        return DoseSchedule((time(21, 0),), every_days=every_days)
+    if re.search(r"\b(every morning|in the morning|qam)\b", text):
+        return DoseSchedule((time(8, 0),), every_days=every_days)
+    if re.search(r"\b(every evening|in the evening)\b", text):
+        return DoseSchedule((time(20, 0),), every_days=every_days)
+
+    count = None
+    match = _TIMES_PER_DAY.search(text)
+    if match:
+        word = match.group(1)
+        count = int(word) if word.isdigit() else _WORD_COUNTS[word]
+    else:
+        for abbreviation, doses in _ABBREVIATIONS.items():
+            if re.search(rf"\b{abbreviation}\b", text):
+                count = doses
+                break
+
+    if count is None:
+        if every_days > 1 or re.search(r"\b(once|every day|each day)\b", text):
+            count = 1
+        else:
+            return None
+    if count <= 0 or count > 24:
+        return None
+
+    return DoseSchedule(_spread_times(count), every_days=every_days)
+
+
+def parse_date(value: Union[date, str, None]) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+@dataclass(frozen=True)
+class DueDose:
+    """A dose that is (or will become) due"""
+    medication_id: str
+    user_id: str
+    name: str
+    dosage: str
+    due_at: datetime
+
+
+@dataclass
+class _Entry:
+    medication_id: str
+    user_id: str
+    name: str
+    dosage: str
+    schedule: DoseSchedule
+    start_date: date
+    end_date: Optional[date]
+    next_due: Optional[datetime] = None
+    generation: int = 0
+
+
+DueListener = Callable[[DueDose], Union[Awaitable[None], None]]
+
+
+class DoseScheduler:
+    """
+    In-process scheduler tracking the next due dose of every active medication
+
+    Heap items are (due_at, seq, medication_id, generation); rescheduling or
+    removing a medication bumps its generation so superseded heap items are
+    skipped lazily when they surface, and the heap is compacted whenever
+    stale items outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str, int]] = []
+        self._entries: Dict[str, _Entry] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._listeners: List[DueListener] = []
+        self._seq = itertools.count()
+        self._stale = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_listener(self, listener: DueListener) -> None:
+        """Register a callback invoked for every dose that becomes due"""
+        self._listeners.append(listener)
+
+    def schedule(self, medication: dict, now: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Track (or re-track) a medication row and return its next due dose
+
+        Inactive medications, finished courses and unparseable frequencies
+        are removed from the scheduler.
+        """
+        medication_id = str(medication['id'])
+        schedule = parse_frequency(medication.get('frequency', ''))
+        if not medication.get('active', True) or schedule is None:
+            self.unschedule(medication_id)
+            return None
+
+        previous = self._entries.get(medication_id)
+        entry = _Entry(
+            medication_id=medication_id,
+            user_id=str(medication['user_id']),
+            name=medication.get('name', ''),
+            dosage=medication.get('dosage', ''),
+            schedule=schedule,
+            start_date=parse_date(medication.get('start_date')) or date.today(),
+            end_date=parse_date(medication.get('end_date')),
+            generation=previous.generation + 1 if previous else 0,
+        )
+        entry.next_due = schedule.next_after(now or datetime.now(), entry.start_date, entry.end_date)
+        if entry.next_due is None:
+            self.unschedule(medication_id)
+            return None
+        if previous is not None:
+            self._stale += 1
+
+        self._entries[medication_id] = entry
+        self._by_user.setdefault(entry.user_id, set()).add(medication_id)
+        self._push(entry)
+        return entry.next_due
+
+    def unschedule(self, medication_id: str) -> None:
+        """Stop tracking a medication"""
+        entry = self._entries.pop(str(medication_id), None)
+        if entry is None:
+            return
+
+        user_meds = self._by_user.get(entry.user_id)
+        if user_meds is not None:
+            user_meds.discard(entry.medication_id)
+            if not user_meds:
+                del self._by_user[entry.user_id]
+
+        self._stale += 1
+        if self._stale > len(self._entries):
+            self._compact()
+
+    def peek(self) -> Optional[datetime]:
+        """Due time of the earliest tracked dose"""
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+            self._stale -= 1
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[DueDose]:
+        """Remove and return every dose due at or before `now`, scheduling the next one"""
+        now = now or datetime.now()
+        due: List[DueDose] = []
+
+        while self._heap and self._heap[0][0] <= now:
+            item = heapq.heappop(self._heap)
+            if self._is_stale(item):
+                self._stale -= 1
+                continue
+
+            entry = self._entries[item[2]]
+            due.append(DueDose(entry.medication_id, entry.user_id, entry.name, entry.dosage, item[0]))
+
+            entry.next_due = entry.schedule.next_after(item[0], entry.start_date, entry.end_date)
+            if entry.next_due is None:
+                self._entries.pop(entry.medication_id)
+                user_meds = self._by_user[entry.user_id]
+                user_meds.discard(entry.medication_id)
+                if not user_meds:
+                    del self._by_user[entry.user_id]
+            else:
+                entry.generation += 1
+                self._push(entry)
+
+        return due
+
+    def upcoming(self, user_id: str, until: datetime, now: Optional[datetime] = None) -> List[DueDose]:
+        """All doses of a user's tracked medications due between now and `until`"""
+        now = now or datetime.now()
+        doses: List[DueDose] = []
+
+        for medication_id in self._by_user.get(user_id, ()):
+            entry = self._entries[medication_id]
+            due_at = entry.next_due
+            while due_at is not None and due_at <= until:
+                if due_at >= now:
+                    doses.append(DueDose(entry.medication_id, entry.user_id, entry.name, entry.dosage, due_at))
+                due_at = entry.schedule.next_after(due_at, entry.start_date, entry.end_date)
+
+        doses.sort(key=lambda dose: dose.due_at)
+        return doses
+
+    async def run(self) -> None:
+        """Emit due doses to listeners until cancelled"""
+        self._wakeup = asyncio.Event()
+        while True:
+            next_due = self.peek()
+            timeout = None if next_due is None else max((next_due - datetime.now()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            for dose in self.pop_due():
+                for listener in self._listeners:
+                    try:
+                        result = listener(dose)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as e:
+                        logger.error("Dose listener error: {}", e)
+
+    def _push(self, entry: _Entry) -> None:
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (entry.next_due, next(self._seq), entry.medication_id, entry.generation))
+        if self._wakeup is not None and (earliest is None or entry.next_due < earliest):
+            self._wakeup.set()
+
+    def _is_stale(self, item: Tuple[datetime, int, str, int]) -> bool:
+        entry = self._entries.get(item[2])
+        return entry is None or entry.generation != item[3]
+
+    def _compact(self) -> None:
+        self._heap = [item for item in self._heap if not self._is_stale(item)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+
+# Process-wide scheduler used by the API and the agent tools
+dose_scheduler = DoseScheduler()
+
+
+def log_due_dose(dose: DueDose) -> None:
+    """Default listener: record reminders in the application log"""
+    logger.info("Dose due: {} {} for user {} at {}", dose.name, dose.dosage, dose.user_id, dose.due_at.isoformat())
+
+
+dose_scheduler.add_listener(log_due_dose)
+
+
+def _on_medication_change(change: Change) -> None:
+    if change.deleted:
+        dose_scheduler.unschedule(change.record_id)
+    else:
+        dose_scheduler.schedule(change.record)
+
+
+# Reloads started by resets, kept so they are not garbage collected mid-run
+_reloads: Set[asyncio.Task] = set()
+
+
+async def _reload_user(user_id: str, page_size: int = 1000) -> None:
+    """Re-track a user's active medications from the database"""
+    try:
+        rows: List[dict] = []
+        while True:
+            response = await execute(
+                supabase.table('medications').select(
+                    'id, user_id, name, dosage, frequency, start_date, end_date, active'
+                ).eq('user_id', user_id).eq('active', True).order('id').range(len(rows), len(rows) + page_size - 1)
+            )
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                break
+    except Exception as e:
+        logger.error("Failed to reload medications of user {}: {}", user_id, e)
+        return
+
+    active = {str(row['id']) for row in rows}
+    for medication_id in dose_scheduler._by_user.get(user_id, set()) - active:
+        dose_scheduler.unschedule(medication_id)
+    for row in rows:
+        dose_scheduler.schedule(row)
+
+
+def _on_reset(user_id: str, resource: str) -> None:
+    if resource == MEDICATIONS:
+        task = asyncio.get_running_loop().create_task(_reload_user(user_id))
+        _reloads.add(task)
+        task.add_done_callback(_reloads.discard)
+
+
+subscribe(MEDICATIONS, _on_medication_change)
+subscribe_reset(_on_reset)
+
+
+async def load_active_medications(page_size: int = 1000) -> int:
+    """Seed the scheduler with every active medication (run once at startup)"""
+    loaded = 0
+    offset = 0
+    while True:
+        response = await execute(
+            supabase.table('medications').select(
+                'id, user_id, name, dosage, frequency, start_date, end_date, active'
+            ).eq('active', True).order('id').range(offset, offset + page_size - 1)
+        )
+        rows = response.data or []
+        for row in rows:
+            if dose_scheduler.schedule(row) is not None:
+                loaded += 1
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+    logger.info("Dose scheduler loaded {} active schedules", loaded)
+    return loaded
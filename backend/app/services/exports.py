@@ -0,0 +1,82 @@
+"""
+Data export job
+
+Collects everything stored for a user into one JSON file and saves it as a
+document, so large exports are built in the background and downloaded with
+range requests like any other document.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from app.services.database import execute, supabase
+from app.services.documents import save_bytes
+from app.services.jobs import job
+
+EXPORT_DATA = "export_data"
+
+# Tables exported, with the column ordering each one's rows
+EXPORTED_TABLES = {
+    'medications': 'created_at',
+    'dose_events': 'scheduled_for',
+    'appointments': 'date_time',
+    'health_metrics': 'recorded_at',
+    'health_alerts': 'created_at',
+    'documents': 'created_at',
+}
+
+# Rows per request: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+
+async def _user_rows(table: str, user_id: str, column: str) -> list:
+    """All of a user's rows in a table, a page at a time"""
+    rows = []
+    while True:
+        # Ordered by id as well, so rows sharing a timestamp keep their order between pages
+        response = await execute(
+            supabase.table(table).select('*').eq('user_id', user_id).order(column).order('id').range(
+                len(rows), len(rows) + PAGE_ROWS - 1
+            )
+        )
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_ROWS:
+            return rows
+
+
+@job(EXPORT_DATA)
+async def export_data(user_id: str, payload: dict) -> dict:
+    """Export the user's records as JSON; the result names the created document"""
+    tables = await asyncio.gather(*(
+        _user_rows(table, user_id, column) for table, column in EXPORTED_TABLES.items()
+    ))
+    exported_at = datetime.now(timezone.utc)
+    export = {
+        'exported_at': exported_at.isoformat(),
+        'user_id': user_id,
+        **dict(zip(EXPORTED_TABLES, tables)),
+    }
+
+    # Readings from months archived out of the database come first, being older
+    # (imported on first use: it loads NumPy, which would slow down startup)
+    from app.services.metric_archive import metric_archive
+    archived = await asyncio.to_thread(metric_archive.user_rows, user_id)
+    export['health_metrics'] = archived + export['health_metrics']
+
+    data = await asyncio.to_thread(lambda: json.dumps(export, default=str, indent=1).encode())
+    document, _ = await save_bytes(
+        user_id,
+        data,
+        filename=f"medical-data-{exported_at:%Y-%m-%d}.json",
+        content_type="application/json",
+        title=f"Data export {exported_at:%Y-%m-%d %H:%M} UTC",
+        category="other",
+    )
+
+    return {
+        'document_id': document['id'],
+        'size_bytes': len(data),
+        'records': {table: len(export[table]) for table in EXPORTED_TABLES},
+    }
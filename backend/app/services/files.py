@@ -0,0 +1,149 @@
+"""
+File downloads with HTTP Range support
+
+FileRangeResponse serves a whole file or one byte range of it (206 Partial
+Content, 416 when the range is outside the file). Where the ASGI server
+offers the zero-copy extensions it hands over the file instead of reading
+it: `http.response.zerocopysend` (sendfile on an open descriptor, used for
+ranges too) or `http.response.pathsend` (whole files). Otherwise the file
+is read in chunks in a worker thread with os.pread, so the event loop never
+blocks and at most one chunk per download is held in memory.
+"""
+
+import asyncio
+import os
+from typing import Mapping, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_BYTES = 256 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single-range `Range` header
+
+    Returns None when the whole file should be sent (no header, a malformed
+    one, or several ranges, which servers may answer with the full content)
+    and raises RangeNotSatisfiable when the range lies outside the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, dash, last = header[6:].strip().partition("-")
+    if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def content_disposition(filename: str, inline: bool) -> str:
+    kind = "inline" if inline else "attachment"
+    ascii_name = filename.encode("ascii", "ignore").decode().replace('"', "") or "download"
+    return f"{kind}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+class FileRangeResponse(Response):
+    """A file, or one byte range of it, streamed without loading it into memory"""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        media_type: str,
+        request_headers: Mapping[str, str],
+        etag: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        send_body: bool = True,
+    ):
+        self.path = path
+        self.send_body = send_body
+        self.background = None
+        self.media_type = media_type
+
+        # If-Range: only honour the range while the client's copy is current
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_range is not None and if_range != etag:
+            range_header = None
+
+        extra = {"accept-ranges": "bytes", **(headers or {})}
+        if etag:
+            extra["etag"] = etag
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.start, self.length = 0, 0
+            extra["content-range"] = f"bytes */{size}"
+        else:
+            if byte_range is None:
+                self.status_code = 200
+                self.start, self.length = 0, size
+            else:
+                self.status_code = 206
+                self.start, self.length = byte_range[0], byte_range[1] - byte_range[0] + 1
+                extra["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        self.whole_file = self.status_code == 200
+        if self.status_code == 416:
+            self.media_type = None
+
+        extra["content-length"] = str(self.length)
+        self.init_headers(extra)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            file = await asyncio.to_thread(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            finally:
+                file.close()
+            return
+        if self.whole_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            position, remaining = self.start, self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, fd, min(CHUNK_BYTES, remaining), position)
+                if not chunk:
+                    # The file shrank underneath us; the client sees a short body
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
@@ -0,0 +1,172 @@
+"""
+Offline drug interaction checking
+
+The interaction dataset (app/data/drug_interactions.json, or the file named
+by DRUG_INTERACTIONS_PATH) is compiled once into:
+
+- a name table mapping every normalized generic name and synonym to a drug id
+- a pair table keyed by the two drug ids packed into one int
+
+so checking a new medication against a user's k active medications is k
+dictionary lookups. Free-text medication names ("Lipitor 20mg tablets") are
+resolved by dropping dose/form words and matching the longest known names.
+"""
+
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services.database import execute, supabase
+
+DEFAULT_DATASET = Path(__file__).resolve().parent.parent / "data" / "drug_interactions.json"
+
+SEVERITY_RANK = {"contraindicated": 0, "major": 1, "moderate": 2, "minor": 3}
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_DOSE = re.compile(r"^\d+(\.\d+)?(mg|mcg|ug|g|ml|iu|units?|%)?$")
+_FORM_WORDS = frozenset({
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "oral", "solution",
+    "suspension", "syrup", "injection", "cream", "patch", "er", "xr", "xl", "sr", "cr", "dr", "ec",
+    "mg", "mcg", "ml", "daily", "extended", "release", "delayed", "chewable", "hcl", "sodium",
+})
+
+
+@lru_cache(maxsize=4096)
+def normalize_drug_name(name: str) -> Tuple[str, ...]:
+    """Lowercased, accent-free words of a drug name without dose and form words"""
+    text = unicodedata.normalize("NFKD", name.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return tuple(
+        word for word in _NON_WORD.sub(" ", text).split()
+        if word not in _FORM_WORDS and not _DOSE.match(word)
+    )
+
+
+@dataclass(frozen=True)
+class Interaction:
+    severity: str
+    description: str
+
+
+class InteractionIndex:
+    """Drug names and interacting pairs compiled for constant-time lookups"""
+
+    def __init__(self, drugs: Dict[str, List[str]], interactions: List[dict]):
+        self.drug_names: List[str] = []
+        self._ids: Dict[Tuple[str, ...], int] = {}
+        self._pairs: Dict[int, Interaction] = {}
+
+        for generic, synonyms in drugs.items():
+            drug_id = len(self.drug_names)
+            self.drug_names.append(generic)
+            for name in (generic, *synonyms):
+                words = normalize_drug_name(name)
+                if not words:
+                    continue
+                existing = self._ids.setdefault(words, drug_id)
+                if existing != drug_id:
+                    raise ValueError(f"Drug name '{name}' is listed for both {self.drug_names[existing]} and {generic}")
+        self._longest = max((len(words) for words in self._ids), default=1)
+
+        # Pairs normally name drugs by their generic name, which skips normalization
+        generic_ids = {generic: drug_id for drug_id, generic in enumerate(self.drug_names)}
+        # Many pairs share a severity and text; keep one object for each
+        shared: Dict[Tuple[str, str], Interaction] = {}
+        for entry in interactions:
+            first, second = (
+                generic_ids[name] if name in generic_ids else self._ids[normalize_drug_name(name)]
+                for name in entry["drugs"]
+            )
+            details = (entry["severity"], entry["description"])
+            interaction = shared.get(details)
+            if interaction is None:
+                interaction = shared[details] = Interaction(*details)
+            self._pairs[self._pair_key(first, second)] = interaction
+
+    @classmethod
+    def from_file(cls, path: Path) -> "InteractionIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["drugs"], data["interactions"])
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    @staticmethod
+    def _pair_key(first: int, second: int) -> int:
+        low, high = (first, second) if first <= second else (second, first)
+        return (low << 32) | high
+
+    def resolve(self, name: str) -> FrozenSet[int]:
+        """Ids of the known drugs in a medication name (combination products give several)"""
+        words = normalize_drug_name(name)
+        found = set()
+        position = 0
+        while position < len(words):
+            for length in range(min(self._longest, len(words) - position), 0, -1):
+                drug_id = self._ids.get(words[position:position + length])
+                if drug_id is not None:
+                    found.add(drug_id)
+                    position += length
+                    break
+            else:
+                position += 1
+        return frozenset(found)
+
+    def interaction(self, first: int, second: int) -> Optional[Interaction]:
+        return self._pairs.get(self._pair_key(first, second))
+
+    def check(self, name: str, medications: Iterable[dict]) -> List[dict]:
+        """Interactions between a drug and existing medication rows, most severe first"""
+        new_drugs = self.resolve(name)
+        if not new_drugs:
+            return []
+
+        warnings = []
+        for medication in medications:
+            for existing in self.resolve(medication.get('name', '')):
+                for drug in new_drugs:
+                    found = self.interaction(drug, existing)
+                    if found is None:
+                        continue
+                    warnings.append({
+                        'medication_id': str(medication['id']),
+                        'medication_name': medication['name'],
+                        'drug': self.drug_names[drug],
+                        'interacting_drug': self.drug_names[existing],
+                        'severity': found.severity,
+                        'description': found.description,
+                    })
+
+        warnings.sort(key=lambda warning: SEVERITY_RANK.get(warning['severity'], len(SEVERITY_RANK)))
+        return warnings
+
+
+@lru_cache(maxsize=1)
+def get_interaction_index() -> InteractionIndex:
+    """Compile the interaction dataset (once per process)"""
+    path = Path(settings.DRUG_INTERACTIONS_PATH) if settings.DRUG_INTERACTIONS_PATH else DEFAULT_DATASET
+    index = InteractionIndex.from_file(path)
+    logger.info("Drug interaction index compiled: {} drugs, {} interacting pairs", len(index.drug_names), len(index))
+    return index
+
+
+async def interaction_warnings(user_id: str, name: str) -> List[dict]:
+    """Interactions between `name` and the user's other active medications"""
+    index = get_interaction_index()
+    if not index.resolve(name):
+        return []
+
+    response = await execute(
+        supabase.table('medications').select('id, name').eq(
+            'user_id', user_id
+        ).eq('active', True)
+    )
+    return index.check(name, response.data or [])
@@ -0,0 +1,258 @@
+"""
+Cross-process invalidation bus
+
+Each worker process binds a Unix datagram socket in a shared directory and
+broadcasts small JSON messages to every other socket there. Local writes on
+the change feed are forwarded so version counters, indexes and caches in
+sibling workers stay in sync; other modules can broadcast their own topics
+(e.g. evicting a cached user) with `invalidation_bus.broadcast`.
+
+Only workers on the same host see each other, which is what
+`uvicorn --workers N` (WEB_CONCURRENCY) gives us.
+
+A datagram cannot exceed the socket send buffer the kernel actually
+granted (requests are clamped to net.core.wmem_max), so batches are sized
+to that. A change that could not be delivered to a worker, because it was
+too large or the worker fell behind, is replaced by a reset for its user
+and resource (see changes.publish_reset), retried until that worker gets it.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services import changes
+
+# Send buffer asked for; Linux caps a datagram at the buffer it grants
+MAX_MESSAGE_BYTES = 1 << 20
+
+# A peer's queue only holds a few datagrams (net.unix.max_dgram_qlen), so
+# messages are batched and a full peer is retried for this long before
+# the batch is dropped for it
+SEND_TIMEOUT_SECONDS = 2.0
+
+MessageHandler = Callable[[dict], None]
+# (user id, resource) a change message is about
+Owner = Tuple[str, str]
+
+
+class InvalidationBus:
+    """Broadcasts JSON messages to sibling worker processes over Unix sockets"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.path: Optional[Path] = None
+        self._socket: Optional[socket.socket] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._outbox: List[Tuple[bytes, Optional[Owner]]] = []
+        # Per peer, the (user, resource) pairs of changes it did not get
+        self._missed: Dict[Path, Set[Owner]] = {}
+        self._pending = asyncio.Event()
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+        self.max_message_bytes = MAX_MESSAGE_BYTES
+        self.sent = 0
+        self.received = 0
+
+    @property
+    def running(self) -> bool:
+        return self._socket is not None
+
+    def on(self, topic: str, handler: MessageHandler) -> None:
+        """Handle messages broadcast by other workers on `topic`"""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}.sock"
+        self.path.unlink(missing_ok=True)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_MESSAGE_BYTES)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_MESSAGE_BYTES)
+        # Linux reports twice the size granted (the rest is its bookkeeping)
+        self.max_message_bytes = min(MAX_MESSAGE_BYTES, sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) // 2)
+        if self.max_message_bytes < MAX_MESSAGE_BYTES:
+            logger.info("Invalidation bus batches limited to {} bytes by net.core.wmem_max", self.max_message_bytes)
+        sock.bind(str(self.path))
+        sock.setblocking(False)
+
+        self._socket = sock
+        self._pending = asyncio.Event()
+        self._task = asyncio.create_task(self._receive_loop())
+        self._sender = asyncio.create_task(self._send_loop())
+        logger.info("Invalidation bus listening on {}", self.path)
+
+    async def stop(self) -> None:
+        for task in (self._task, self._sender):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = self._sender = None
+        self._outbox.clear()
+        self._missed.clear()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+    def broadcast(self, topic: str, payload: dict) -> None:
+        """Send a message to every other worker (no-op when the bus is not running)"""
+        if self._socket is None:
+            return
+
+        owner = (str(payload['user_id']), str(payload['resource'])) if 'user_id' in payload and 'resource' in payload else None
+        data = json.dumps({'topic': topic, 'payload': payload}, default=str).encode()
+        if len(data) > self.max_message_bytes - 2:
+            if owner is None:
+                logger.error("Invalidation message on {} too large ({} bytes); dropped", topic, len(data))
+                return
+            logger.warning("Invalidation message on {} too large ({} bytes); sending a reset", topic, len(data))
+            data = _reset_message(owner)
+
+        self._outbox.append((data, owner))
+        self._pending.set()
+
+    def _fitting(self, messages: List[bytes]) -> int:
+        """How many of the leading messages fit in one JSON array datagram"""
+        size = 2
+        count = 0
+        for message in messages:
+            if size + len(message) + 1 > self.max_message_bytes:
+                break
+            size += len(message) + 1
+            count += 1
+        return count
+
+    def _next_batch(self) -> Tuple[bytes, Set[Owner]]:
+        """Pop queued messages into one JSON array datagram, with the (user, resource) pairs they change"""
+        count = self._fitting([data for data, _ in self._outbox])
+        batch, self._outbox = self._outbox[:count], self._outbox[count:]
+        owners = {owner for _, owner in batch if owner is not None}
+        return b"[" + b",".join(data for data, _ in batch) + b"]", owners
+
+    async def _send_to(self, peer: Path, data: bytes) -> bool:
+        """Send a datagram to a peer; False if it was dropped for a peer still running"""
+        deadline = time.monotonic() + SEND_TIMEOUT_SECONDS
+        delay = 0.0005
+        while True:
+            try:
+                self._socket.sendto(data, str(peer))
+                self.sent += 1
+                return True
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that exited
+                peer.unlink(missing_ok=True)
+                self._missed.pop(peer, None)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    logger.warning("Invalidation bus peer {} is not keeping up; batch dropped", peer.name)
+                    return False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+            except OSError as e:
+                logger.error("Invalidation bus send to {} failed: {}", peer.name, e)
+                return False
+
+    async def _send_batch(self, peer: Path, data: bytes, owners: Set[Owner]) -> None:
+        if not await self._send_to(peer, data) and owners:
+            self._missed.setdefault(peer, set()).update(owners)
+
+    async def _send_resets(self, peer: Path) -> None:
+        """Tell a peer to drop what the changes it did not get would have changed"""
+        # Pairs added while a send is waiting go out in the next round
+        while self._missed.get(peer):
+            owners = sorted(self._missed[peer])
+            messages = [_reset_message(owner) for owner in owners]
+            count = self._fitting(messages)
+            if not await self._send_to(peer, b"[" + b",".join(messages[:count]) + b"]"):
+                return
+            if peer in self._missed:
+                self._missed[peer].difference_update(owners[:count])
+        self._missed.pop(peer, None)
+
+    async def _send_loop(self) -> None:
+        while True:
+            if self._missed:
+                # Resets are retried even when nothing new is broadcast
+                try:
+                    await asyncio.wait_for(self._pending.wait(), SEND_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._pending.wait()
+            self._pending.clear()
+            await asyncio.gather(*(self._send_resets(peer) for peer in list(self._missed)))
+            while self._outbox:
+                data, owners = self._next_batch()
+                peers = [peer for peer in self.directory.glob("*.sock") if peer != self.path]
+                await asyncio.gather(*(self._send_batch(peer, data, owners) for peer in peers))
+
+    async def _receive_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await loop.sock_recv(self._socket, MAX_MESSAGE_BYTES)
+            try:
+                messages = json.loads(data)
+            except ValueError:
+                continue
+
+            for message in messages:
+                self.received += 1
+                for handler in self._handlers.get(message.get('topic'), []):
+                    try:
+                        handler(message.get('payload') or {})
+                    except Exception as e:
+                        logger.error("Invalidation handler for {} failed: {}", message.get('topic'), e)
+
+
+def _reset_message(owner: Owner) -> bytes:
+    return json.dumps({'topic': 'reset', 'payload': {'user_id': owner[0], 'resource': owner[1]}}).encode()
+
+
+def _forward_change(change: changes.Change) -> None:
+    if not change.remote:
+        invalidation_bus.broadcast('change', {
+            'user_id': change.user_id,
+            'resource': change.resource,
+            'record_id': change.record_id,
+            'record': change.record,
+        })
+
+
+def _apply_remote_change(payload: dict) -> None:
+    changes.publish(changes.Change(
+        user_id=payload['user_id'],
+        resource=payload['resource'],
+        record_id=payload['record_id'],
+        record=payload.get('record'),
+        remote=True,
+    ))
+
+
+def _apply_remote_reset(payload: dict) -> None:
+    changes.publish_reset(payload['user_id'], payload['resource'])
+
+
+def create_bus() -> InvalidationBus:
+    bus = InvalidationBus(settings.INVALIDATION_BUS_DIR)
+    bus.on('change', _apply_remote_change)
+    bus.on('reset', _apply_remote_reset)
+    changes.subscribe('*', _forward_change)
+    return bus
+
+
+invalidation_bus = create_bus()
@@ -0,0 +1,332 @@
+"""
+Background job queue
+
+Slow, non-interactive work (data exports, backfills, fan-out) is enqueued as
+a row in the jobs table and run by a fixed number of worker tasks, so the
+request that asked for it returns straight away and the job survives
+restarts:
+
+- enqueue() inserts the row and hands it to this process's workers
+- a worker claims the row (queued -> running, with a lease) before running
+  it, so with several processes each job runs once
+- failures are retried with exponential backoff and jitter until
+  max_attempts, then the job is marked failed
+- a maintenance loop renews the leases of running jobs, picks up queued jobs
+  enqueued elsewhere or before a restart, and requeues running jobs whose
+  lease expired because their process died
+- stop() takes no new jobs and waits for running ones; jobs still running
+  after the drain timeout are cancelled and requeued
+"""
+
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from app.config import settings
+from app.services.changes import record_changed, JOBS
+from app.services.database import execute, supabase
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Longest error message stored on a job
+MAX_ERROR_LENGTH = 2000
+
+JobHandler = Callable[[str, dict], Awaitable[Optional[dict]]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job(kind: str):
+    """Register `async handler(user_id, payload) -> result` as the handler for a job kind"""
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        return handler
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """Persistent jobs run by `concurrency` worker tasks in this process"""
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        max_attempts: int = 3,
+        retry_base_seconds: float = 5.0,
+        retry_max_seconds: float = 300.0,
+        poll_seconds: float = 5.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._accepting = False
+        # Job ids waiting in the local queue or on a retry timer
+        self._known: Set[str] = set()
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._running: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+
+    def retry_delay(self, attempts: int) -> float:
+        """Backoff before the next attempt: doubling from the base, capped, with jitter"""
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def enqueue(
+        self,
+        kind: str,
+        user_id: str,
+        payload: Optional[dict] = None,
+        max_attempts: Optional[int] = None,
+        delay: float = 0.0
+    ) -> dict:
+        """Persist a job and schedule it; returns the job row"""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        now = _now()
+        job_data = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'kind': kind,
+            'payload': payload or {},
+            'status': QUEUED,
+            'attempts': 0,
+            'max_attempts': max_attempts or self.max_attempts,
+            'run_after': (now + timedelta(seconds=delay)).isoformat(),
+            'created_at': now.isoformat(),
+        }
+        response = await execute(supabase.table('jobs').insert(job_data))
+        job_row = response.data[0] if response.data else job_data
+
+        record_changed(user_id, JOBS, job_row)
+        self._schedule(job_row, delay)
+        return job_row
+
+    async def cancel(self, job_id: str, user_id: str) -> Optional[dict]:
+        """Cancel a job that has not started; None if it is not queued"""
+        response = await execute(
+            supabase.table('jobs').update({
+                'status': CANCELLED,
+                'finished_at': _now().isoformat(),
+            }).eq('id', job_id).eq('user_id', user_id).eq('status', QUEUED)
+        )
+        if not response.data:
+            return None
+
+        timer = self._timers.pop(job_id, None)
+        if timer is not None:
+            timer.cancel()
+            self._known.discard(job_id)
+        record_changed(user_id, JOBS, response.data[0])
+        return response.data[0]
+
+    def _schedule(self, job_row: dict, delay: float = 0.0) -> None:
+        job_id = str(job_row['id'])
+        if not self._accepting or job_id in self._known or job_id in self._running:
+            # Stays queued in the database for the next poll or restart
+            return
+        self._known.add(job_id)
+        if delay > 0:
+            self._timers[job_id] = asyncio.get_running_loop().call_later(delay, self._release, job_row)
+        else:
+            self._queue.put_nowait(job_row)
+
+    def _release(self, job_row: dict) -> None:
+        self._timers.pop(str(job_row['id']), None)
+        self._queue.put_nowait(job_row)
+
+    async def _claim(self, job_row: dict) -> Optional[dict]:
+        """Mark a queued job as running here; None if it was taken, cancelled or changed"""
+        now = _now()
+        response = await execute(
+            supabase.table('jobs').update({
+                'status': RUNNING,
+                'attempts': job_row['attempts'] + 1,
+                'locked_by': self.worker_id,
+                'lease_expires_at': (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+                'started_at': now.isoformat(),
+            }).eq('id', job_row['id']).eq('status', QUEUED).eq('attempts', job_row['attempts'])
+        )
+        return response.data[0] if response.data else None
+
+    async def _finish(self, job_row: dict, status: str, **fields) -> dict:
+        """Record the outcome of a run, as long as this process still holds the job"""
+        response = await execute(
+            supabase.table('jobs').update({
+                'status': status,
+                'locked_by': None,
+                'lease_expires_at': None,
+                **fields,
+            }).eq('id', job_row['id']).eq('locked_by', self.worker_id).eq('status', RUNNING)
+        )
+        if not response.data:
+            logger.warning("Job {} was taken over before it finished", job_row['id'])
+            return job_row
+
+        updated = response.data[0]
+        record_changed(updated['user_id'], JOBS, updated)
+        return updated
+
+    async def _run(self, job_row: dict) -> None:
+        handler = _handlers.get(job_row['kind'])
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job_row['kind']}")
+            if job_row['attempts'] > job_row['max_attempts']:
+                raise RuntimeError("Interrupted too many times")
+            result = await handler(str(job_row['user_id']), job_row.get('payload') or {})
+
+        except asyncio.CancelledError:
+            # Shutting down: give the job back without counting this attempt
+            await self._finish(job_row, QUEUED, attempts=job_row['attempts'] - 1, run_after=_now().isoformat())
+            raise
+
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:MAX_ERROR_LENGTH]
+            if handler is None or job_row['attempts'] >= job_row['max_attempts']:
+                logger.error("Job {} ({}) failed after {} attempts: {}", job_row['id'], job_row['kind'], job_row['attempts'], e)
+                await self._finish(job_row, FAILED, error=error, finished_at=_now().isoformat())
+                return
+
+            delay = self.retry_delay(job_row['attempts'])
+            logger.warning("Job {} ({}) attempt {} failed, retrying in {:.0f}s: {}", job_row['id'], job_row['kind'], job_row['attempts'], delay, e)
+            updated = await self._finish(
+                job_row, QUEUED, error=error, run_after=(_now() + timedelta(seconds=delay)).isoformat()
+            )
+            if updated['status'] == QUEUED:
+                self._schedule(updated, delay)
+            return
+
+        await self._finish(job_row, SUCCEEDED, result=result, error=None, finished_at=_now().isoformat())
+
+    async def _worker(self) -> None:
+        while True:
+            job_row = await self._queue.get()
+            if job_row is None or not self._accepting:
+                if job_row is None:
+                    return
+                continue
+
+            job_id = str(job_row['id'])
+            self._known.discard(job_id)
+            try:
+                claimed = await self._claim(job_row)
+                if claimed is None:
+                    continue
+                self._running.add(job_id)
+                await self._run(claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database errors while claiming or finishing; the lease or poll recovers the job
+                logger.error("Job {} could not be processed: {}", job_id, e)
+            finally:
+                self._running.discard(job_id)
+
+    async def _renew_leases(self) -> None:
+        if not self._running:
+            return
+        await execute(
+            supabase.table('jobs').update({
+                'lease_expires_at': (_now() + timedelta(seconds=self.lease_seconds)).isoformat(),
+            }).in_('id', list(self._running)).eq('locked_by', self.worker_id)
+        )
+
+    async def _requeue_expired(self) -> None:
+        response = await execute(
+            supabase.table('jobs').update({
+                'status': QUEUED,
+                'locked_by': None,
+                'lease_expires_at': None,
+            }).eq('status', RUNNING).lt('lease_expires_at', _now().isoformat())
+        )
+        for job_row in response.data or []:
+            logger.warning("Requeued job {} ({}) from a worker that stopped", job_row['id'], job_row['kind'])
+
+    async def _poll(self) -> None:
+        """Schedule due jobs that this process doesn't hold yet"""
+        response = await execute(
+            supabase.table('jobs').select('*').eq('status', QUEUED).lte(
+                'run_after', _now().isoformat()
+            ).order('run_after').limit(self.concurrency * 4)
+        )
+        for job_row in response.data or []:
+            self._schedule(job_row)
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self._renew_leases()
+                await self._requeue_expired()
+                if self._queue.qsize() < self.concurrency:
+                    await self._poll()
+            except Exception as e:
+                logger.error("Job queue maintenance failed: {}", e)
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._maintenance = asyncio.create_task(self._maintain())
+        logger.info("Job queue started with {} workers", self.concurrency)
+
+        # Jobs left queued by an earlier run
+        try:
+            await self._poll()
+        except Exception as e:
+            logger.error("Failed to load queued jobs: {}", e)
+
+    async def stop(self, timeout: float = 20.0) -> None:
+        """Stop taking jobs, let running ones finish for up to `timeout` seconds, then requeue the rest"""
+        if not self._accepting:
+            return
+        self._accepting = False
+
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._known.clear()
+
+        for _ in self._workers:
+            self._queue.put_nowait(None)
+        if self._running:
+            logger.info("Waiting for {} running jobs to finish", len(self._running))
+        _, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*self._workers, *([self._maintenance] if self._maintenance else []), return_exceptions=True)
+        self._workers = []
+
+
+job_queue = JobQueue(
+    concurrency=settings.JOB_CONCURRENCY,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_base_seconds=settings.JOB_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.JOB_RETRY_MAX_SECONDS,
+    poll_seconds=settings.JOB_POLL_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
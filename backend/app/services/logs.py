@@ -0,0 +1,187 @@
+"""
+Logging configuration
+
+Log lines are handed to a background writer thread so writing to stdout
+never blocks a request. In production each line is a
+compact JSON object carrying the request id of the request that logged it.
+High-volume debug lines can be sampled per logger with LOG_DEBUG_SAMPLING,
+e.g. {"app.services.auth_service": 100} keeps one debug line in 100.
+
+Log calls use loguru's brace style (`logger.debug("x = {}", x)`) so the
+message is only formatted when a sink will actually receive it.
+"""
+
+import itertools
+import json
+import queue
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, Tuple
+
+from loguru import logger
+
+from app.config import settings
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan> - {extra[request_id]} - <level>{message}</level>"
+)
+
+DEBUG_LEVEL = logger.level("DEBUG").no
+
+
+class DebugSampler:
+    """Filter keeping every n-th debug line from the configured loggers"""
+
+    def __init__(self, every: Dict[str, int]):
+        self.every = {name: rate for name, rate in every.items() if rate > 1}
+        self._state: Dict[str, Tuple[int, Iterator[int]]] = {}
+
+    def _rate_for(self, name: str) -> int:
+        # Longest configured prefix wins ("app.services" covers its modules)
+        best = ""
+        for prefix in self.every:
+            if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > len(best):
+                best = prefix
+        return self.every.get(best, 1)
+
+    def __call__(self, record: dict) -> bool:
+        if record["level"].no > DEBUG_LEVEL or not self.every:
+            return True
+
+        name = record["name"] or ""
+        state = self._state.get(name)
+        if state is None:
+            state = self._state[name] = (self._rate_for(name), itertools.count())
+        rate, counter = state
+        # itertools.count is atomic under the GIL, so no lock is needed
+        return rate == 1 or next(counter) % rate == 0
+
+
+def _add_request_id(record: dict) -> None:
+    # Runs in the calling thread, where the request's context is visible
+    record["extra"].setdefault("request_id", request_id.get() or "-")
+
+
+def render_json(message) -> str:
+    record = message.record
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        **record["extra"],
+    }
+    if record["exception"] is not None:
+        # loguru appends the formatted traceback after the message text
+        entry["exception"] = message[len(record["message"]):].strip()
+    return json.dumps(entry, default=str) + "\n"
+
+
+class BackgroundSink:
+    """
+    loguru sink that hands messages to a writer thread.
+
+    The calling thread only formats the message and puts it on an in-process
+    queue (no pickling, unlike loguru's own `enqueue=True`). When the writer
+    falls `max_pending` lines behind, new lines are dropped and counted
+    rather than blocking requests.
+    """
+
+    def __init__(self, render: Callable[[Any], str] = str, stream: TextIO = sys.stdout, max_pending: int = 10000):
+        self.render = render
+        self.stream = stream
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self.stream.write(self.render(message))
+                if self._queue.empty():
+                    self.stream.flush()
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        """Write out everything queued so far and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.dropped:
+            self.stream.write(f"{self.dropped} log lines dropped while the writer was behind\n")
+        self.stream.flush()
+
+
+_sink: Optional[BackgroundSink] = None
+
+
+def configure_logging() -> None:
+    """Replace loguru's default stderr handler with the application sink"""
+    global _sink
+    level = "INFO" if settings.ENVIRONMENT == "production" else "DEBUG"
+    sampler = DebugSampler(settings.LOG_DEBUG_SAMPLING)
+
+    logger.remove()
+    logger.configure(patcher=_add_request_id)
+    shutdown_logging()
+    if settings.LOG_JSON or settings.ENVIRONMENT == "production":
+        _sink = BackgroundSink(render_json)
+        logger.add(_sink, format="{message}", level=level, filter=sampler)
+    else:
+        _sink = BackgroundSink()
+        logger.add(_sink, format=TEXT_FORMAT, level=level, filter=sampler, colorize=sys.stdout.isatty())
+
+
+def shutdown_logging() -> None:
+    """Flush log lines still queued for the writer thread"""
+    global _sink
+    if _sink is not None:
+        _sink.stop()
+        _sink = None
+
+
+class RequestIdMiddleware:
+    """Tags each request with an id (X-Request-ID, or a new one) for its log lines"""
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((value for key, value in scope["headers"] if key == self.header), None)
+        value = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex
+        token = request_id.set(value)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (self.header, value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,378 @@
+"""
+Columnar archive of health metrics
+
+Months of readings moved out of the database (see metric_partitions) are
+kept as one compressed NumPy file per month,
+HEALTH_METRICS_ARCHIVE_DIR/YYYY-MM.npz, with one array per column:
+
+- recorded_at and created_at as microseconds since the epoch (UTC)
+- primary_value and secondary_value as floats, NaN for NULL
+- text columns dictionary-encoded: an int32 code per row (-1 for NULL) into
+  the column's distinct values, stored as UTF-8 bytes and offsets
+
+A month's readings repeat a few users, types, units and values, so the
+codes compress to a fraction of the rows' size, and a query reads only the
+columns it needs. A month being archived is written to YYYY-MM.npz.pending
+and renamed once its partition is dropped, so it is never counted twice.
+
+Each month also has YYYY-MM.ids.npy, its reading ids sorted and
+uncompressed, so finding the month of a reading is a binary search over a
+memory-mapped array rather than a scan of every month's files.
+
+Deleting archived readings (a reading deleted by its user, every reading of
+a deleted account) rewrites the month's file without them, re-encoding the
+text columns so no deleted value is left in the dictionaries. Rewrites of a
+month are serialised across processes with a lock file, YYYY-MM.lock.
+"""
+
+import fcntl
+import math
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Collection, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.config import settings
+from app.services.appointment_index import to_utc
+from app.services.metric_partitions import month_bounds, month_start
+
+TEXT_COLUMNS = ('id', 'user_id', 'metric_type', 'value', 'unit', 'notes')
+TIME_COLUMNS = ('recorded_at', 'created_at')
+NUMBER_COLUMNS = ('primary_value', 'secondary_value')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Stored for a NULL time (numpy's NaT)
+_NO_TIME = np.iinfo(np.int64).min
+
+
+def _microseconds(moment: Union[datetime, str]) -> int:
+    return (to_utc(moment) - _EPOCH) // timedelta(microseconds=1)
+
+
+class _Dictionary:
+    """A text column being written: its distinct values and a code per row"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.codes: List[np.ndarray] = []
+
+    def add(self, values: List[Optional[str]]) -> None:
+        index = self.index
+        self.codes.append(np.fromiter(
+            (-1 if value is None else index.setdefault(str(value), len(index)) for value in values),
+            dtype=np.int32, count=len(values),
+        ))
+
+    @classmethod
+    def of(cls, values: List[str], codes: np.ndarray) -> "_Dictionary":
+        dictionary = cls()
+        dictionary.index = {value: code for code, value in enumerate(values)}
+        dictionary.codes = [codes.astype(np.int32)]
+        return dictionary
+
+    def arrays(self, name: str) -> Dict[str, np.ndarray]:
+        encoded = [value.encode() for value in self.index]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        return {
+            name: np.concatenate(self.codes) if self.codes else np.zeros(0, dtype=np.int32),
+            f"{name}_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            f"{name}_offsets": offsets,
+        }
+
+
+class MonthWriter:
+    """Collects a month's rows, page by page, and saves them as one file (and its id index)"""
+
+    def __init__(self, path: Path, ids_path: Path):
+        self.path = path
+        self.ids_path = ids_path
+        self.rows = 0
+        self._text = {name: _Dictionary() for name in TEXT_COLUMNS}
+        self._times: Dict[str, List[np.ndarray]] = {name: [] for name in TIME_COLUMNS}
+        self._numbers: Dict[str, List[np.ndarray]] = {name: [] for name in NUMBER_COLUMNS}
+
+    def add(self, rows: List[dict]) -> None:
+        """Add rows as returned by the database"""
+        for name, dictionary in self._text.items():
+            dictionary.add([row.get(name) for row in rows])
+        for name, chunks in self._times.items():
+            chunks.append(np.array(
+                [_NO_TIME if row.get(name) is None else _microseconds(row[name]) for row in rows], dtype=np.int64
+            ))
+        for name, chunks in self._numbers.items():
+            chunks.append(np.array(
+                [np.nan if row.get(name) is None else float(row[name]) for row in rows], dtype=np.float64
+            ))
+        self.rows += len(rows)
+
+    def save(self) -> Path:
+        arrays: Dict[str, np.ndarray] = {}
+        for name, dictionary in self._text.items():
+            arrays.update(dictionary.arrays(name))
+        for name, chunks in (*self._times.items(), *self._numbers.items()):
+            arrays[name] = np.concatenate(chunks) if chunks else np.zeros(0)
+        return _save(self.path, self.ids_path, arrays)
+
+
+def _write(path: Path, write) -> None:
+    """Write a file through `write(file)`, replacing it only once the data is on disk"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def _id_index(data: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Sorted fixed-width bytes of the ids in an id dictionary"""
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    ids = sorted(data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+    return np.array(ids, dtype=f"S{max(map(len, ids), default=1)}")
+
+
+def _save(path: Path, ids_path: Path, arrays: Dict[str, np.ndarray]) -> Path:
+    """
+    Write a month's arrays, then its id index
+
+    In that order, an interrupted rewrite leaves an index that still lists
+    deleted ids, which finds nothing to delete, rather than one missing ids
+    still in the file.
+    """
+    _write(path, lambda file: np.savez_compressed(file, **arrays))
+    index = _id_index(arrays['id_data'], arrays['id_offsets'])
+    _write(ids_path, lambda file: np.save(file, index))
+    return path
+
+
+class ArchivedMonth:
+    """One month's file, read a column at a time"""
+
+    def __init__(self, path: Path):
+        self._file = np.load(path)
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __enter__(self) -> "ArchivedMonth":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._file.close()
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = self._file[name]
+        return self._columns[name]
+
+    def values(self, name: str) -> List[str]:
+        """Distinct values of a text column, by code"""
+        data = self.column(f"{name}_data").tobytes()
+        offsets = self.column(f"{name}_offsets").tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+    def code(self, name: str, value: str) -> Optional[int]:
+        try:
+            return self.values(name).index(value)
+        except ValueError:
+            return None
+
+    def without(self, drop: np.ndarray) -> Dict[str, np.ndarray]:
+        """The month's arrays without the rows marked in `drop`, text re-encoded to the values still used"""
+        keep = ~drop
+        arrays: Dict[str, np.ndarray] = {}
+        for name in TEXT_COLUMNS:
+            codes = self.column(name)[keep]
+            used = np.unique(codes[codes >= 0])
+            renumber = np.full(len(self.column(f"{name}_offsets")) - 1, -1, dtype=np.int32)
+            renumber[used] = np.arange(len(used), dtype=np.int32)
+            # NULLs (-1) stay -1; indexing with them would fail on an all-NULL column
+            present = codes >= 0
+            recoded = np.full(len(codes), -1, dtype=np.int32)
+            recoded[present] = renumber[codes[present]]
+            values = self.values(name)
+            remaining = _Dictionary.of([values[code] for code in used.tolist()], recoded)
+            arrays.update(remaining.arrays(name))
+        for name in (*TIME_COLUMNS, *NUMBER_COLUMNS):
+            arrays[name] = self.column(name)[keep]
+        return arrays
+
+    def rows(self, picked: np.ndarray) -> List[dict]:
+        """Rows at the given positions, as the database returns them"""
+        columns = {}
+        for name in TEXT_COLUMNS:
+            data = self.column(f"{name}_data").tobytes()
+            offsets = self.column(f"{name}_offsets").tolist()
+            columns[name] = [
+                None if code < 0 else data[offsets[code]:offsets[code + 1]].decode()
+                for code in self.column(name)[picked].tolist()
+            ]
+        for name in TIME_COLUMNS:
+            columns[name] = [
+                None if value == _NO_TIME else (_EPOCH + timedelta(microseconds=value)).isoformat()
+                for value in self.column(name)[picked].tolist()
+            ]
+        for name in NUMBER_COLUMNS:
+            columns[name] = [None if math.isnan(value) else value for value in self.column(name)[picked].tolist()]
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+class MetricArchive:
+    """Archived months in a directory"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def path(self, month: date, pending: bool = False) -> Path:
+        return self.directory / f"{month:%Y-%m}.npz{'.pending' if pending else ''}"
+
+    def ids_path(self, month: date, pending: bool = False) -> Path:
+        return self.directory / f"{month:%Y-%m}.ids.npy{'.pending' if pending else ''}"
+
+    def _months(self, pattern: str) -> List[date]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            date.fromisoformat(f"{path.name[:7]}-01")
+            for path in self.directory.glob(pattern)
+        )
+
+    def months(self) -> List[date]:
+        return self._months("????-??.npz")
+
+    def pending_months(self) -> List[date]:
+        return self._months("????-??.npz.pending")
+
+    def writer(self, month: date) -> MonthWriter:
+        return MonthWriter(self.path(month, pending=True), self.ids_path(month, pending=True))
+
+    def publish(self, month: date) -> None:
+        # A missing index (the save was interrupted) is rebuilt when first needed
+        if self.ids_path(month, pending=True).exists():
+            os.replace(self.ids_path(month, pending=True), self.ids_path(month))
+        os.replace(self.path(month, pending=True), self.path(month))
+
+    def open(self, month: date) -> ArchivedMonth:
+        return ArchivedMonth(self.path(month))
+
+    @contextmanager
+    def _rewriting(self, month: date):
+        """Hold the month's lock file while its file is read and rewritten"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / f"{month:%Y-%m}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _id_index(self, month: date) -> np.ndarray:
+        """The month's sorted reading ids, memory-mapped (built from its file if missing)"""
+        try:
+            return np.load(self.ids_path(month), mmap_mode='r')
+        except FileNotFoundError:
+            pass
+        with self._rewriting(month):
+            if not self.ids_path(month).exists():
+                with self.open(month) as archived:
+                    index = _id_index(archived.column('id_data'), archived.column('id_offsets'))
+                _write(self.ids_path(month), lambda file: np.save(file, index))
+        return np.load(self.ids_path(month), mmap_mode='r')
+
+    def _holds(self, month: date, ids: Collection[str]) -> bool:
+        """Whether any of the ids is an archived reading of the month"""
+        index = self._id_index(month)
+        for value in ids:
+            key = str(value).encode()
+            if len(key) > index.dtype.itemsize:
+                continue
+            position = int(np.searchsorted(index, key))
+            if position < len(index) and index[position] == key:
+                return True
+        return False
+
+    def delete_readings(self, user_id: str, ids: Optional[Collection[str]] = None) -> int:
+        """Delete a user's archived readings (those with the given ids, or all); returns how many"""
+        deleted = 0
+        for month in self.months():
+            # Only months holding one of the ids are locked and read
+            if ids is not None and not self._holds(month, ids):
+                continue
+            with self._rewriting(month):
+                with self.open(month) as archived:
+                    code = archived.code('user_id', str(user_id))
+                    if code is None:
+                        continue
+                    drop = archived.column('user_id') == code
+                    if ids is not None:
+                        wanted = set(map(str, ids))
+                        id_codes = [i for i, value in enumerate(archived.values('id')) if value in wanted]
+                        drop &= np.isin(archived.column('id'), id_codes)
+                    if not drop.any():
+                        continue
+                    arrays = archived.without(drop)
+                _save(self.path(month), self.ids_path(month), arrays)
+            deleted += int(drop.sum())
+        return deleted
+
+    def user_ids(self) -> Set[str]:
+        """Users with archived readings"""
+        users: Set[str] = set()
+        for month in self.months():
+            with self.open(month) as archived:
+                users.update(archived.values('user_id'))
+        return users
+
+    def months_between(self, start: datetime, end: datetime) -> List[date]:
+        """Archived months with readings that may fall in [start, end)"""
+        first = month_start(start)
+        return [month for month in self.months() if first <= month and month_bounds(month)[0] < end]
+
+    def user_rows(self, user_id: str) -> List[dict]:
+        """All of a user's archived readings, oldest first"""
+        rows = []
+        for month in self.months():
+            with self.open(month) as archived:
+                code = archived.code('user_id', str(user_id))
+                if code is None:
+                    continue
+                picked = np.flatnonzero(archived.column('user_id') == code)
+                picked = picked[np.argsort(archived.column('recorded_at')[picked], kind="stable")]
+                rows.extend(archived.rows(picked))
+        return rows
+
+    def readings(
+        self,
+        metric_type: str,
+        position: int,
+        start: datetime,
+        end: datetime
+    ) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Per archived month in the window: the month's user ids, and for each
+        reading of `metric_type` with a value in channel `position` (1 for
+        primary_value, 2 for secondary_value) the user's code, its time
+        (datetime64, UTC) and its value
+        """
+        low, high = _microseconds(start), _microseconds(end)
+        for month in self.months_between(start, end):
+            with self.open(month) as archived:
+                code = archived.code('metric_type', metric_type)
+                if code is None:
+                    continue
+                recorded_at = archived.column('recorded_at')
+                values = archived.column('secondary_value' if position == 2 else 'primary_value')
+                keep = (archived.column('metric_type') == code) & (recorded_at >= low) & (recorded_at < high) & np.isfinite(values)
+                yield (
+                    archived.values('user_id'),
+                    archived.column('user_id')[keep],
+                    recorded_at[keep].astype("datetime64[us]"),
+                    values[keep],
+                )
+
+
+metric_archive = MetricArchive(Path(settings.HEALTH_METRICS_ARCHIVE_DIR))
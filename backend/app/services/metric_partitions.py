@@ -0,0 +1,165 @@
+"""
+Monthly partitions of health_metrics and archival of old months
+
+health_metrics is partitioned by the month (UTC) of recorded_at
+(database/migrations/008_health_metrics_partitioning.sql), so queries and
+vacuum on recent readings only touch recent partitions, and old months are
+dropped whole instead of deleted row by row:
+
+- maintain() creates this month's partition and the next
+  HEALTH_METRICS_PARTITIONS_AHEAD at startup and then daily, so readings
+  only land in the default partition when no partition covers them
+- the archive_health_metrics job writes every month older than
+  HEALTH_METRICS_RETENTION_MONTHS to a columnar file (metric_archive) and
+  drops its partition. The database refuses the drop if the month gained
+  readings since they were read out, and the job is retried.
+- maintain() also deletes the archived readings of accounts deleted from
+  the database, which ON DELETE CASCADE cannot reach
+
+Cohort analytics and data exports read archived months along with the
+database; the list endpoints and the agent only see the retention window.
+"""
+
+import asyncio
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from loguru import logger
+
+from app.config import settings
+from app.services.database import execute, supabase
+from app.services.jobs import job
+
+ARCHIVE_HEALTH_METRICS = "archive_health_metrics"
+
+# Rows per request when reading a month out (Supabase's default maximum per response)
+PAGE_ROWS = 1000
+# User ids per existence check (they go in the URL)
+USER_IDS_PER_REQUEST = 100
+# How often upcoming partitions are created
+MAINTENANCE_SECONDS = 24 * 60 * 60
+
+
+def month_start(moment: Union[date, datetime]) -> date:
+    if isinstance(moment, datetime):
+        moment = moment.astimezone(timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """[start, end) of a month as UTC instants"""
+    end = add_months(month, 1)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+        datetime(end.year, end.month, 1, tzinfo=timezone.utc),
+    )
+
+
+async def ensure_partitions() -> List[str]:
+    """Create this month's partition and the upcoming ones; returns their names"""
+    response = await execute(supabase.rpc('ensure_health_metrics_partitions', {
+        'p_months_ahead': settings.HEALTH_METRICS_PARTITIONS_AHEAD,
+    }))
+    return response.data or []
+
+
+async def purge_deleted_users() -> int:
+    """Delete the archived readings of users no longer in the database; returns the readings deleted"""
+    if not any(Path(settings.HEALTH_METRICS_ARCHIVE_DIR).glob("????-??.npz")):
+        return 0
+    # Imported on first use: it loads NumPy, which would slow down startup
+    from app.services.metric_archive import metric_archive
+
+    archived = sorted(await asyncio.to_thread(metric_archive.user_ids))
+    existing = set()
+    for i in range(0, len(archived), USER_IDS_PER_REQUEST):
+        response = await execute(
+            supabase.table('users').select('id').in_('id', archived[i:i + USER_IDS_PER_REQUEST])
+        )
+        existing.update(str(row['id']) for row in response.data or [])
+
+    deleted = 0
+    for user_id in set(archived) - existing:
+        readings = await asyncio.to_thread(metric_archive.delete_readings, user_id)
+        logger.info("Deleted {} archived health metrics of deleted user {}", readings, user_id)
+        deleted += readings
+    return deleted
+
+
+async def maintain() -> None:
+    """Keep partitions ahead of the calendar and the archive free of deleted accounts (run as a background task)"""
+    while True:
+        try:
+            await ensure_partitions()
+        except Exception as e:
+            logger.error("Failed to create health metric partitions: {}", e)
+        try:
+            await purge_deleted_users()
+        except Exception as e:
+            logger.error("Failed to purge archived health metrics of deleted users: {}", e)
+        await asyncio.sleep(MAINTENANCE_SECONDS)
+
+
+async def _archive_month(archive, month: date) -> int:
+    """Write a month's readings to the archive and drop its partition; returns the readings archived"""
+    if archive.path(month).exists():
+        raise RuntimeError(f"{month:%Y-%m} is already archived")
+
+    start, end = month_bounds(month)
+    writer = archive.writer(month)
+    last = None
+    while True:
+        query = supabase.table('health_metrics').select('*').gte(
+            'recorded_at', start.isoformat()
+        ).lt('recorded_at', end.isoformat())
+        if last is not None:
+            # Keyset pagination: the rows after the last one in (recorded_at, id) order
+            query = query.or_(
+                f'recorded_at.gt."{last["recorded_at"]}",'
+                f'and(recorded_at.eq."{last["recorded_at"]}",id.gt.{last["id"]})'
+            )
+        page = (await execute(query.order('recorded_at').order('id').limit(PAGE_ROWS))).data or []
+        writer.add(page)
+        if len(page) < PAGE_ROWS:
+            break
+        last = page[-1]
+
+    await asyncio.to_thread(writer.save)
+    await execute(supabase.rpc('drop_health_metrics_partition', {
+        'p_month': month.isoformat(),
+        'p_archived_rows': writer.rows,
+    }))
+    archive.publish(month)
+    return writer.rows
+
+
+@job(ARCHIVE_HEALTH_METRICS)
+async def archive_health_metrics(user_id: str, payload: dict) -> dict:
+    """Archive the months older than the retention window; the result lists them"""
+    # Imported on first use: it loads NumPy, which would slow down startup
+    from app.services.metric_archive import metric_archive
+
+    response = await execute(supabase.rpc('health_metrics_partitions', {}))
+    partitions = {date.fromisoformat(str(row['month'])[:10]) for row in response.data or []}
+
+    # An earlier run wrote these and dropped their partitions, but stopped before publishing them
+    for month in metric_archive.pending_months():
+        if month not in partitions:
+            metric_archive.publish(month)
+
+    keep_from = add_months(month_start(datetime.now(timezone.utc)), 1 - settings.HEALTH_METRICS_RETENTION_MONTHS)
+    archived = []
+    for month in sorted(partitions):
+        if month >= keep_from:
+            break
+        readings = await _archive_month(metric_archive, month)
+        logger.info("Archived {} health metrics from {:%Y-%m}", readings, month)
+        archived.append({'month': month.isoformat(), 'readings': readings})
+
+    return {'archived': archived, 'kept_from': keep_from.isoformat()}
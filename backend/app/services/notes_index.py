@@ -0,0 +1,308 @@
+"""
+Per-user retrieval index over notes
+
+The free-text notes on medications, appointments and health metrics are
+embedded offline with hashed TF-IDF: words (lightly stemmed, stop words
+dropped), word pairs and word prefixes are hashed into HASH_DIM signed
+buckets, so no vocabulary has to be kept or grown. Each user's note vectors
+are rows of one float32 NumPy matrix, updated in place from the change feed,
+with document frequencies kept alongside so IDF weights stay current. A
+query is one matrix-vector product: cosine similarity of the IDF-weighted
+vectors.
+"""
+
+import asyncio
+import math
+import re
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.appointment_index import to_utc
+from app.services.changes import Change, subscribe, subscribe_reset, MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
+from app.services.database import execute, supabase
+from app.services.search_index import normalize
+
+# Hashed feature buckets per vector (a note's row is HASH_DIM float32s)
+HASH_DIM = 1024
+# Minimum cosine similarity to return
+MIN_SIMILARITY = 0.05
+# Characters of note text returned around the best match
+SNIPPET_CHARS = 240
+# Leading letters of longer words kept as an extra, half-weight feature
+PREFIX_CHARS = 4
+# Rows per request: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by did do does for from had has have he her his i if in into is it its
+me my no not of on or our she so than that the their them then there they this to too up was we were
+what when which who will with you your after before about again also am any can could just more very
+""".split())
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;\n])\s+")
+
+
+def stem(word: str) -> str:
+    """Strip common English suffixes so "headaches" matches "headache" """
+    for suffix in ("ing", "ed", "ies", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "ies":
+                return word[:-3] + "y"
+            if suffix == "s" and word.endswith(("ss", "us", "is")):
+                return word
+            return word[:-len(suffix)]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    return [stem(word) for word in normalize(text).split() if len(word) > 1 and word not in STOP_WORDS]
+
+
+def _bucket(feature: str) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode())
+    return h % HASH_DIM, 1.0 if h & 0x80000000 else -1.0
+
+
+def features(text: str) -> Dict[str, float]:
+    """
+    Weighted features of a text with sublinear term frequency
+
+    Words and word pairs count fully; the first PREFIX_CHARS letters of
+    longer words count half, so related forms ("dizzy", "dizziness") meet.
+    """
+    words = terms(text)
+    counts: Dict[Tuple[str, float], int] = {}
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        counts[(feature, 1.0)] = counts.get((feature, 1.0), 0) + 1
+    for word in words:
+        if len(word) > PREFIX_CHARS:
+            key = (f"{word[:PREFIX_CHARS]}*", 0.5)
+            counts[key] = counts.get(key, 0) + 1
+    return {feature: weight * (1.0 + math.log(count)) for (feature, weight), count in counts.items()}
+
+
+def hashed_tf(text: str) -> np.ndarray:
+    """A text's features hashed into HASH_DIM signed buckets"""
+    vector = np.zeros(HASH_DIM, dtype=np.float32)
+    for feature, value in features(text).items():
+        index, sign = _bucket(feature)
+        vector[index] += sign * value
+    return vector
+
+
+def snippet(text: str, query_terms: List[str], width: int = SNIPPET_CHARS) -> str:
+    """The sentence sharing most terms with the query, trimmed to about `width` characters"""
+    text = " ".join(text.split())
+    if len(text) <= width:
+        return text
+    wanted = set(query_terms)
+    sentences = _SENTENCE_END.split(text)
+    best = max(range(len(sentences)), key=lambda i: len(wanted.intersection(terms(sentences[i]))))
+    start = sum(len(sentence) + 1 for sentence in sentences[:best])
+    excerpt = text[start:start + width]
+    if start + width < len(text):
+        excerpt = excerpt.rsplit(" ", 1)[0] + "…"
+    return ("…" if start else "") + excerpt
+
+
+@dataclass
+class Note:
+    kind: str
+    id: str
+    title: str
+    text: str
+    when: Optional[datetime]
+
+
+def medication_note(row: dict) -> Optional[Note]:
+    if not row.get('notes'):
+        return None
+    return Note("medication", str(row['id']), row.get('name', ''), row['notes'],
+                to_utc(row['created_at']) if row.get('created_at') else None)
+
+
+def appointment_note(row: dict) -> Optional[Note]:
+    if not row.get('notes'):
+        return None
+    return Note("appointment", str(row['id']), f"{row.get('doctor_name', '')} ({row.get('specialty', '')})", row['notes'],
+                to_utc(row['date_time']) if row.get('date_time') else None)
+
+
+def health_metric_note(row: dict) -> Optional[Note]:
+    if not row.get('notes'):
+        return None
+    metric_type = str(row.get('metric_type', '')).replace('_', ' ')
+    return Note("health_metric", str(row['id']), f"{metric_type} {row.get('value', '')} {row.get('unit', '')}".strip(),
+                row['notes'], to_utc(row['recorded_at']) if row.get('recorded_at') else None)
+
+
+NOTE_BUILDERS = {
+    MEDICATIONS: medication_note,
+    APPOINTMENTS: appointment_note,
+    HEALTH_METRICS: health_metric_note,
+}
+
+
+class UserNotesIndex:
+    """One user's note vectors as rows of a growable float32 matrix"""
+
+    def __init__(self, capacity: int = 64):
+        self._vectors = np.zeros((capacity, HASH_DIM), dtype=np.float32)
+        self._notes: List[Note] = []
+        self._rows: Dict[Tuple[str, str], int] = {}
+        # Notes containing each bucket, for IDF
+        self._df = np.zeros(HASH_DIM, dtype=np.int32)
+        self._idf: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def add(self, note: Note) -> None:
+        self.remove(note.kind, note.id)
+        vector = hashed_tf(note.text)
+        count = len(self._notes)
+        if count == len(self._vectors):
+            grown = np.zeros((count * 2, HASH_DIM), dtype=np.float32)
+            grown[:count] = self._vectors
+            self._vectors = grown
+
+        self._vectors[count] = vector
+        self._notes.append(note)
+        self._rows[(note.kind, note.id)] = count
+        self._df += vector != 0
+        self._idf = self._norms = None
+
+    def remove(self, kind: str, record_id: str) -> None:
+        row = self._rows.pop((kind, record_id), None)
+        if row is None:
+            return
+        self._df -= self._vectors[row] != 0
+
+        # Move the last note into the gap so rows stay contiguous
+        last = len(self._notes) - 1
+        if row != last:
+            moved = self._notes[last]
+            self._vectors[row] = self._vectors[last]
+            self._notes[row] = moved
+            self._rows[(moved.kind, moved.id)] = row
+        self._vectors[last] = 0
+        self._notes.pop()
+        self._idf = self._norms = None
+
+    def _weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """IDF per bucket and the norm of each IDF-weighted row, recomputed after writes"""
+        if self._idf is None:
+            count = len(self._notes)
+            self._idf = (np.log((1.0 + count) / (1.0 + self._df)) + 1.0).astype(np.float32)
+            rows = self._vectors[:count]
+            self._norms = np.sqrt(np.square(rows) @ np.square(self._idf))
+        return self._idf, self._norms
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Note, float, str]]:
+        """Most similar notes as (note, cosine similarity, snippet), best first"""
+        if not self._notes:
+            return []
+        query_vector = hashed_tf(query)
+        if not query_vector.any():
+            return []
+
+        idf, norms = self._weights()
+        weighted = query_vector * idf
+        scores = (self._vectors[:len(self._notes)] @ (weighted * idf)) / (
+            np.maximum(norms, 1e-9) * float(np.linalg.norm(weighted))
+        )
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        query_terms = terms(query)
+        return [
+            (self._notes[i], round(float(scores[i]), 3), snippet(self._notes[i].text, query_terms))
+            for i in top if scores[i] >= MIN_SIMILARITY
+        ]
+
+
+async def _noted_rows(table: str, columns: str, user_id: str) -> List[dict]:
+    """All of a user's rows with notes in a table, a page at a time"""
+    rows: List[dict] = []
+    while True:
+        query = supabase.table(table).select(columns).eq('user_id', user_id).not_.is_('notes', 'null')
+        if rows:
+            # Keyset pagination on id, so rows written meanwhile cannot shift a page
+            query = query.gt('id', rows[-1]['id'])
+        page = (await execute(query.order('id').limit(PAGE_ROWS))).data or []
+        rows.extend(page)
+        if len(page) < PAGE_ROWS:
+            return rows
+
+
+class NotesIndex:
+    """Per-user notes indexes, loaded on first use and kept for the most recent users"""
+
+    def __init__(self, max_users: int = 500):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserNotesIndex]" = OrderedDict()
+
+    async def for_user(self, user_id: str) -> UserNotesIndex:
+        index = self._users.get(user_id)
+        if index is not None:
+            self._users.move_to_end(user_id)
+            return index
+
+        tables = await asyncio.gather(
+            _noted_rows('medications', 'id, name, notes, created_at', user_id),
+            _noted_rows('appointments', 'id, doctor_name, specialty, notes, date_time', user_id),
+            _noted_rows('health_metrics', 'id, metric_type, value, unit, notes, recorded_at', user_id),
+        )
+
+        rows = [(resource, row) for resource, table in zip(NOTE_BUILDERS, tables) for row in table]
+        index = UserNotesIndex(capacity=max(64, len(rows)))
+        for resource, row in rows:
+            note = NOTE_BUILDERS[resource](row)
+            if note is not None:
+                index.add(note)
+
+        # Another request may have loaded the same user meanwhile; keep the first
+        index = self._users.setdefault(user_id, index)
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return index
+
+    async def search(self, user_id: str, query: str, limit: int = 5) -> List[Tuple[Note, float, str]]:
+        return (await self.for_user(user_id)).search(query, limit)
+
+    def apply(self, change: Change) -> None:
+        """Reflect a write in an already-loaded index"""
+        index = self._users.get(change.user_id)
+        if index is None:
+            return
+
+        kind = {MEDICATIONS: "medication", APPOINTMENTS: "appointment", HEALTH_METRICS: "health_metric"}[change.resource]
+        note = None if change.deleted else NOTE_BUILDERS[change.resource](change.record)
+        if note is None:
+            index.remove(kind, change.record_id)
+        else:
+            index.add(note)
+
+    def invalidate(self, user_id: str) -> None:
+        self._users.pop(user_id, None)
+
+
+notes_index = NotesIndex()
+
+
+def _on_reset(user_id: str, resource: str) -> None:
+    if resource in NOTE_BUILDERS:
+        notes_index.invalidate(user_id)
+
+
+for _resource in NOTE_BUILDERS:
+    subscribe(_resource, notes_index.apply)
+subscribe_reset(_on_reset)
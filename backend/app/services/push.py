@@ -0,0 +1,182 @@
+"""
+WebSocket push channel
+
+Change-feed events (new readings, medication and appointment changes) and
+due doses are pushed to every open WebSocket of the user concerned.
+
+Idle connections cost as little as possible: each has a small bounded queue
+and a sender task that only exists while the queue has messages, and one
+task per worker sends heartbeats to all connections. A client that falls
+more than WS_SEND_QUEUE_SIZE messages behind has its queue replaced by a
+single "resync" message telling it to refetch.
+"""
+
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from app.config import settings
+from app.services.changes import Change, subscribe
+from app.services.dose_scheduler import DueDose, dose_scheduler
+
+RESYNC = json.dumps({'type': 'resync'})
+
+# Connections sent a heartbeat between yields to the event loop
+HEARTBEAT_BATCH = 500
+
+
+class Connection:
+    """One client WebSocket with its bounded send queue"""
+
+    __slots__ = ("websocket", "user_id", "max_queue", "dropped", "closed", "busy_since", "_queue", "_sender")
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.closed = False
+        # Loop time of the last send progress while the sender is running
+        self.busy_since = 0.0
+        self._queue: Deque[str] = deque()
+        self._sender: Optional[asyncio.Task] = None
+
+    def push(self, message: str) -> None:
+        if self.closed:
+            return
+        if len(self._queue) >= self.max_queue:
+            # Too far behind: the client refetches instead of replaying everything
+            self.dropped += len(self._queue)
+            self._queue.clear()
+            self._queue.append(RESYNC)
+        else:
+            self._queue.append(message)
+
+        if self._sender is None:
+            self.busy_since = asyncio.get_running_loop().time()
+            self._sender = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._queue and not self.closed:
+                await self.websocket.send_text(self._queue.popleft())
+                self.busy_since = loop.time()
+        except Exception:
+            await self.abort()
+        finally:
+            self._sender = None
+
+    def stalled(self, now: float, timeout: float) -> bool:
+        """Whether a send has made no progress for `timeout` seconds"""
+        return self._sender is not None and now - self.busy_since > timeout
+
+    async def abort(self) -> None:
+        # Slow or gone; the receive loop sees the disconnect and unregisters
+        self.closed = True
+        self._queue.clear()
+        try:
+            await self.websocket.close(code=1011)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        if self._sender is not None:
+            self._sender.cancel()
+
+
+class ConnectionManager:
+    """Open connections per user, with fan-out and a shared heartbeat"""
+
+    def __init__(self, max_queue: int = 64, heartbeat_seconds: float = 30.0, send_timeout: float = 10.0):
+        self.max_queue = max_queue
+        self.heartbeat_seconds = heartbeat_seconds
+        self.send_timeout = send_timeout
+        self._users: Dict[str, Set[Connection]] = {}
+        self.connections = 0
+        self.sent = 0
+
+    def connect(self, websocket: WebSocket, user_id: str) -> Connection:
+        connection = Connection(websocket, user_id, self.max_queue)
+        self._users.setdefault(user_id, set()).add(connection)
+        self.connections += 1
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        connection.close()
+        connections = self._users.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        self.connections -= 1
+        if not connections:
+            del self._users[connection.user_id]
+
+    def publish(self, user_id: str, event: dict) -> None:
+        """Queue an event for every connection of a user (serialized once)"""
+        connections = self._users.get(user_id)
+        if not connections:
+            return
+        message = json.dumps(event, default=str)
+        for connection in connections:
+            connection.push(message)
+        self.sent += len(connections)
+
+    async def heartbeat(self) -> None:
+        """Keep idle connections (and proxies in front of them) alive and drop stalled ones"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            message = json.dumps({'type': 'heartbeat', 'at': datetime.now(timezone.utc).isoformat()})
+            now = loop.time()
+            pushed = 0
+            for connections in list(self._users.values()):
+                for connection in list(connections):
+                    if connection.stalled(now, self.send_timeout):
+                        # One timer check per heartbeat instead of a timeout per send
+                        connection._sender.cancel()
+                        asyncio.create_task(connection.abort())
+                    else:
+                        connection.push(message)
+                pushed += len(connections)
+                # Yield now and then so a large fan-out doesn't stall requests
+                if pushed >= HEARTBEAT_BATCH:
+                    pushed = 0
+                    await asyncio.sleep(0)
+
+
+connection_manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    heartbeat_seconds=settings.WS_HEARTBEAT_SECONDS,
+    send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+)
+
+
+def _push_change(change: Change) -> None:
+    connection_manager.publish(change.user_id, {
+        'type': 'change',
+        'resource': change.resource,
+        'id': change.record_id,
+        'deleted': change.deleted,
+        'record': change.record,
+    })
+
+
+def _push_due_dose(dose: DueDose) -> None:
+    connection_manager.publish(dose.user_id, {
+        'type': 'dose_due',
+        'medication_id': dose.medication_id,
+        'name': dose.name,
+        'dosage': dose.dosage,
+        'due_at': dose.due_at.isoformat(),
+    })
+
+
+subscribe('*', _push_change)
+dose_scheduler.add_listener(_push_due_dose)
@@ -0,0 +1,284 @@
+"""
+Read-through cache for per-user list queries
+
+List endpoints and agent tools run the same queries over and over (active
+medications on every page view and every agent turn). QueryCache keeps the
+rows of each query keyed by (user, resource, query parameters):
+
+- get() returns cached rows, or runs the loader and stores what it returns
+- entries are evicted least recently used once their total size (as JSON)
+  exceeds the memory budget
+- every write to a resource, in this process or (over the invalidation bus)
+  in a sibling worker, marks that user's entries for the resource stale, so
+  the next get() reloads them; a load that overlapped such a write is
+  returned but not stored
+- when that reload fails with DatabaseUnavailable, the stale rows are
+  returned instead and reloaded in the background once the database's
+  circuit closes; StaleDataMiddleware flags such responses (X-Data-Stale)
+- stats() reports hits, misses, evictions, invalidations and stale reads
+
+Cached rows are shared between requests and must not be modified. The
+queries below are shared by the routers and the agent tools, so both hit
+the same entries.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from pydantic_core import to_json
+from starlette.datastructures import MutableHeaders
+
+from app.config import settings
+from app.services.appointment_index import to_utc
+from app.services.changes import Change, subscribe, subscribe_reset, MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
+from app.services.database import DatabaseUnavailable, db_breaker, execute, supabase
+
+CacheKey = Tuple[str, str, tuple]
+Loader = Callable[[], Awaitable[List[dict]]]
+
+# Load times of the stale rows served in the current request (see StaleDataMiddleware)
+_stale_reads: ContextVar[Optional[List[float]]] = ContextVar('stale_reads', default=None)
+
+
+class QueryCache:
+    """Rows per (user, resource, parameters), LRU-evicted within `max_bytes`"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # A larger result would push out most of the cache for one entry
+        self.max_entry_bytes = max_bytes // 8
+        # key -> (rows, size as JSON, time.time() when loaded)
+        self._entries: "OrderedDict[CacheKey, Tuple[List[dict], int, float]]" = OrderedDict()
+        self._keys: Dict[Tuple[str, str], Set[CacheKey]] = {}
+        # Entries written to since they were loaded
+        self._stale: Set[CacheKey] = set()
+        # Stale entries served while the database was unavailable, reloaded when it is back
+        self._revalidate: Dict[CacheKey, Loader] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Bumped on every write, so a load can tell that it overlapped one
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_served = 0
+        self.revalidated = 0
+
+    async def get(self, user_id: str, resource: str, params: tuple, load: Loader) -> List[dict]:
+        key = (str(user_id), resource, params)
+        entry = self._entries.get(key)
+        if entry is not None and key not in self._stale:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        generation = self._generations.get(key[:2], 0)
+        try:
+            rows = await load()
+        except DatabaseUnavailable:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise
+            self.stale_served += 1
+            stale_reads = _stale_reads.get()
+            if stale_reads is not None:
+                stale_reads.append(entry[2])
+            self._revalidate[key] = load
+            self._loop = asyncio.get_running_loop()
+            return entry[0]
+
+        if self._generations.get(key[:2], 0) == generation:
+            self._store(key, rows)
+        return rows
+
+    async def rows(self, user_id: str, resource: str, params: tuple, query) -> List[dict]:
+        """Rows of a Supabase query, through the cache"""
+        async def load() -> List[dict]:
+            return (await execute(query)).data or []
+
+        return await self.get(user_id, resource, params, load)
+
+    def _store(self, key: CacheKey, rows: List[dict]) -> None:
+        size = len(to_json(rows))
+        if size > self.max_entry_bytes:
+            return
+
+        self._discard(key)
+        self._entries[key] = (rows, size, time.time())
+        self._keys.setdefault(key[:2], set()).add(key)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key: CacheKey) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[1]
+        self._stale.discard(key)
+        self._revalidate.pop(key, None)
+        keys = self._keys.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[key[:2]]
+        return True
+
+    def invalidate(self, user_id: str, resource: str) -> None:
+        """Mark a user's cached queries on a resource stale"""
+        owner = (str(user_id), resource)
+        self._generations[owner] = self._generations.get(owner, 0) + 1
+        for key in self._keys.get(owner, ()):
+            if key not in self._stale:
+                self._stale.add(key)
+                self.invalidations += 1
+
+    def revalidate(self) -> None:
+        """Reload the stale entries served while the database was unavailable (from any thread)"""
+        loop = self._loop
+        if self._revalidate and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._start_revalidation)
+
+    def _start_revalidation(self) -> None:
+        pending, self._revalidate = self._revalidate, {}
+        for key, load in pending.items():
+            task = asyncio.create_task(self._reload(key, load))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _reload(self, key: CacheKey, load: Loader) -> None:
+        # Already reloaded by a request, or evicted
+        if key not in self._stale:
+            return
+        generation = self._generations.get(key[:2], 0)
+        try:
+            rows = await load()
+        except Exception as e:
+            # Served stale again (and retried) on its next use
+            logger.warning("Failed to reload cached {} for user {}: {}", key[1], key[0], e)
+            return
+        if key in self._stale and self._generations.get(key[:2], 0) == generation:
+            self._store(key, rows)
+            self.revalidated += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'stale_entries': len(self._stale),
+            'stale_served': self.stale_served,
+            'revalidated': self.revalidated,
+        }
+
+
+query_cache = QueryCache(settings.QUERY_CACHE_MB * 1024 * 1024)
+
+
+def _invalidate_on_change(change: Change) -> None:
+    query_cache.invalidate(change.user_id, change.resource)
+
+
+subscribe('*', _invalidate_on_change)
+subscribe_reset(query_cache.invalidate)
+db_breaker.on_close(query_cache.revalidate)
+
+
+class StaleDataMiddleware:
+    """
+    Flags responses that include stale cached rows with X-Data-Stale (their
+    age in seconds), and drops their ETag: it names the current data
+    version, which the rows predate
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stale_reads: List[float] = []
+        token = _stale_reads.set(stale_reads)
+
+        async def send_flagged(message):
+            if message["type"] == "http.response.start" and stale_reads:
+                headers = MutableHeaders(scope=message)
+                headers["X-Data-Stale"] = str(int(time.time() - min(stale_reads)))
+                headers["Cache-Control"] = "no-store"
+                if "etag" in headers:
+                    del headers["etag"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_flagged)
+        finally:
+            _stale_reads.reset(token)
+
+
+async def medications(user_id: str, active_only: bool = True) -> List[dict]:
+    """The user's medications, newest first"""
+    query = supabase.table('medications').select('*').eq('user_id', user_id)
+    if active_only:
+        query = query.eq('active', True)
+    return await query_cache.rows(user_id, MEDICATIONS, ('list', active_only), query.order('created_at', desc=True))
+
+
+async def appointments(user_id: str, from_time: Optional[datetime] = None, to_time: Optional[datetime] = None) -> List[dict]:
+    """The user's appointments in [from_time, to_time), earliest first"""
+    from_time = to_utc(from_time) if from_time else None
+    to_time = to_utc(to_time) if to_time else None
+
+    query = supabase.table('appointments').select('*').eq('user_id', user_id)
+    if from_time:
+        query = query.gte('date_time', from_time.isoformat())
+    if to_time:
+        query = query.lt('date_time', to_time.isoformat())
+    return await query_cache.rows(user_id, APPOINTMENTS, ('list', from_time, to_time), query.order('date_time'))
+
+
+async def upcoming_appointments(user_id: str, limit: Optional[int] = None) -> List[dict]:
+    """The user's scheduled appointments from now on, earliest first"""
+    query = supabase.table('appointments').select('*').eq('user_id', user_id).eq('status', 'scheduled')
+    # Cached without a time bound so the entry stays valid; past ones are skipped here
+    rows = await query_cache.rows(user_id, APPOINTMENTS, ('scheduled',), query.order('date_time'))
+    now = datetime.now(timezone.utc)
+    upcoming = [row for row in rows if to_utc(row['date_time']) >= now]
+    return upcoming[:limit] if limit else upcoming
+
+
+async def health_metrics(
+    user_id: str,
+    metric_type: Optional[str] = None,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None
+) -> List[dict]:
+    """The user's health metrics recorded in [from_time, to_time), newest first"""
+    from_time = to_utc(from_time) if from_time else None
+    to_time = to_utc(to_time) if to_time else None
+
+    query = supabase.table('health_metrics').select('*').eq('user_id', user_id)
+    if metric_type:
+        query = query.eq('metric_type', metric_type)
+    if from_time:
+        query = query.gte('recorded_at', from_time.isoformat())
+    if to_time:
+        query = query.lt('recorded_at', to_time.isoformat())
+    params = ('list', metric_type, from_time, to_time)
+    return await query_cache.rows(user_id, HEALTH_METRICS, params, query.order('recorded_at', desc=True))
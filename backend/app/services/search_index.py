@@ -0,0 +1,269 @@
+"""
+Per-user trigram search index
+
+Medication names, doctor names, specialties, locations and notes are split
+into trigrams (pg_trgm style: each word padded with two leading spaces and
+one trailing space) and kept in a per-user inverted index. A query scores
+each record by the weighted share of its trigrams found in the record, so
+partial names and typos ("cardiolgy") still match. Indexes are loaded on
+first use and kept current from the change feed.
+"""
+
+import asyncio
+import re
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.services.appointment_index import to_utc
+from app.services.changes import Change, subscribe, subscribe_reset, MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
+from app.services.database import execute, supabase
+
+MEDICATION = "medication"
+APPOINTMENT = "appointment"
+HEALTH_METRIC = "health_metric"
+
+# Minimum score (share of query trigrams found, weighted by field) to return
+MIN_SCORE = 0.3
+# Rows per request: PostgREST returns at most its max-rows (1000 by default)
+PAGE_ROWS = 1000
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+DocKey = Tuple[str, str]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+@dataclass
+class SearchDocument:
+    kind: str
+    id: str
+    title: str
+    subtitle: str
+    when: Optional[datetime]
+    fields: Tuple[Tuple[str, float], ...]  # (text, weight)
+
+    @property
+    def key(self) -> DocKey:
+        return (self.kind, self.id)
+
+
+def medication_document(row: dict) -> SearchDocument:
+    subtitle = f"{row.get('dosage', '')}, {row.get('frequency', '')}".strip(", ")
+    if row.get('active') is False:
+        subtitle += " (stopped)"
+    return SearchDocument(
+        kind=MEDICATION,
+        id=str(row['id']),
+        title=row.get('name', ''),
+        subtitle=subtitle,
+        when=to_utc(row['created_at']) if row.get('created_at') else None,
+        fields=((row.get('name', ''), 1.0), (row.get('notes') or '', 0.6)),
+    )
+
+
+def appointment_document(row: dict) -> SearchDocument:
+    return SearchDocument(
+        kind=APPOINTMENT,
+        id=str(row['id']),
+        title=f"{row.get('doctor_name', '')} ({row.get('specialty', '')})",
+        subtitle=f"{row.get('location', '')}, {row.get('status', 'scheduled')}",
+        when=to_utc(row['date_time']) if row.get('date_time') else None,
+        fields=(
+            (row.get('doctor_name', ''), 1.0),
+            (row.get('specialty', ''), 1.0),
+            (row.get('location', ''), 0.8),
+            (row.get('notes') or '', 0.6),
+        ),
+    )
+
+
+def health_metric_document(row: dict) -> Optional[SearchDocument]:
+    # Only readings with notes are worth searching
+    if not row.get('notes'):
+        return None
+    metric_type = str(row.get('metric_type', '')).replace('_', ' ')
+    return SearchDocument(
+        kind=HEALTH_METRIC,
+        id=str(row['id']),
+        title=f"{metric_type} {row.get('value', '')} {row.get('unit', '')}".strip(),
+        subtitle=row['notes'],
+        when=to_utc(row['recorded_at']) if row.get('recorded_at') else None,
+        fields=((row['notes'], 0.6), (metric_type, 0.5)),
+    )
+
+
+BUILDERS = {
+    MEDICATIONS: medication_document,
+    APPOINTMENTS: appointment_document,
+    HEALTH_METRICS: health_metric_document,
+}
+
+
+class UserSearchIndex:
+    """Inverted trigram index over one user's records"""
+
+    def __init__(self):
+        self._documents: Dict[DocKey, SearchDocument] = {}
+        # trigram -> {document key: weight of the best field containing it}
+        self._postings: Dict[str, Dict[DocKey, float]] = {}
+        self._grams: Dict[DocKey, Iterable[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, document: SearchDocument) -> None:
+        self.remove(document.kind, document.id)
+        weights: Dict[str, float] = {}
+        for text, weight in document.fields:
+            for gram in trigrams(text):
+                if weight > weights.get(gram, 0.0):
+                    weights[gram] = weight
+
+        key = document.key
+        for gram, weight in weights.items():
+            self._postings.setdefault(gram, {})[key] = weight
+        self._documents[key] = document
+        self._grams[key] = weights.keys()
+
+    def remove(self, kind: str, record_id: str) -> None:
+        key = (kind, record_id)
+        if self._documents.pop(key, None) is None:
+            return
+        for gram in self._grams.pop(key):
+            posting = self._postings[gram]
+            del posting[key]
+            if not posting:
+                del self._postings[gram]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        kinds: Optional[Iterable[str]] = None
+    ) -> List[Tuple[SearchDocument, float]]:
+        """Best matching documents with their score in (0, 1], best first"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        allowed = set(kinds) if kinds else None
+
+        scores: Dict[DocKey, float] = {}
+        for gram in query_grams:
+            for key, weight in self._postings.get(gram, {}).items():
+                scores[key] = scores.get(key, 0.0) + weight
+
+        results = []
+        for key, total in scores.items():
+            score = total / len(query_grams)
+            if score < MIN_SCORE or (allowed is not None and key[0] not in allowed):
+                continue
+            results.append((self._documents[key], round(score, 3)))
+
+        # Best score first; ties go to the most recent record
+        results.sort(key=lambda item: (item[1], item[0].when.timestamp() if item[0].when else 0.0), reverse=True)
+        return results[:limit]
+
+
+async def _user_rows(table: str, columns: str, user_id: str, notes_only: bool = False) -> List[dict]:
+    """All of a user's rows in a table, a page at a time"""
+    rows: List[dict] = []
+    while True:
+        query = supabase.table(table).select(columns).eq('user_id', user_id)
+        if notes_only:
+            query = query.not_.is_('notes', 'null')
+        if rows:
+            # Keyset pagination on id, so rows written meanwhile cannot shift a page
+            query = query.gt('id', rows[-1]['id'])
+        page = (await execute(query.order('id').limit(PAGE_ROWS))).data or []
+        rows.extend(page)
+        if len(page) < PAGE_ROWS:
+            return rows
+
+
+class SearchIndex:
+    """Per-user search indexes, loaded on first use and kept for the most recent users"""
+
+    def __init__(self, max_users: int = 2000):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserSearchIndex]" = OrderedDict()
+
+    async def for_user(self, user_id: str) -> UserSearchIndex:
+        index = self._users.get(user_id)
+        if index is not None:
+            self._users.move_to_end(user_id)
+            return index
+
+        medications, appointments, metrics = await asyncio.gather(
+            _user_rows('medications', 'id, name, dosage, frequency, notes, active, created_at', user_id),
+            _user_rows('appointments', 'id, doctor_name, specialty, location, notes, status, date_time', user_id),
+            _user_rows('health_metrics', 'id, metric_type, value, unit, notes, recorded_at', user_id, notes_only=True),
+        )
+
+        index = UserSearchIndex()
+        for resource, rows in ((MEDICATIONS, medications), (APPOINTMENTS, appointments), (HEALTH_METRICS, metrics)):
+            for row in rows:
+                document = BUILDERS[resource](row)
+                if document is not None:
+                    index.add(document)
+
+        # Another request may have loaded the same user meanwhile; keep the first
+        index = self._users.setdefault(user_id, index)
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return index
+
+    async def search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        kinds: Optional[Iterable[str]] = None
+    ) -> List[Tuple[SearchDocument, float]]:
+        return (await self.for_user(user_id)).search(query, limit, kinds)
+
+    def apply(self, change: Change) -> None:
+        """Reflect a write in an already-loaded index"""
+        index = self._users.get(change.user_id)
+        if index is None:
+            return
+
+        kind = {MEDICATIONS: MEDICATION, APPOINTMENTS: APPOINTMENT, HEALTH_METRICS: HEALTH_METRIC}[change.resource]
+        document = None if change.deleted else BUILDERS[change.resource](change.record)
+        if document is None:
+            index.remove(kind, change.record_id)
+        else:
+            index.add(document)
+
+    def invalidate(self, user_id: str) -> None:
+        self._users.pop(user_id, None)
+
+
+search_index = SearchIndex()
+
+
+def _on_reset(user_id: str, resource: str) -> None:
+    if resource in BUILDERS:
+        search_index.invalidate(user_id)
+
+
+for _resource in BUILDERS:
+    subscribe(_resource, search_index.apply)
+subscribe_reset(_on_reset)
@@ -0,0 +1,193 @@
+"""
+Fast JSON responses for list endpoints
+
+FastAPI validates a handler's return value against `response_model`,
+serializes the models back into Python primitives and then runs json.dumps
+over them. For large lists that dominates request CPU. Here rows are
+validated once through a cached TypeAdapter and written straight to JSON
+bytes by pydantic-core, and the resulting Response bypasses FastAPI's own
+response serialization. Routes keep `response_model` for the OpenAPI schema.
+
+Clients that send `Accept: application/msgpack` get lists as a MessagePack
+column table instead (see columnar), and routers using MsgPackRoute accept
+MessagePack request bodies and return their other responses as MessagePack.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Type
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+
+from app.services.columnar import decode_table, encode_table, is_table, pack, unpack
+
+MSGPACK = "application/msgpack"
+# Accepted on requests and in Accept; responses use MSGPACK
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter for List[model], built once per model"""
+    return TypeAdapter(List[model])
+
+
+def dump_list(rows: List[dict], model: Type[BaseModel]) -> bytes:
+    """Validate raw rows against `model` and encode them as JSON in one pass"""
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def json_list_response(
+    rows: Optional[List[Any]],
+    model: Type[BaseModel],
+    response: Optional[Response] = None
+) -> Response:
+    """
+    JSON response for a list of rows
+
+    Headers already set on the route's injected `response` (ETag, ...) are
+    carried over, since FastAPI does not merge them into returned responses.
+    """
+    return Response(
+        content=dump_list(rows or [], model),
+        media_type="application/json",
+        headers=dict(response.headers) if response is not None else None
+    )
+
+
+def _media_type(content_type: Optional[str]) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return _media_type(content_type) in MSGPACK_TYPES
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Whether the client prefers MessagePack to JSON (by Accept quality; JSON wins ties with wildcards)"""
+    accept = request.headers.get("accept")
+    if not accept or "msgpack" not in accept:
+        return False
+
+    msgpack_quality = json_quality = 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.lower()
+        if media_type in MSGPACK_TYPES:
+            msgpack_quality = max(msgpack_quality, quality)
+        elif media_type in ("application/json", "application/*", "*/*"):
+            json_quality = max(json_quality, quality)
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+
+def column_table(rows: Optional[List[Any]], model: Type[BaseModel]) -> dict:
+    """Validate raw rows against `model` and encode them as a column table"""
+    adapter = list_adapter(model)
+    return encode_table(adapter.dump_python(adapter.validate_python(rows or [])), list(model.model_fields))
+
+
+def msgpack_list_response(
+    rows: Optional[List[Any]],
+    model: Type[BaseModel],
+    response: Optional[Response] = None
+) -> Response:
+    """MessagePack column table for a list of rows (headers carried over as in json_list_response)"""
+    return Response(
+        content=pack(column_table(rows, model)),
+        media_type=MSGPACK,
+        headers=dict(response.headers) if response is not None else None
+    )
+
+
+def list_response(
+    request: Request,
+    rows: Optional[List[Any]],
+    model: Type[BaseModel],
+    response: Optional[Response] = None
+) -> Response:
+    """List response in the format the client asked for (JSON unless it accepts MessagePack)"""
+    if wants_msgpack(request):
+        result = msgpack_list_response(rows, model, response)
+    else:
+        result = json_list_response(rows, model, response)
+    result.headers["Vary"] = "Accept"
+    return result
+
+
+async def _json_request(request: Request) -> Request:
+    """The request with its MessagePack body re-encoded as JSON (tables become lists of rows)"""
+    try:
+        data = unpack(await request.body())
+        if is_table(data):
+            data = decode_table(data)
+        content = to_json(data)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid MessagePack body"
+        )
+
+    headers = [
+        (key, value) for key, value in request.scope["headers"]
+        if key not in (b"content-type", b"content-length")
+    ]
+    headers += [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())]
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": content, "more_body": False}
+
+    return Request({**request.scope, "headers": headers}, receive)
+
+
+def _msgpack_response(response: Response) -> Response:
+    headers = {
+        key: value for key, value in response.headers.items()
+        if key not in ("content-type", "content-length")
+    }
+    headers["Vary"] = "Accept"
+    return Response(
+        content=pack(json.loads(response.body)),
+        status_code=response.status_code,
+        media_type=MSGPACK,
+        headers=headers
+    )
+
+
+class MsgPackRoute(APIRoute):
+    """
+    Route that also speaks MessagePack
+
+    Request bodies sent as MessagePack are decoded before validation, so
+    endpoints keep their models, and JSON responses are re-encoded when the
+    client prefers MessagePack. List endpoints encode their rows directly
+    with list_response.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            if is_msgpack(request.headers.get("content-type")):
+                request = await _json_request(request)
+            response = await handler(request)
+            if (
+                wants_msgpack(request)
+                and _media_type(response.headers.get("content-type")) == "application/json"
+                and getattr(response, "body", None)
+            ):
+                response = _msgpack_response(response)
+            return response
+
+        return route_handler
@@ -0,0 +1,92 @@
+"""
+Coalescing of identical concurrent reads
+
+When several requests ask for the same rows at once (the dashboard, the
+agent and a retry after a page load), only the first runs the query; the
+others await its result. database.execute() routes every read through
+`read_coalescer`, keyed by the exact request (table, filters, ordering,
+headers), so reads are only shared when they would return the same rows.
+
+A write to a table (through execute() or published on the change feed)
+makes later reads of it start a fresh call instead of joining one that
+began before the write, so a client never reads back data older than its
+own write.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.services.changes import Change, subscribe, subscribe_reset
+
+# Requests that only read and can safely share a response
+_READ_METHODS = ("GET", "HEAD")
+
+
+def read_key(query) -> Optional[Tuple]:
+    """Identity of a PostgREST read request, or None if it is not one"""
+    method = getattr(query, 'http_method', None)
+    if method not in _READ_METHODS:
+        return None
+    params = query.params
+    user = params.get('user_id', '').removeprefix('eq.') or None
+    table = query.path.lstrip('/')
+    return (table, user, method, str(params), tuple(sorted(query.headers.items())))
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile share its result"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            # A task of its own, so a caller that is cancelled (client gone) does not cancel the others
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._landed(key, done))
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: Hashable, flight: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Mark the error as retrieved when every caller has gone
+        if not flight.cancelled():
+            flight.exception()
+
+    def forget(self, match: Callable[[Hashable], bool]) -> None:
+        """Make callers of matching keys start new calls (the running ones still finish)"""
+        for key in [key for key in self._flights if match(key)]:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'coalesced_rate': round(self.coalesced / self.calls, 4) if self.calls else None,
+            'in_flight': len(self._flights),
+        }
+
+
+read_coalescer = SingleFlight()
+
+
+def _forget_on_change(change: Change) -> None:
+    read_coalescer.forget(lambda key: key[0] == change.resource and key[1] in (change.user_id, None))
+
+
+def _forget_on_reset(user_id: str, resource: str) -> None:
+    read_coalescer.forget(lambda key: key[0] == resource and key[1] in (user_id, None))
+
+
+subscribe('*', _forget_on_change)
+subscribe_reset(_forget_on_reset)
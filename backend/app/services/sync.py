@@ -0,0 +1,171 @@
+"""
+Incremental sync of a user's rows
+
+Clients that keep a local copy of their medications, appointments or
+health metrics ask the /sync endpoints for what changed since their last
+sync instead of downloading whole lists:
+
+- rows are read in (change time, id) order, PAGE_ROWS at a time: updated_at
+  for medications and appointments, created_at for health metrics (readings
+  are never updated)
+- deletions come from sync_tombstones, which a trigger fills as rows are
+  deleted (database/migrations/009_sync_tombstones.sql); maintain() purges
+  them after SYNC_TOMBSTONE_DAYS
+- the cursor returned with each page is opaque to clients. While has_more is
+  set it resumes after the page's last row; once caught up it points at the
+  start of the sync minus OVERLAP, so rows committed late with an earlier
+  change time are still picked up (a few rows are sent twice; clients
+  upsert by id)
+
+A cursor older than the tombstone retention, or with more deletions behind
+it than fit in a page, raises SyncExpired: the client drops its copy and
+syncs again without a cursor. Readings archived out of the database are not
+reported as deleted.
+"""
+
+import asyncio
+import base64
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple, Type
+
+from fastapi import Request, Response
+from loguru import logger
+from pydantic import BaseModel
+
+from app.config import settings
+from app.models.sync import SyncChanges
+from app.services.appointment_index import to_utc
+from app.services.changes import MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
+from app.services.columnar import pack
+from app.services.database import execute, supabase
+from app.services.serialization import MSGPACK, column_table, wants_msgpack
+
+# resource -> (table, column holding each row's last change)
+SYNCED = {
+    MEDICATIONS: ('medications', 'updated_at'),
+    APPOINTMENTS: ('appointments', 'updated_at'),
+    HEALTH_METRICS: ('health_metrics', 'created_at'),
+}
+
+# Rows per page (Supabase's default maximum per response)
+PAGE_ROWS = 1000
+# How far back a caught-up cursor reaches before the sync started: covers
+# transactions still open and clock skew between workers and the database
+OVERLAP = timedelta(seconds=60)
+# How often expired tombstones are purged
+MAINTENANCE_SECONDS = 24 * 60 * 60
+
+
+class SyncExpired(Exception):
+    """The cursor can no longer be served incrementally; sync again from the start"""
+
+
+@dataclass(frozen=True)
+class SyncCursor:
+    since: Optional[datetime] = None  # Changes at or after this time; None for everything
+    started: Optional[datetime] = None  # When the sync began, while paging
+    after: Optional[Tuple[str, str]] = None  # (change time, id) of the last row sent, while paging
+
+    def encode(self) -> str:
+        parts = [
+            self.since.isoformat() if self.since else "",
+            self.started.isoformat() if self.started else "",
+            *(self.after or ("", "")),
+        ]
+        return base64.urlsafe_b64encode("|".join(parts).encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "SyncCursor":
+        """Parse a cursor returned by a sync, or an ISO 8601 time to sync from"""
+        try:
+            return cls(since=to_utc(token))
+        except ValueError:
+            pass
+        try:
+            text = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            since, started, after_time, after_id = text.split("|")
+            return cls(
+                since=to_utc(since) if since else None,
+                started=to_utc(started) if started else None,
+                # Normalised, since they end up in a filter
+                after=(to_utc(after_time).isoformat(), str(uuid.UUID(after_id))) if after_id else None,
+            )
+        except Exception:
+            raise ValueError("Invalid sync cursor")
+
+
+async def changes(user_id: str, resource: str, since: Optional[str] = None) -> dict:
+    """
+    The next page of a user's changes to `resource` after the `since` cursor
+    (everything when None), as {'changed', 'deleted', 'cursor', 'has_more'}
+
+    Raises ValueError for a malformed cursor and SyncExpired for one that is
+    too old.
+    """
+    table, column = SYNCED[resource]
+    cursor = SyncCursor.decode(since) if since else SyncCursor()
+    now = datetime.now(timezone.utc)
+    if cursor.since is not None and cursor.since < now - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+        raise SyncExpired(f"Cursor is older than {settings.SYNC_TOMBSTONE_DAYS} days")
+
+    query = supabase.table(table).select('*').eq('user_id', user_id)
+    if cursor.since is not None:
+        query = query.gte(column, cursor.since.isoformat())
+    if cursor.after is not None:
+        # Keyset pagination: the rows after the last one sent in (change time, id) order
+        after_time, after_id = cursor.after
+        query = query.or_(f'{column}.gt."{after_time}",and({column}.eq."{after_time}",id.gt.{after_id})')
+    rows = (await execute(query.order(column).order('id').limit(PAGE_ROWS))).data or []
+
+    # Deletions go out with the first page; later ones are caught by the next sync
+    deleted = []
+    if cursor.since is not None and cursor.after is None:
+        tombstones = await execute(
+            supabase.table('sync_tombstones').select('record_id').eq(
+                'user_id', user_id
+            ).eq('resource', resource).gte('deleted_at', cursor.since.isoformat()).limit(PAGE_ROWS)
+        )
+        if len(tombstones.data or []) >= PAGE_ROWS:
+            raise SyncExpired("Too many deletions since the cursor")
+        deleted = [str(row['record_id']) for row in tombstones.data or []]
+
+    started = cursor.started or now
+    has_more = len(rows) == PAGE_ROWS
+    if has_more:
+        last = rows[-1]
+        next_cursor = SyncCursor(cursor.since, started, (str(last[column]), str(last['id'])))
+    else:
+        next_cursor = SyncCursor(since=started - OVERLAP)
+
+    return {'changed': rows, 'deleted': deleted, 'cursor': next_cursor.encode(), 'has_more': has_more}
+
+
+def sync_response(request: Request, page: dict, model: Type[BaseModel]) -> Response:
+    """A page of changes as JSON, or with `changed` as a column table for MessagePack clients"""
+    if wants_msgpack(request):
+        content = pack({**page, 'changed': column_table(page['changed'], model)})
+        media_type = MSGPACK
+    else:
+        content = SyncChanges[model].model_validate(page).model_dump_json()
+        media_type = "application/json"
+    return Response(content=content, media_type=media_type, headers={"Vary": "Accept", "Cache-Control": "no-store"})
+
+
+async def purge_tombstones() -> int:
+    """Delete tombstones older than the retention; returns how many"""
+    response = await execute(supabase.rpc('purge_sync_tombstones', {'p_days': settings.SYNC_TOMBSTONE_DAYS}))
+    return response.data or 0
+
+
+async def maintain() -> None:
+    """Purge expired tombstones daily (run as a background task)"""
+    while True:
+        try:
+            purged = await purge_tombstones()
+            if purged:
+                logger.info("Purged {} sync tombstones", purged)
+        except Exception as e:
+            logger.error("Failed to purge sync tombstones: {}", e)
+        await asyncio.sleep(MAINTENANCE_SECONDS)
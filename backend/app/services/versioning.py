@@ -0,0 +1,84 @@
+"""
+Per-user data versions and ETags
+
+Every (user, resource) pair carries a counter bumped on each write, so list
+and detail endpoints can derive an ETag without querying the database and
+answer If-None-Match with 304 when nothing changed.
+"""
+
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.services.changes import Change, subscribe, subscribe_reset, MEDICATIONS, APPOINTMENTS, HEALTH_METRICS
+from app.services.serialization import wants_msgpack
+
+
+class DataVersions:
+    """Monotonic per-user resource versions (scoped to this process via `epoch`)"""
+
+    def __init__(self):
+        # Counters restart with the process, so ETags include a per-process epoch
+        self.epoch = os.urandom(6).hex()
+        self._versions: Dict[Tuple[str, str], int] = {}
+
+    def get(self, user_id: str, resource: str) -> int:
+        return self._versions.get((user_id, resource), 0)
+
+    def bump(self, user_id: str, resource: str) -> int:
+        version = self._versions.get((user_id, resource), 0) + 1
+        self._versions[(user_id, resource)] = version
+        return version
+
+    def etag(self, user_id: str, resource: str, *variant) -> str:
+        """Weak ETag for a user's resource representation (variant = query parameters, ids, ...)"""
+        key = f"{self.epoch}:{user_id}:{resource}:{self.get(user_id, resource)}:{variant!r}"
+        return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+
+data_versions = DataVersions()
+
+
+def _bump_on_change(change: Change) -> None:
+    data_versions.bump(change.user_id, change.resource)
+
+
+for _resource in (MEDICATIONS, APPOINTMENTS, HEALTH_METRICS):
+    subscribe(_resource, _bump_on_change)
+subscribe_reset(data_versions.bump)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    user_id: str,
+    resource: str,
+    *variant
+) -> Optional[Response]:
+    """
+    Compute the ETag for a read and return a 304 response if the client's copy is current
+
+    Must be called before querying, so a write racing the query only makes
+    the next ETag differ. Otherwise sets ETag on `response` and returns None.
+    JSON and MessagePack representations get different ETags.
+    """
+    etag = data_versions.etag(user_id, resource, wants_msgpack(request), *variant)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,3 @@
+"""
+Performance benchmarks (run as scripts: python -m benchmarks.<name>)
+"""
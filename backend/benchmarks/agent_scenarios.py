@@ -0,0 +1,180 @@
+"""
+Scenarios for the medical agent evaluation (benchmarks.eval_agent)
+
+Each scenario is one user message and the rows the user has when it is
+sent. `script` is what a well-behaved model does with it: the tool calls of
+each turn, then the final answer. It is only used to record a cassette
+without a live model (--record --scripted); live recordings take whatever
+the model does.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, List, Tuple, Union
+
+Tables = Dict[str, List[dict]]
+# A turn: the tool calls the model makes, or its final answer
+Turn = Union[List[Tuple[str, dict]], str]
+
+
+@dataclass
+class Scenario:
+    name: str
+    prompt: str
+    tables: Callable[[str], Tables]
+    script: List[Turn] = field(default_factory=list)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _medication_id(user_id: str, name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"eval/{user_id}/{name}"))
+
+
+def _medication(user_id: str, name: str, dosage: str, frequency: str, started_days_ago: int, notes: str = "") -> dict:
+    start = date.today() - timedelta(days=started_days_ago)
+    return {
+        'id': _medication_id(user_id, name), 'user_id': user_id, 'name': name, 'dosage': dosage, 'frequency': frequency,
+        'start_date': start.isoformat(), 'end_date': None, 'notes': notes or None, 'active': True,
+        'created_at': datetime.combine(start, time(8), timezone.utc).isoformat(),
+    }
+
+
+def _appointment(user_id: str, doctor: str, specialty: str, days_ahead: int, notes: str = "", status: str = "scheduled") -> dict:
+    when = datetime.combine(date.today() + timedelta(days=days_ahead), time(9, 30), timezone.utc)
+    return {
+        'user_id': user_id, 'doctor_name': doctor, 'specialty': specialty, 'date_time': when.isoformat(),
+        'location': "City Clinic", 'notes': notes or None, 'status': status,
+    }
+
+
+def _readings(user_id: str, metric_type: str, unit: str, values: List[str], notes: Dict[int, str] = None) -> List[dict]:
+    # One reading a day, the last one yesterday
+    start = _now() - timedelta(days=len(values))
+    return [
+        {
+            'user_id': user_id, 'metric_type': metric_type, 'value': value, 'unit': unit,
+            'notes': (notes or {}).get(i), 'recorded_at': (start + timedelta(days=i)).isoformat(),
+        }
+        for i, value in enumerate(values)
+    ]
+
+
+def _user(user_id: str) -> dict:
+    return {'id': user_id, 'email': "eval@example.com", 'full_name': "Sam Eval"}
+
+
+def _warfarin_user(user_id: str) -> Tables:
+    return {
+        'users': [_user(user_id)],
+        'medications': [
+            _medication(user_id, "Warfarin", "5mg", "once daily", 120, "INR checked monthly"),
+            _medication(user_id, "Lisinopril", "10mg", "once daily", 60),
+            _medication(user_id, "Metformin", "500mg", "twice daily", 30, "Take with meals"),
+        ],
+    }
+
+
+def _cardiology_user(user_id: str) -> Tables:
+    return {
+        'users': [_user(user_id)],
+        'medications': [_medication(user_id, "Lisinopril", "10mg", "once daily", 60)],
+        'appointments': [
+            _appointment(user_id, "Dr. Patel", "Cardiology", -14,
+                         "Walk 30 minutes a day; avoid heavy lifting until the next echo", status="completed"),
+            _appointment(user_id, "Dr. Chen", "General Practice", 5, "Annual check-up"),
+        ],
+        'health_metrics': _readings(
+            user_id, "blood_pressure", "mmHg",
+            ["138/88", "135/86", "141/90", "132/84", "136/87", "139/89", "134/85"],
+            notes={2: "Felt dizzy after climbing stairs"},
+        ),
+    }
+
+
+def _next_weekday(weekday: int, hour: int) -> str:
+    day = date.today() + timedelta(days=(weekday - date.today().weekday() - 1) % 7 + 1)
+    return datetime.combine(day, time(hour), timezone.utc).isoformat()
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(
+        name="list_medications",
+        prompt="What medications am I taking at the moment?",
+        tables=_warfarin_user,
+        script=[
+            [("get_medications", {})],
+            "You're currently taking Warfarin 5mg once daily, Lisinopril 10mg once daily and Metformin 500mg "
+            "twice daily with meals. This is for information only; talk to your doctor before changing anything.",
+        ],
+    ),
+    Scenario(
+        name="add_interacting_medication",
+        prompt="My dentist prescribed ibuprofen 400mg three times a day starting today. Please add it.",
+        tables=_warfarin_user,
+        script=[
+            [("add_medication", {
+                'name': "Ibuprofen", 'dosage': "400mg", 'frequency': "three times daily",
+                'start_date': date.today().isoformat(), 'notes': "Prescribed by dentist",
+            })],
+            "I've added ibuprofen 400mg three times daily. Important: ibuprofen can increase the risk of serious "
+            "bleeding when taken with warfarin. Please confirm with your doctor or pharmacist before taking it.",
+        ],
+    ),
+    Scenario(
+        name="log_blood_pressure",
+        prompt="My blood pressure this morning was 165/102.",
+        tables=_cardiology_user,
+        script=[
+            [("log_health_metric", {'metric_type': "blood_pressure", 'value': "165/102", 'unit': "mmHg", 'notes': ""})],
+            "I've logged your blood pressure of 165/102 mmHg. That is high and above your usual readings; "
+            "please contact your doctor promptly, or emergency services if you feel unwell.",
+        ],
+    ),
+    Scenario(
+        name="medication_adherence",
+        prompt="How well have I been taking my lisinopril over the last month?",
+        tables=_warfarin_user,
+        script=[
+            [("get_medication_adherence", {'medication_name': "lisinopril", 'days': 30})],
+            "Here is your lisinopril adherence over the last 30 days. Keep taking it as prescribed, and ask "
+            "your doctor or pharmacist if you have trouble remembering doses.",
+        ],
+    ),
+    Scenario(
+        name="cardiologist_advice",
+        prompt="What did the cardiologist tell me about exercise?",
+        tables=_cardiology_user,
+        script=[
+            [("search_notes", {'query': "cardiologist advice about exercise", 'limit': 5})],
+            "At your cardiology visit Dr. Patel advised walking 30 minutes a day and avoiding heavy lifting "
+            "until your next echo. Check with your cardiologist before starting anything more strenuous.",
+        ],
+    ),
+    Scenario(
+        name="schedule_follow_up",
+        prompt="Book me a follow-up with Dr. Patel in cardiology next Tuesday at 10am at City Clinic.",
+        tables=_cardiology_user,
+        script=[
+            [("get_appointments", {})],
+            [("schedule_appointment", {
+                'doctor_name': "Dr. Patel", 'specialty': "Cardiology", 'date_time': _next_weekday(1, 10),
+                'location': "City Clinic", 'notes': "Follow-up",
+            })],
+            "Your follow-up with Dr. Patel (Cardiology) is booked for next Tuesday at 10am at City Clinic.",
+        ],
+    ),
+    Scenario(
+        name="blood_pressure_trend",
+        prompt="Has my blood pressure been going up this week? Anything I should worry about?",
+        tables=_cardiology_user,
+        script=[
+            [("get_health_trends", {'metric_type': "blood_pressure", 'days': 7}), ("get_health_alerts", {'include_acknowledged': False, 'limit': 20})],
+            "Your blood pressure has been fairly steady this week, between 132/84 and 141/90, with no alerts. "
+            "You noted feeling dizzy after climbing stairs once; mention that to your doctor.",
+        ],
+    ),
+]
@@ -0,0 +1,69 @@
+"""
+Appointment interval index benchmark
+
+Builds indexes for users holding thousands of appointments and compares
+double-booking checks and free-slot queries against a linear scan.
+
+    python -m benchmarks.bench_appointment_index [--users 100] [--appointments 5000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.services.appointment_index import UserAppointmentIndex
+
+DURATION = timedelta(minutes=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    origin = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    users = []
+
+    started = time.perf_counter()
+    for user in range(args.users):
+        index = UserAppointmentIndex(DURATION)
+        starts = rng.sample(range(args.appointments * 4), args.appointments)
+        for slot in starts:
+            index.add(f"appt-{user}-{slot}", origin + slot * DURATION)
+        users.append((index, [origin + slot * DURATION for slot in starts]))
+    build_seconds = time.perf_counter() - started
+    print(f"build: {args.users} users x {args.appointments:,} appointments in {build_seconds:.2f}s")
+
+    probes = [
+        (rng.randrange(args.users), origin + timedelta(minutes=rng.randrange(args.appointments * 4 * 30)))
+        for _ in range(args.queries)
+    ]
+
+    started = time.perf_counter()
+    indexed_conflicts = sum(users[user][0].conflict(moment) is not None for user, moment in probes)
+    indexed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned_conflicts = sum(
+        any(abs(start - moment) < DURATION for start in users[user][1]) for user, moment in probes
+    )
+    scan_seconds = time.perf_counter() - started
+
+    assert indexed_conflicts == scanned_conflicts
+    print(f"conflict check: index {indexed_seconds / args.queries * 1e6:.2f} us/query, "
+          f"scan {scan_seconds / args.queries * 1e6:.2f} us/query ({indexed_conflicts:,} conflicts)")
+
+    started = time.perf_counter()
+    slots = 0
+    for user, moment in probes:
+        slots += len(users[user][0].free_slots(moment, moment + timedelta(days=1)))
+    slots_seconds = time.perf_counter() - started
+    print(f"free slots (1-day window): {slots_seconds / args.queries * 1e6:.2f} us/query ({slots:,} slots)")
+
+
+if __name__ == "__main__":
+    main()
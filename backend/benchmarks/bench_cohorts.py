@@ -0,0 +1,97 @@
+"""
+Cohort analytics benchmark
+
+Streams synthetic systolic readings (100M by default, a year of data from
+50k patients) in columnar chunks through WeeklyHistogram and PatientMeans,
+the vectorized aggregation used for cohort views, and reports throughput
+with data generation timed separately. Then checks the histogram
+percentiles against exact ones (np.percentile, which sorts) on the last
+chunk, and times both.
+
+    python -m benchmarks.bench_cohorts [--readings 100000000] [--patients 50000] [--chunk 5000000]
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.cohorts import BINS, QUANTILES, PatientMeans, WeeklyHistogram
+
+START = datetime(2025, 1, 6, tzinfo=timezone.utc)
+END = datetime(2026, 1, 5, tzinfo=timezone.utc)
+
+
+def chunk(rng: np.random.Generator, size: int, bias: np.ndarray):
+    """Patient numbers, UTC times and systolic values of `size` readings"""
+    patients = rng.integers(0, len(bias), size, dtype=np.int64)
+    seconds = rng.integers(0, int((END - START).total_seconds()), size)
+    recorded_at = np.datetime64(START.replace(tzinfo=None), "s") + seconds.astype("timedelta64[s]")
+    values = bias[patients] + rng.normal(0, 12, size)
+    return patients, recorded_at, values
+
+
+def run(readings: int, patients: int, chunk_size: int) -> None:
+    rng = np.random.default_rng(42)
+    bias = rng.normal(128, 14, patients)
+    histogram = WeeklyHistogram(BINS["systolic"], START, END)
+    means = PatientMeans()
+
+    generating = aggregating = 0.0
+    done = 0
+    while done < readings:
+        size = min(chunk_size, readings - done)
+        started = time.perf_counter()
+        patient_numbers, recorded_at, values = chunk(rng, size, bias)
+        generating += time.perf_counter() - started
+
+        started = time.perf_counter()
+        histogram.add(recorded_at, values)
+        means.add(patient_numbers, values)
+        aggregating += time.perf_counter() - started
+        done += size
+
+    started = time.perf_counter()
+    weeks = histogram.weeks()
+    share = means.share(140)
+    finishing = time.perf_counter() - started
+
+    print(f"{done:,} readings in chunks of {chunk_size:,} ({len(weeks)} weeks, {share['patients']:,} patients)")
+    print(f"generate data      {generating:7.2f}s  (not part of the aggregation)")
+    print(f"aggregate          {aggregating:7.2f}s  {done / aggregating / 1e6:6.1f}M readings/s")
+    print(f"percentiles+share  {finishing * 1000:7.1f}ms")
+    print(f"patients with mean systolic >= 140: {share['patients_above'] / share['patients']:.1%}")
+
+    # Accuracy and cost against exact, sort-based percentiles on one chunk
+    exact_histogram = WeeklyHistogram(BINS["systolic"], START, END)
+    exact_histogram.add(recorded_at, values)
+    started = time.perf_counter()
+    approximate = exact_histogram.percentiles()[np.flatnonzero(exact_histogram.counts.sum(axis=1))]
+    histogram_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    week_of = (recorded_at - np.datetime64(START.replace(tzinfo=None), "s")).astype("timedelta64[D]").astype(np.int64) // 7
+    order = np.argsort(week_of, kind="stable")
+    bounds = np.searchsorted(week_of[order], np.arange(week_of.max() + 2))
+    exact = np.array([
+        np.percentile(values[order[bounds[w]:bounds[w + 1]]], [q * 100 for q in QUANTILES])
+        for w in range(len(bounds) - 1) if bounds[w + 1] > bounds[w]
+    ])
+    exact_time = time.perf_counter() - started
+
+    print(f"last chunk: histogram percentiles {histogram_time * 1000:.1f}ms, exact (sorting) {exact_time * 1000:.0f}ms, "
+          f"max difference {np.abs(approximate - exact).max():.2f} mmHg")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=100_000_000)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--chunk", type=int, default=5_000_000)
+    args = parser.parse_args()
+    run(args.readings, args.patients, args.chunk)
+
+
+if __name__ == "__main__":
+    main()
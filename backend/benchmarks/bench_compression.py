@@ -0,0 +1,81 @@
+"""
+Response compression benchmark
+
+Sends a 10k-row health metric list (JSON and MessagePack, as the list
+endpoint does) through CompressionMiddleware and reports, per available
+encoding, the compressed size and the time per response when every
+request compresses the body and when the compressed body is reused from
+the cache (the same ETag'd list fetched again).
+
+    python -m benchmarks.bench_compression [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.models.health_metric import HealthMetric
+from app.services.columnar import pack
+from app.services.compression import ENCODERS, CompressedCache, CompressionMiddleware
+from app.services.serialization import column_table, dump_list
+from benchmarks.bench_sync_format import metric_rows
+
+
+def list_app(body: bytes, media_type: str):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", media_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"etag", b'W/"bench"'),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+    return app
+
+
+async def fetch(middleware, encoding: str) -> int:
+    size = 0
+
+    async def send(message):
+        nonlocal size
+        size += len(message.get("body", b""))
+
+    await middleware({"type": "http", "method": "GET", "headers": [(b"accept-encoding", encoding.encode())]}, None, send)
+    return size
+
+
+async def run(rows: int, repeat: int) -> None:
+    metrics = metric_rows(rows)
+    for label, body, media_type in (
+        ("JSON", dump_list(metrics, HealthMetric), "application/json"),
+        ("MessagePack", pack(column_table(metrics, HealthMetric)), "application/msgpack"),
+    ):
+        print(f"{label} list, {len(body) / 1024:.1f} KiB")
+        for encoding in ENCODERS:
+            timings = {}
+            for cached in (False, True):
+                # A cache with no room never keeps a body
+                cache = CompressedCache(64 * 1024 * 1024 if cached else 0)
+                middleware = CompressionMiddleware(list_app(body, media_type), cache=cache)
+                size = await fetch(middleware, encoding)
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    await fetch(middleware, encoding)
+                timings[cached] = (time.perf_counter() - started) / repeat
+            print(f"  {encoding:<5} {size / 1024:8.1f} KiB, compressing {timings[False] * 1000:6.2f} ms, "
+                  f"from cache {timings[True] * 1000:6.2f} ms per response")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
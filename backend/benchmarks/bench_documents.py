@@ -0,0 +1,161 @@
+"""
+Document upload and download benchmark
+
+Streams a multi-hundred-megabyte multipart body through receive_upload (no
+network or database) and compares throughput and peak memory growth with
+buffering the whole body first. Then serves the stored file through
+FileRangeResponse with the chunked fallback, with the zero-copy
+`http.response.zerocopysend` extension (sendfile into a socket, as a server
+implementing it would do), and for a 1 MB range. Downloads go into a local
+socket drained by a reader thread.
+
+    python -m benchmarks.bench_documents [--size-mb 512] [--chunk-kb 64]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from starlette.requests import Request
+
+from app.services.documents import DocumentStore, receive_upload
+from app.services.files import FileRangeResponse
+
+BOUNDARY = b"benchboundary"
+
+
+def multipart_chunks(size: int, chunk: int):
+    """A multipart body with one file part of `size` bytes, in `chunk`-byte pieces"""
+    yield (
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="scan.pdf"\r\n'
+        b"Content-Type: application/pdf\r\n\r\n"
+    )
+    block = os.urandom(chunk)
+    sent = 0
+    while sent < size:
+        piece = block[:min(chunk, size - sent)]
+        sent += len(piece)
+        yield piece
+    yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+def upload_request(size: int, chunk: int) -> Request:
+    chunks = multipart_chunks(size, chunk)
+
+    async def receive():
+        piece = next(chunks, None)
+        if piece is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": piece, "more_body": True}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)],
+    }
+    return Request(scope, receive)
+
+
+def max_rss() -> int:
+    """Peak resident memory of the process so far, in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def report(label: str, size: int, elapsed: float, growth: int = None) -> None:
+    line = f"{label:<34} {elapsed:7.2f}s  {size / elapsed / 1e6:8.0f} MB/s"
+    if growth is not None:
+        line += f"  peak RSS +{growth / 1e6:.1f} MB"
+    print(line)
+
+
+async def measure_upload(store: DocumentStore, size: int, chunk: int) -> str:
+    baseline = max_rss()
+    started = time.perf_counter()
+    upload = await receive_upload(upload_request(size, chunk), store, max_bytes=size)
+    await store.place(upload.writer, upload.sha256)
+    elapsed = time.perf_counter() - started
+    report("streamed upload", size, elapsed, max_rss() - baseline)
+    return upload.sha256
+
+
+async def measure_buffered_upload(directory: str, size: int, chunk: int) -> None:
+    # Runs after the streamed upload, so its growth is measured from that peak
+    baseline = max_rss()
+    started = time.perf_counter()
+    body = await upload_request(size, chunk).body()
+    with open(os.path.join(directory, "buffered"), "wb") as f:
+        f.write(body)
+    elapsed = time.perf_counter() - started
+    del body
+    report("buffered upload (request.body())", size, elapsed, max_rss() - baseline)
+
+
+def drain(sock: socket.socket) -> None:
+    buffer = bytearray(1024 * 1024)
+    while sock.recv_into(buffer):
+        pass
+
+
+async def measure_download(label: str, path: str, size: int, range_header: str = None, zero_copy: bool = False) -> None:
+    server, client = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(client,))
+    reader.start()
+    sent = 0
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            server.sendall(message["body"])
+            sent += len(message["body"])
+        elif message["type"] == "http.response.zerocopysend":
+            offset, remaining = message["offset"], message["count"]
+            while remaining:
+                written = os.sendfile(server.fileno(), message["file"].fileno(), offset, remaining)
+                offset += written
+                remaining -= written
+                sent += written
+
+    headers = {"range": range_header} if range_header else {}
+    scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}} if zero_copy else {}}
+    started = time.perf_counter()
+    await FileRangeResponse(path, size, "application/pdf", headers)(scope, None, send)
+    elapsed = time.perf_counter() - started
+    server.close()
+    reader.join()
+    client.close()
+    report(label, sent, elapsed)
+
+
+async def run(size: int, chunk: int) -> None:
+    directory = tempfile.mkdtemp(prefix="bench-documents-")
+    try:
+        store = DocumentStore(directory)
+        sha256 = await measure_upload(store, size, chunk)
+        await measure_buffered_upload(directory, size, chunk)
+
+        path = str(store.path(sha256))
+        await measure_download("download, chunked pread", path, size)
+        await measure_download("download, zerocopysend", path, size, zero_copy=True)
+        await measure_download("1 MB range, chunked pread", path, size, f"bytes={size // 2}-{size // 2 + 2**20 - 1}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--chunk-kb", type=int, default=64, help="request body chunk size (uvicorn reads 64 KB)")
+    args = parser.parse_args()
+    asyncio.run(run(args.size_mb * 1024 * 1024, args.chunk_kb * 1024))
+
+
+if __name__ == "__main__":
+    main()
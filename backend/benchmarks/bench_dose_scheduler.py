@@ -0,0 +1,74 @@
+"""
+Dose scheduler benchmark
+
+Loads 1M active medication schedules into the heap scheduler and drains one
+simulated day of due doses, compared with re-scanning every schedule.
+
+    python -m benchmarks.bench_dose_scheduler [--schedules 1000000]
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from app.services.dose_scheduler import DoseScheduler, parse_frequency
+
+FREQUENCIES = [
+    "once daily", "twice daily", "three times a day", "four times daily",
+    "every 8 hours", "every 12 hours", "every other day", "weekly", "at bedtime", "BID",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--schedules", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    now = datetime(2026, 1, 1, 0, 0)
+    medications = [
+        {
+            'id': f"med-{i}",
+            'user_id': f"user-{rng.randrange(args.users)}",
+            'name': f"Drug {i % 500}",
+            'dosage': "10mg",
+            'frequency': rng.choice(FREQUENCIES),
+            'start_date': date(2025, 12, 1) + timedelta(days=rng.randrange(30)),
+            'active': True,
+        }
+        for i in range(args.schedules)
+    ]
+
+    scheduler = DoseScheduler()
+    started = time.perf_counter()
+    for medication in medications:
+        scheduler.schedule(medication, now)
+    load_seconds = time.perf_counter() - started
+    print(f"load: {len(scheduler):,} schedules in {load_seconds:.2f}s "
+          f"({load_seconds / len(scheduler) * 1e6:.2f} us/schedule)")
+
+    emitted = 0
+    started = time.perf_counter()
+    for minute in range(0, 24 * 60, 5):
+        emitted += len(scheduler.pop_due(now + timedelta(minutes=minute)))
+    drain_seconds = time.perf_counter() - started
+    print(f"heap: {emitted:,} due doses over one day in {drain_seconds:.2f}s "
+          f"({drain_seconds / max(emitted, 1) * 1e6:.2f} us/dose)")
+
+    started = time.perf_counter()
+    tick = now + timedelta(hours=8)
+    due_now = 0
+    for medication in medications:
+        schedule = parse_frequency(medication['frequency'])
+        due = schedule.next_after(tick - timedelta(minutes=5), medication['start_date'])
+        if due is not None and due <= tick:
+            due_now += 1
+    scan_seconds = time.perf_counter() - started
+    print(f"scan: one 5-minute tick re-checking every schedule took {scan_seconds:.2f}s "
+          f"({due_now:,} due), i.e. {scan_seconds * 288:.0f}s per simulated day")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Import-time budget check
+
+Imports `main` in a fresh interpreter under `python -X importtime`, reports
+the slowest imports and fails (exit status 1) when the total exceeds the
+budget or when a module that must stay lazy was imported eagerly.
+
+    python -m benchmarks.bench_import_time [--budget-ms 1000] [--top 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Created on first use through the FastAPI lifespan, never at import time
+LAZY_MODULES = ("supabase", "pydantic_ai", "groq", "openai")
+
+
+def measure() -> List[Tuple[int, int, str]]:
+    """(cumulative_us, depth, module) for every import made by `import main`"""
+    env = {key: value for key, value in os.environ.items() if key not in ("SUPABASE_URL", "SUPABASE_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"`import main` failed without credentials:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((int(cumulative), depth, name.strip()))
+    return imports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    imports = measure()
+    total_ms = next(cumulative for cumulative, _, name in imports if name == "main") / 1000
+
+    print(f"{'cumulative':>12}  module")
+    for cumulative, depth, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f}ms  {'  ' * depth}{name}")
+
+    eager = sorted({name for _, _, name in imports if name.split(".")[0] in LAZY_MODULES})
+    failed = False
+    if eager:
+        print(f"FAIL: lazily-loaded modules imported at startup: {', '.join(eager[:10])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import main took {total_ms:.0f}ms, budget {args.budget_ms:.0f}ms")
+        failed = True
+    if not failed:
+        print(f"OK: import main took {total_ms:.0f}ms (budget {args.budget_ms:.0f}ms)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
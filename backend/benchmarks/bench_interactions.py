@@ -0,0 +1,81 @@
+"""
+Drug interaction index benchmark
+
+Compiles a synthetic interaction table (by default 20,000 drugs with two
+synonyms each and 1,000,000 interacting pairs), then checks new drugs against
+users' active medication lists with the pair index and with a scan of the
+interaction table.
+
+    python -m benchmarks.bench_interactions [--drugs 20000] [--pairs 1000000] [--active 12]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.interactions import InteractionIndex
+
+SEVERITIES = ["contraindicated", "major", "moderate", "minor"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drugs", type=int, default=20000)
+    parser.add_argument("--pairs", type=int, default=1000000)
+    parser.add_argument("--active", type=int, default=12)
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--scan-checks", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    drugs = {f"drug{i}": [f"brand{i}", f"brand{i} forte"] for i in range(args.drugs)}
+    names = list(drugs)
+    interactions = []
+    seen = set()
+    while len(interactions) < args.pairs:
+        first, second = rng.sample(range(args.drugs), 2)
+        key = (min(first, second), max(first, second))
+        if key in seen:
+            continue
+        seen.add(key)
+        interactions.append({
+            "drugs": [names[first], names[second]],
+            "severity": rng.choice(SEVERITIES),
+            "description": "Synthetic interaction.",
+        })
+    del seen
+
+    started = time.perf_counter()
+    index = InteractionIndex(drugs, interactions)
+    print(f"compile: {args.drugs:,} drugs, {len(index):,} pairs in {time.perf_counter() - started:.2f}s")
+
+    def medications():
+        return [
+            {'id': str(n), 'name': f"{rng.choice(['drug', 'brand'])}{rng.randrange(args.drugs)} 10mg tablets"}
+            for n in range(args.active)
+        ]
+
+    checks = [(f"Brand{rng.randrange(args.drugs)} Forte 500 mg", medications()) for _ in range(args.checks)]
+
+    started = time.perf_counter()
+    found = sum(len(index.check(name, active)) for name, active in checks)
+    indexed = (time.perf_counter() - started) / args.checks
+    print(f"indexed check vs {args.active} active medications: {indexed * 1e6:.1f} us/check ({found:,} warnings)")
+
+    # Baseline: scan the interaction table for every pair (resolving names the same way)
+    started = time.perf_counter()
+    scanned = 0
+    for name, active in checks[:args.scan_checks]:
+        new = {index.drug_names[i] for i in index.resolve(name)}
+        existing = {index.drug_names[i] for medication in active for i in index.resolve(medication['name'])}
+        scanned += sum(
+            1 for entry in interactions
+            if (entry["drugs"][0] in new and entry["drugs"][1] in existing)
+            or (entry["drugs"][1] in new and entry["drugs"][0] in existing)
+        )
+    scan = (time.perf_counter() - started) / args.scan_checks
+    print(f"table scan: {scan * 1e6:.1f} us/check ({scan / indexed:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
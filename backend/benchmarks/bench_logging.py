@@ -0,0 +1,87 @@
+"""
+Logging overhead benchmark
+
+Measures the time a log call spends in the calling thread with a slow sink
+(simulating a stdout pipe that blocks): written synchronously, through
+loguru's `enqueue=True` and through the application's BackgroundSink. Also
+compares disabled debug lines written as f-strings with loguru's lazy brace
+style.
+
+    python -m benchmarks.bench_logging [--calls 2000] [--sink-delay-us 200]
+"""
+
+import argparse
+import io
+import statistics
+import time
+
+from loguru import logger
+
+from app.services.logs import BackgroundSink
+
+
+def slow_sink(delay: float):
+    def sink(message) -> None:
+        # Blocking I/O releases the GIL, like a write to a full pipe
+        time.sleep(delay)
+    return sink
+
+
+def slow_render(delay: float):
+    def render(message) -> str:
+        time.sleep(delay)
+        return str(message)
+    return render
+
+
+def time_calls(calls: int, log, gap: float = 0.0) -> list:
+    """Per-call latency; `gap` is the (untimed) request work between log calls"""
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        log(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+        if gap:
+            time.sleep(gap)
+    return samples
+
+
+def report(label: str, samples: list) -> None:
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<34} mean {statistics.fmean(samples):8.2f}us  p99 {p99:8.2f}us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--sink-delay-us", type=float, default=200)
+    args = parser.parse_args()
+    delay = args.sink_delay_us / 1e6
+    # Requests arrive a little slower than the sink drains, as under steady load
+    gap = delay * 2
+    payload = {"user_id": "0f8e7c52", "items": list(range(20))}
+
+    logger.remove()
+    logger.add(slow_sink(delay), format="{message}", level="INFO")
+    report("synchronous sink", time_calls(args.calls, lambda i: logger.info("request {} {}", i, payload), gap))
+
+    logger.remove()
+    logger.add(slow_sink(delay), format="{message}", level="INFO", enqueue=True)
+    report("loguru enqueue=True", time_calls(args.calls, lambda i: logger.info("request {} {}", i, payload), gap))
+    logger.complete()
+
+    logger.remove()
+    sink = BackgroundSink(render=slow_render(delay), stream=io.StringIO())
+    logger.add(sink, format="{message}", level="INFO")
+    report("BackgroundSink", time_calls(args.calls, lambda i: logger.info("request {} {}", i, payload), gap))
+    sink.stop()
+
+    # Debug is below the sink level: lazy formatting skips all the work
+    report("disabled debug, f-string", time_calls(args.calls * 10, lambda i: logger.debug(f"request {i} {payload}")))
+    report("disabled debug, brace args", time_calls(args.calls * 10, lambda i: logger.debug("request {} {}", i, payload)))
+    logger.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Notes retrieval index benchmark
+
+Builds one user's index from thousands of generated notes (no database),
+then measures index build time, memory held by the vectors, query latency
+of the cosine scan, and the cost of the incremental update made when a
+note is edited.
+
+    python -m benchmarks.bench_notes [--notes 5000] [--queries 200]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.notes_index import Note, UserNotesIndex
+
+WORDS = """
+headache nausea dizziness fatigue cough rash swelling fever insomnia anxiety stomach pain knee back
+chest shortness breath blood pressure sugar dose morning evening food water meal skip missed refill
+pharmacy doctor cardiologist dermatologist exercise walking diet salt alcohol sleep tired better worse
+improved cream tablet capsule injection side effect allergy itching weight heart rate follow up test
+""".split()
+
+
+def note_text(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(1, 4)):
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def run(notes: int, queries: int) -> None:
+    rng = random.Random(7)
+    texts = [note_text(rng) for _ in range(notes)]
+
+    index = UserNotesIndex()
+    started = time.perf_counter()
+    for i, text in enumerate(texts):
+        index.add(Note("medication", str(i), f"med {i}", text, None))
+    index.search("warm up")
+    elapsed = time.perf_counter() - started
+    print(f"build {notes} notes: {elapsed * 1000:.0f} ms ({elapsed / notes * 1e6:.0f} µs/note), "
+          f"vectors {index._vectors.nbytes / 1e6:.1f} MB")
+
+    query_texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) for _ in range(queries)]
+    started = time.perf_counter()
+    for query in query_texts:
+        index.search(query)
+    elapsed = time.perf_counter() - started
+    print(f"search: {elapsed / queries * 1000:.2f} ms/query")
+
+    # An edit replaces one row and invalidates the IDF weights, so the next search recomputes them
+    started = time.perf_counter()
+    for i in range(queries):
+        index.add(Note("medication", str(i), f"med {i}", note_text(rng), None))
+        index.search(query_texts[i])
+    elapsed = time.perf_counter() - started
+    print(f"edit then search: {elapsed / queries * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.notes, args.queries)
+
+
+if __name__ == "__main__":
+    main()
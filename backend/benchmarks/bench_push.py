@@ -0,0 +1,73 @@
+"""
+WebSocket push fan-out benchmark
+
+Registers many idle connections with fake sockets (no network), then
+measures the memory held per idle connection, the time to fan a heartbeat
+out to all of them, and the cost of publishing a change to one user among
+many.
+
+    python -m benchmarks.bench_push [--connections 20000] [--per-user 2]
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app.services.push import ConnectionManager
+
+
+class FakeWebSocket:
+    __slots__ = ()
+    sent = 0
+
+    async def send_text(self, message: str) -> None:
+        FakeWebSocket.sent += 1
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def run(connections: int, per_user: int) -> None:
+    manager = ConnectionManager(max_queue=64, heartbeat_seconds=0)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(connections):
+        manager.connect(FakeWebSocket(), f"user-{i // per_user}")
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f"{connections} idle connections: {held / connections:.0f} bytes each, "
+          f"{len(asyncio.all_tasks()) - 1} sender tasks")
+
+    # One heartbeat round, until every socket has received it
+    heartbeat = asyncio.create_task(manager.heartbeat())
+    started = time.perf_counter()
+    while FakeWebSocket.sent < connections:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    heartbeat.cancel()
+    print(f"heartbeat fan-out: {elapsed * 1000:.1f}ms ({elapsed / connections * 1e6:.2f}us per connection)")
+    await asyncio.sleep(0)
+    print(f"sender tasks after draining: {len(asyncio.all_tasks()) - 1}")
+
+    rounds = 10000
+    started = time.perf_counter()
+    for i in range(rounds):
+        manager.publish(f"user-{i % (connections // per_user)}", {"type": "change", "resource": "health_metrics", "id": str(i)})
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    print(f"publish to one user: {elapsed / rounds * 1e6:.2f}us per event")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=20000)
+    parser.add_argument("--per-user", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(run(args.connections, args.per_user))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Search index benchmark
+
+Indexes one user with thousands of medications, appointments and noted
+health metrics, then times typo-tolerant queries against the trigram index.
+
+    python -m benchmarks.bench_search [--records 5000] [--queries 2000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.services.search_index import (
+    UserSearchIndex,
+    appointment_document,
+    health_metric_document,
+    medication_document,
+)
+
+DRUGS = ["metformin", "lisinopril", "atorvastatin", "amlodipine", "omeprazole", "levothyroxine",
+         "albuterol", "gabapentin", "sertraline", "warfarin", "ibuprofen", "prednisone"]
+SPECIALTIES = ["Cardiology", "Dermatology", "Neurology", "Oncology", "Orthopedics", "Pediatrics"]
+DOCTORS = ["Alvarez", "Nguyen", "Smith", "Okafor", "Kowalski", "Haddad", "Tanaka", "Moreau"]
+PLACES = ["St Mary Hospital", "Downtown Clinic", "Riverside Medical Center", "North Health Centre"]
+NOTES = ["bring previous results", "fasting required", "felt dizzy after lunch", "follow up on scan",
+         "headache in the morning", "after morning run", "renew prescription"]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    position = rng.randrange(len(word))
+    return word[:position] + word[position + 1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    origin = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    documents = []
+    for i in range(args.records):
+        when = (origin + timedelta(hours=i)).isoformat()
+        choice = i % 3
+        if choice == 0:
+            documents.append(medication_document({
+                'id': f"m{i}", 'name': f"{rng.choice(DRUGS)} {i}", 'dosage': "10mg", 'frequency': "daily",
+                'notes': rng.choice(NOTES), 'created_at': when,
+            }))
+        elif choice == 1:
+            documents.append(appointment_document({
+                'id': f"a{i}", 'doctor_name': f"Dr. {rng.choice(DOCTORS)}", 'specialty': rng.choice(SPECIALTIES),
+                'location': rng.choice(PLACES), 'notes': rng.choice(NOTES), 'date_time': when,
+            }))
+        else:
+            documents.append(health_metric_document({
+                'id': f"h{i}", 'metric_type': "blood_pressure", 'value': "120/80", 'unit': "mmHg",
+                'notes': rng.choice(NOTES), 'recorded_at': when,
+            }))
+
+    index = UserSearchIndex()
+    started = time.perf_counter()
+    for document in documents:
+        index.add(document)
+    build_seconds = time.perf_counter() - started
+    print(f"build: {len(index):,} records in {build_seconds * 1000:.0f}ms")
+
+    vocabulary = DRUGS + [s.lower() for s in SPECIALTIES] + [d.lower() for d in DOCTORS] + ["dizzy", "fasting", "riverside"]
+    queries = [typo(rng.choice(vocabulary), rng) if rng.random() < 0.5 else rng.choice(vocabulary)
+               for _ in range(args.queries)]
+
+    samples = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        hits += bool(index.search(query, limit=20))
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    print(f"search: mean {sum(samples) / len(samples):.2f}ms, p50 {samples[len(samples) // 2]:.2f}ms, "
+          f"p99 {samples[int(len(samples) * 0.99) - 1]:.2f}ms ({hits}/{len(queries)} queries matched)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+List response serialization benchmark
+
+Serializes 10k medication and health-metric rows the way FastAPI does for
+`response_model=List[...]` (validate, dump to Python, json.dumps) and via
+app.services.serialization (validate once, dump straight to JSON bytes).
+
+    python -m benchmarks.bench_serialization [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import List
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.health_metric import HealthMetric
+from app.models.medication import Medication
+from app.services.serialization import dump_list
+
+
+def medication_rows(count: int) -> List[dict]:
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'user_id': str(uuid.uuid4()),
+            'name': f"Medication {i}",
+            'dosage': "500mg",
+            'frequency': "twice daily",
+            'start_date': (date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            'end_date': None,
+            'notes': "Take with food",
+            'active': True,
+            'created_at': (datetime(2024, 1, 1) + timedelta(minutes=i)).isoformat() + "+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def metric_rows(count: int) -> List[dict]:
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'user_id': str(uuid.uuid4()),
+            'metric_type': "blood_pressure",
+            'value': f"{110 + i % 40}/{70 + i % 20}",
+            'unit': "mmHg",
+            'notes': None,
+            'recorded_at': (datetime(2024, 1, 1) + timedelta(minutes=i)).isoformat() + "+00:00",
+            'created_at': (datetime(2024, 1, 1) + timedelta(minutes=i)).isoformat() + "+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def fastapi_path(field, rows: List[dict]) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    # JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for model, rows in ((Medication, medication_rows(args.rows)), (HealthMetric, metric_rows(args.rows))):
+        field = create_model_field(name="Response", type_=List[model], mode="serialization")
+        assert json.loads(fastapi_path(field, rows)) == json.loads(dump_list(rows, model))
+
+        before = timed(lambda: fastapi_path(field, rows), args.repeat)
+        after = timed(lambda: dump_list(rows, model), args.repeat)
+        print(f"{model.__name__:<14} per {args.rows:,} rows: response_model path {before * 1000:7.1f} ms, "
+              f"fast path {after * 1000:7.1f} ms ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Read coalescing benchmark
+
+Fires bursts of concurrent reads at a PostgREST client whose transport
+answers after a fixed latency (no network), as when the dashboard, the
+agent and retries ask for the same rows at once, and compares database
+calls and wall time with and without coalescing. Each burst mixes a few
+distinct queries, so only identical ones are shared.
+
+    python -m benchmarks.bench_singleflight [--bursts 50] [--concurrency 20] [--distinct 4] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import httpx
+from postgrest import SyncPostgrestClient
+
+from app.services.database import execute
+from app.services.singleflight import read_coalescer
+
+
+def client(latency: float):
+    calls = []
+    lock = threading.Lock()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        with lock:
+            calls.append(request.url)
+        time.sleep(latency)
+        return httpx.Response(200, json=[{"id": "1", "name": "Aspirin"}])
+
+    postgrest = SyncPostgrestClient("http://bench/rest/v1")
+    postgrest.session._transport = httpx.MockTransport(handler)
+    return postgrest, calls
+
+
+async def burst(postgrest, concurrency: int, distinct: int, coalesce: bool) -> None:
+    def query(i: int):
+        return postgrest.from_("medications").select("*").eq("user_id", f"user-{i % distinct}").eq("active", True)
+
+    if coalesce:
+        await asyncio.gather(*(execute(query(i)) for i in range(concurrency)))
+    else:
+        await asyncio.gather(*(asyncio.to_thread(query(i).execute) for i in range(concurrency)))
+
+
+async def run(bursts: int, concurrency: int, distinct: int, latency: float) -> None:
+    for coalesce in (False, True):
+        postgrest, calls = client(latency)
+        started = time.perf_counter()
+        for _ in range(bursts):
+            await burst(postgrest, concurrency, distinct, coalesce)
+        elapsed = time.perf_counter() - started
+        label = "coalesced" if coalesce else "independent"
+        print(f"{label:<12} {bursts * concurrency} reads -> {len(calls)} database calls, "
+              f"{elapsed / bursts * 1000:.1f} ms per burst")
+    print(read_coalescer.stats())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bursts", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--distinct", type=int, default=4, help="different queries per burst")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.bursts, args.concurrency, args.distinct, args.latency_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
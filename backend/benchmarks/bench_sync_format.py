@@ -0,0 +1,104 @@
+"""
+Sync format benchmark
+
+Encodes one user's health metrics (a reading every 15 minutes, all metric
+types) and medications as the list endpoints send them, as JSON and as the
+MessagePack column table (app.services.columnar), and compares payload size
+(raw and gzipped, as over a compressed connection), server encode time and
+client parse time (json.loads vs. unpacking and decoding the table).
+
+    python -m benchmarks.bench_sync_format [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import json
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from app.models.health_metric import HealthMetric
+from app.models.medication import Medication
+from app.services.columnar import decode_table, pack, unpack
+from app.services.serialization import column_table, dump_list
+
+METRICS = [
+    ('blood_pressure', lambda i: f"{110 + i % 40}/{70 + i % 20}", "mmHg"),
+    ('heart_rate', lambda i: str(60 + i % 30), "bpm"),
+    ('blood_sugar', lambda i: str(85 + i % 50), "mg/dL"),
+    ('weight', lambda i: f"{70 + i % 10 / 10:.1f}", "kg"),
+]
+
+
+def metric_rows(count: int) -> List[dict]:
+    user_id = str(uuid.uuid4())
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        metric_type, value, unit = METRICS[i % len(METRICS)]
+        recorded_at = start + timedelta(minutes=15 * i)
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'metric_type': metric_type,
+            'value': value(i),
+            'unit': unit,
+            'notes': "after exercise" if i % 50 == 0 else None,
+            'recorded_at': recorded_at.isoformat(),
+            'created_at': (recorded_at + timedelta(seconds=3, microseconds=i * 7919 % 1_000_000)).isoformat(),
+        })
+    # Newest first, as the list endpoint returns them
+    return rows[::-1]
+
+
+def medication_rows(count: int) -> List[dict]:
+    user_id = str(uuid.uuid4())
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'name': f"Medication {i % 40}",
+            'dosage': ("5mg", "10mg", "500mg")[i % 3],
+            'frequency': ("once daily", "twice daily")[i % 2],
+            'start_date': (date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            'end_date': None,
+            'notes': "Take with food" if i % 3 == 0 else None,
+            'active': i % 4 != 0,
+            'created_at': (datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for model, rows in ((HealthMetric, metric_rows(args.rows)), (Medication, medication_rows(args.rows))):
+        as_json = dump_list(rows, model)
+        as_msgpack = pack(column_table(rows, model))
+        decoded = decode_table(unpack(as_msgpack))
+        assert [model(**row) for row in decoded] == [model(**row) for row in json.loads(as_json)]
+
+        print(f"{model.__name__} ({args.rows:,} rows)")
+        for label, content, encode, parse in (
+            ("JSON", as_json, lambda: dump_list(rows, model), lambda: json.loads(as_json)),
+            ("MessagePack", as_msgpack, lambda: pack(column_table(rows, model)),
+             lambda: decode_table(unpack(as_msgpack))),
+        ):
+            print(f"  {label:<12} {len(content) / 1024:8.1f} KiB, gzipped {len(gzip.compress(content)) / 1024:7.1f} KiB, "
+                  f"encode {timed(encode, args.repeat) * 1000:6.1f} ms, parse {timed(parse, args.repeat) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Database outage check
+
+Runs the app against the PostgREST stand-in (benchmarks.postgrest_stand_in),
+injecting faults into it to take the app through an outage:
+
+1. up: a user's medication list is loaded into the query cache, then a
+   medication is added (as by another worker), which makes the entry stale
+2. down: every database request fails (it times out, the connection is
+   refused with --fault refuse, or PostgREST answers 503 with --fault
+   gateway). The first requests wait for the failure until the circuit
+   breaker opens; after that, requests return at once, the list with the
+   rows from before the write flagged X-Data-Stale and without an ETag, the
+   uncached medication detail with 503 and Retry-After
+3. back: after the breaker's reset period a detail request probes the
+   database, the breaker closes, and the stale list is reloaded in the
+   background, so the next list request is fresh and a cache hit
+
+Reports latencies and database calls per phase, and exits with status 1 if
+the app did not behave as above.
+
+    python -m benchmarks.check_database_outage [--fault timeout] [--requests 20] [--timeout 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.postgrest_stand_in import STAND_IN_ENVIRONMENT, PostgrestStandIn
+
+USER_ID = str(uuid.uuid4())
+
+
+def medication(name: str) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        'id': str(uuid.uuid4()), 'user_id': USER_ID, 'name': name, 'dosage': "10mg",
+        'frequency': "once daily", 'start_date': "2026-01-01", 'end_date': None, 'notes': None,
+        'active': True, 'created_at': now, 'updated_at': now,
+    }
+
+
+async def timed(client: httpx.AsyncClient, path: str):
+    started = time.perf_counter()
+    response = await client.get(path)
+    return response, time.perf_counter() - started
+
+
+def summary(label: str, latencies, calls: int) -> None:
+    latencies = sorted(latencies)
+    print(f"{label:<6} {len(latencies)} requests, median {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+          f"max {latencies[-1] * 1000:7.1f} ms, {calls} database calls")
+
+
+async def run(args) -> bool:
+    import main
+    from app.services import changes
+    from app.services.auth_service import create_access_token
+    from app.services.database import db_breaker
+    from app.services.query_cache import query_cache
+
+    stand_in = PostgrestStandIn({
+        'users': [{'id': USER_ID, 'email': "check@example.com", 'full_name': "Check"}],
+        'medications': [medication(f"Medication {i}") for i in range(3)],
+    })
+    stand_in.install()
+    token = create_access_token({'sub': USER_ID})
+    problems = []
+
+    def expect(ok: bool, problem: str) -> None:
+        if not ok:
+            problems.append(problem)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=main.app),
+        base_url="http://check",
+        headers={'Authorization': f"Bearer {token}"},
+    ) as client:
+        medications = "/api/v1/medications/"
+        detail = f"/api/v1/medications/{stand_in.tables['medications'][0]['id']}"
+
+        # 1. up
+        response, elapsed = await timed(client, medications)
+        expect(response.status_code == 200 and len(response.json()) == 3, f"list while up: {response.status_code}")
+        summary("up", [elapsed], stand_in.calls)
+        added = medication("Added before the outage")
+        stand_in.tables['medications'].append(added)
+        changes.record_changed(USER_ID, changes.MEDICATIONS, added)
+
+        # 2. down
+        stand_in.fault, calls = args.fault, stand_in.calls
+        latencies, fast = [], []
+        for i in range(args.requests):
+            response, elapsed = await timed(client, medications if i % 2 == 0 else detail)
+            latencies.append(elapsed)
+            if db_breaker.state == "open" and i >= args.requests // 2:
+                fast.append(elapsed)
+            if i % 2 == 0:
+                expect(response.status_code == 200, f"list while down: {response.status_code}")
+                expect(response.status_code != 200 or len(response.json()) == 3, "list while down is not the cached one")
+                expect("x-data-stale" in response.headers, "list while down not flagged X-Data-Stale")
+                expect("etag" not in response.headers, "stale list has an ETag")
+            else:
+                expect(response.status_code == 503, f"detail while down: {response.status_code}")
+                expect("retry-after" in response.headers, "503 without Retry-After")
+        down_calls = stand_in.calls - calls
+        summary("down", latencies, down_calls)
+        expect(db_breaker.state == "open", f"breaker {db_breaker.state} after the outage")
+        expect(down_calls <= 2 * args.failures, f"{down_calls} database calls while down")
+        expect(bool(fast) and max(fast) < args.timeout / 2, "requests did not fail fast once the breaker opened")
+
+        # 3. back
+        stand_in.fault, calls = None, stand_in.calls
+        await asyncio.sleep(args.reset)
+        response, elapsed = await timed(client, detail)
+        expect(response.status_code == 200, f"detail after recovery: {response.status_code}")
+        expect(db_breaker.state == "closed", f"breaker {db_breaker.state} after recovery")
+        # Let the background reload finish
+        for _ in range(100):
+            if query_cache.revalidated:
+                break
+            await asyncio.sleep(0.01)
+        hits = query_cache.hits
+        response, list_elapsed = await timed(client, medications)
+        summary("back", [elapsed, list_elapsed], stand_in.calls - calls)
+        expect(query_cache.revalidated == 1, f"{query_cache.revalidated} stale entries reloaded in the background")
+        expect(query_cache.hits == hits + 1, "list after recovery was not a cache hit")
+        expect(response.status_code == 200 and len(response.json()) == 4, "list after recovery is not fresh")
+        expect("x-data-stale" not in response.headers and "etag" in response.headers, "list after recovery is flagged stale")
+
+    print("breaker:", db_breaker.stats())
+    print("cache:", {k: v for k, v in query_cache.stats().items() if k in ('hits', 'misses', 'stale_served', 'revalidated')})
+    for problem in problems:
+        print("  <-", problem)
+    return not problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fault", choices=("timeout", "refuse", "gateway"), default="timeout")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=0.5, help="DB_TIMEOUT_SECONDS")
+    parser.add_argument("--failures", type=int, default=3, help="DB_BREAKER_FAILURES")
+    parser.add_argument("--reset", type=float, default=1.0, help="DB_BREAKER_RESET_SECONDS")
+    args = parser.parse_args()
+
+    # Read by app.config on import
+    os.environ.update(
+        STAND_IN_ENVIRONMENT,
+        DB_TIMEOUT_SECONDS=str(args.timeout),
+        DB_BREAKER_FAILURES=str(args.failures),
+        DB_BREAKER_RESET_SECONDS=str(args.reset),
+    )
+    ok = asyncio.run(run(args))
+    print("OK: reads were served stale and failed fast during the outage, and recovered after it" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Health metric index check
+
+Seeds a large health_metrics table (1M readings by default, 2000 users with
+500 each) inside a transaction on the database at DATABASE_URL, runs
+EXPLAIN on the queries the routers and agent tools send through PostgREST
+and checks that each one is served by the expected index, without a
+sequential scan and, where rows are ordered, without a sort step. The
+transaction is rolled back, so nothing is left behind. Exits with status 1
+if any plan regressed.
+
+Needs a direct Postgres connection as the table owner (Supabase: Project
+Settings > Database > Connection string), with the migrations applied.
+
+    python -m benchmarks.check_health_metric_indexes [--dsn postgresql://...] [--users 2000] [--readings 500]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+from app.config import settings
+
+METRIC_TYPES = ['blood_pressure', 'blood_sugar', 'weight', 'temperature', 'heart_rate', 'oxygen_saturation']
+EMAIL_DOMAIN = 'index-check.invalid'
+
+# (access path, SQL as PostgREST runs it, index expected, rows are ordered)
+QUERIES = [
+    ("list by type and range",
+     "SELECT * FROM health_metrics WHERE user_id = '{user}' AND metric_type = 'heart_rate' "
+     "AND recorded_at >= '{start}' AND recorded_at < '{end}' ORDER BY recorded_at DESC",
+     'idx_health_metrics_user_type_recorded_at', True),
+    ("list by type (agent trends)",
+     "SELECT * FROM health_metrics WHERE user_id = '{user}' AND metric_type = 'heart_rate' ORDER BY recorded_at DESC",
+     'idx_health_metrics_user_type_recorded_at', True),
+    ("latest of a type (dashboard)",
+     "SELECT * FROM health_metrics WHERE user_id = '{user}' AND metric_type = 'weight' ORDER BY recorded_at DESC LIMIT 1",
+     'idx_health_metrics_user_type_recorded_at', True),
+    ("anomaly history",
+     "SELECT value, unit FROM health_metrics WHERE user_id = '{user}' AND metric_type = 'blood_sugar' "
+     "ORDER BY recorded_at DESC LIMIT 500",
+     'idx_health_metrics_user_type_recorded_at', True),
+    ("list by range",
+     "SELECT * FROM health_metrics WHERE user_id = '{user}' AND recorded_at >= '{start}' AND recorded_at < '{end}' "
+     "ORDER BY recorded_at DESC",
+     'idx_health_metrics_user_recorded_at', True),
+    ("list all",
+     "SELECT * FROM health_metrics WHERE user_id = '{user}' ORDER BY recorded_at DESC",
+     'idx_health_metrics_user_recorded_at', True),
+    ("cohort window",
+     "SELECT user_id, primary_value FROM health_metrics WHERE metric_type = 'heart_rate' "
+     "AND recorded_at >= '{start}' AND recorded_at < '{end}'",
+     'idx_health_metrics_type_recorded_at', False),
+]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def check_plan(plan: dict, index: str, ordered: bool) -> list:
+    """Problems with a plan, empty if it uses `index` as expected"""
+    nodes = list(plan_nodes(plan))
+    problems = []
+    if not any(node.get('Index Name') == index for node in nodes):
+        used = sorted({node['Index Name'] for node in nodes if 'Index Name' in node})
+        problems.append(f"does not use {index} (uses {', '.join(used) or 'no index'})")
+    if any(node['Node Type'] == 'Seq Scan' for node in nodes):
+        problems.append("has a sequential scan")
+    if ordered and any(node['Node Type'] in ('Sort', 'Incremental Sort') for node in nodes):
+        problems.append("sorts the rows")
+    return problems
+
+
+async def seed(connection, users: int, readings: int) -> str:
+    """Insert the test users and readings; returns one user's id"""
+    await connection.execute(
+        "INSERT INTO users (email, name, password) "
+        "SELECT 'user-' || n || '@" + EMAIL_DOMAIN + "', 'Index check ' || n, 'not-a-hash' "
+        "FROM generate_series(1, $1) AS n",
+        users,
+    )
+    # Readings an hour apart per user, cycling through the metric types
+    await connection.execute(
+        "INSERT INTO health_metrics (user_id, metric_type, value, unit, recorded_at) "
+        "SELECT u.id, ($1::TEXT[])[1 + n % 6], (60 + n % 40)::TEXT, 'unit', now() - n * INTERVAL '1 hour' "
+        "FROM users u, generate_series(1, $2) AS n "
+        "WHERE u.email LIKE '%@" + EMAIL_DOMAIN + "'",
+        METRIC_TYPES, readings,
+    )
+    await connection.execute("ANALYZE health_metrics")
+    return await connection.fetchval(
+        "SELECT id FROM users WHERE email = 'user-1@" + EMAIL_DOMAIN + "'"
+    )
+
+
+async def run(dsn: str, users: int, readings: int) -> bool:
+    connection = await asyncpg.connect(dsn)
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        user_id = await seed(connection, users, readings)
+        print(f"seeded {users * readings:,} readings for {users:,} users")
+
+        # A day of readings: selective enough that an index beats a scan even on rows not yet vacuumed
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=1)
+        ok = True
+        for name, sql, index, ordered in QUERIES:
+            # Literal values (all generated here), so each plan is made for them
+            sql = sql.format(user=user_id, start=start.isoformat(), end=end.isoformat())
+            explained = await connection.fetchval(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = json.loads(explained)[0]['Plan']
+            problems = check_plan(plan, index, ordered)
+            ok = ok and not problems
+            print(f"{'ok  ' if not problems else 'FAIL'} {name:<30} {'; '.join(problems) or index}")
+        return ok
+    finally:
+        await transaction.rollback()
+        await connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=500, help="readings per user")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set DATABASE_URL or pass --dsn")
+    if not asyncio.run(run(args.dsn, args.users, args.readings)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
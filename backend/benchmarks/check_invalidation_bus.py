@@ -0,0 +1,109 @@
+"""
+Multi-worker invalidation check
+
+Starts several worker processes, each with its own invalidation bus in a
+temporary directory, has every worker publish a write on the change feed and
+checks that all the others bumped their data versions and updated their
+appointment index. Exits with status 1 if any change was not seen everywhere.
+
+    python -m benchmarks.check_invalidation_bus [--workers 4] [--writes 200]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+USER_ID = "check-user"
+
+
+async def run_worker(number: int, directory: str, workers: int, writes: int, ready, done, results) -> None:
+    from app.services import changes
+    from app.services.appointment_index import appointment_index, UserAppointmentIndex
+    from app.services.invalidation import invalidation_bus
+    from app.services.versioning import data_versions
+
+    invalidation_bus.directory = Path(directory)
+    await invalidation_bus.start()
+    # Pretend the user's appointments are already loaded so remote rows are applied
+    appointment_index._users[USER_ID] = UserAppointmentIndex(appointment_index.duration)
+
+    await asyncio.to_thread(ready.wait)
+    origin = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    started = time.perf_counter()
+    for i in range(writes):
+        changes.record_changed(USER_ID, changes.APPOINTMENTS, {
+            'id': f"{number}-{i}",
+            'user_id': USER_ID,
+            'date_time': (origin + timedelta(hours=number * writes + i)).isoformat(),
+            'status': 'scheduled',
+        })
+        if i % 50 == 0:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    # Wait (bounded) until every other worker's writes have arrived
+    expected = workers * writes
+    deadline = time.monotonic() + 10
+    while len(appointment_index._users[USER_ID]) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    # Keep the loop running so this worker finishes sending while others catch up
+    await asyncio.to_thread(done.wait)
+
+    results.put((
+        number,
+        data_versions.get(USER_ID, changes.APPOINTMENTS),
+        len(appointment_index._users[USER_ID]),
+        invalidation_bus.received,
+        elapsed,
+    ))
+    await invalidation_bus.stop()
+
+
+def worker(*args) -> None:
+    asyncio.run(run_worker(*args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(args.workers)
+    done = context.Barrier(args.workers)
+    results = context.Queue()
+
+    with tempfile.TemporaryDirectory() as directory:
+        processes = [
+            context.Process(target=worker, args=(n, directory, args.workers, args.writes, ready, done, results))
+            for n in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        rows = sorted(results.get(timeout=60) for _ in processes)
+        for process in processes:
+            process.join()
+
+    expected = args.workers * args.writes
+    failed = False
+    for number, version, indexed, received, elapsed in rows:
+        ok = version == expected and indexed == expected
+        failed |= not ok
+        print(
+            f"worker {number}: version {version}/{expected}, indexed {indexed}/{expected}, "
+            f"received {received}, published {args.writes} in {elapsed * 1000:.1f}ms"
+            f"{'' if ok else '  <- MISSING CHANGES'}"
+        )
+
+    print("FAIL" if failed else f"OK: every worker saw all {expected} writes")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
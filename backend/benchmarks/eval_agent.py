@@ -0,0 +1,360 @@
+"""
+Medical agent evaluation
+
+Runs the medical agent (app.agents.medical_agent) on the scenarios in
+benchmarks.agent_scenarios without calling Groq: each scenario's model
+turns are replayed from a cassette (benchmarks/cassettes/<scenario>.json)
+while the agent's real prompt, tools and queries run against the PostgREST
+stand-in (benchmarks.postgrest_stand_in). Reports per scenario:
+
+- tool calls and model requests
+- database calls made by the tools (each run starts with cold caches)
+- prompt and completion tokens: the recorded counts, with prompt tokens
+  adjusted by how much the prompt grew or shrank since recording (system
+  prompt, tool definitions and tool results, at about 4 characters a token)
+- wall time
+
+and exits with status 1 if a scenario no longer follows its cassette (the
+agent asked the model something else, e.g. a tool was removed or its
+result changed shape), or used more tool calls or model requests than its
+baseline, or more database calls or tokens than the baseline plus
+--tolerance. Wall time depends on the machine, so it only fails the check
+with --max-slowdown.
+
+--record runs the scenarios against the live model (needs GROQ_API_KEY)
+and rewrites the cassettes, keeping their baselines so the new recording
+is checked against them; --scripted records the scenario scripts instead
+of the live model's turns. --update-baselines accepts the current figures.
+
+    python -m benchmarks.eval_agent [scenario ...] [--tolerance 0.05] [--max-slowdown 2]
+    python -m benchmarks.eval_agent --record [--scripted] [scenario ...]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+)
+from pydantic_ai.models import AgentModel, Model
+from pydantic_ai.result import Usage
+from pydantic_ai.tools import ToolDefinition
+
+from benchmarks.agent_scenarios import SCENARIOS, Scenario
+from benchmarks.postgrest_stand_in import STAND_IN_ENVIRONMENT, PostgrestStandIn
+
+CASSETTES = Path(__file__).parent / "cassettes"
+
+# Checked against the baseline with --tolerance; tool calls and model requests must not grow at all
+TOLERATED = ('db_calls', 'request_tokens', 'response_tokens')
+COUNTED = ('tool_calls', 'model_requests')
+
+
+class CassetteMismatch(Exception):
+    """The agent no longer makes the requests the cassette recorded"""
+
+
+def _part_text(part) -> str:
+    if part.part_kind == 'tool-return':
+        return part.model_response_str()
+    if part.part_kind == 'retry-prompt':
+        return part.model_response()
+    if part.part_kind == 'tool-call':
+        return part.tool_name + part.args_as_json_str()
+    return part.content
+
+
+def estimate_tokens(messages: List[ModelMessage], tools: List[ToolDefinition] = ()) -> int:
+    """Rough token count of a model request: about 4 characters a token"""
+    chars = sum(len(_part_text(part)) for message in messages for part in message.parts)
+    chars += sum(len(tool.name) + len(tool.description) + len(json.dumps(tool.parameters_json_schema)) for tool in tools)
+    return max(1, round(chars / 4))
+
+
+def fingerprint(messages: List[ModelMessage]) -> List[str]:
+    """What the agent is asking: the kinds of the newest request's parts, with tool names"""
+    return [f"{part.part_kind}:{getattr(part, 'tool_name', None) or ''}" for part in messages[-1].parts]
+
+
+def dump_response(response: ModelResponse) -> dict:
+    return ModelMessagesTypeAdapter.dump_python([response], mode='json')[0]
+
+
+def load_response(data: dict) -> ModelResponse:
+    return ModelMessagesTypeAdapter.validate_python([data])[0]
+
+
+class _CallbackAgentModel(AgentModel):
+    def __init__(self, model: "_CallbackModel", tools: List[ToolDefinition]):
+        self.model = model
+        self.tools = tools
+
+    async def request(self, messages, model_settings) -> Tuple[ModelResponse, Usage]:
+        return self.model.respond(messages, self.tools)
+
+
+class _CallbackModel(Model):
+    """A model whose responses come from `respond(messages, tools)`"""
+
+    async def agent_model(self, *, function_tools, allow_text_result, result_tools) -> AgentModel:
+        return _CallbackAgentModel(self, function_tools + result_tools)
+
+    def respond(self, messages: List[ModelMessage], tools: List[ToolDefinition]) -> Tuple[ModelResponse, Usage]:
+        raise NotImplementedError()
+
+
+class ScriptedModel(_CallbackModel):
+    """Plays a scenario's script, with estimated usage"""
+
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+
+    def name(self) -> str:
+        return "scripted"
+
+    def respond(self, messages, tools):
+        turn = sum(isinstance(message, ModelResponse) for message in messages)
+        if turn >= len(self.scenario.script):
+            raise CassetteMismatch(f"{self.scenario.name}: the script has no turn {turn + 1}")
+        step = self.scenario.script[turn]
+        if isinstance(step, str):
+            parts = [TextPart(step)]
+        else:
+            parts = [ToolCallPart.from_raw_args(name, json.dumps(args), f"call_{turn}_{i}") for i, (name, args) in enumerate(step)]
+        response = ModelResponse(parts=parts)
+        request_tokens = estimate_tokens(messages, tools)
+        response_tokens = estimate_tokens([response])
+        return response, Usage(request_tokens=request_tokens, response_tokens=response_tokens,
+                               total_tokens=request_tokens + response_tokens)
+
+
+class _RecordingAgentModel(AgentModel):
+    def __init__(self, model: "RecordingModel", inner: AgentModel, tools: List[ToolDefinition]):
+        self.model = model
+        self.inner = inner
+        self.tools = tools
+
+    async def request(self, messages, model_settings) -> Tuple[ModelResponse, Usage]:
+        response, usage = await self.inner.request(messages, model_settings)
+        self.model.interactions.append({
+            'request': fingerprint(messages),
+            'request_estimate': estimate_tokens(messages, self.tools),
+            'response': dump_response(response),
+            'usage': {'request_tokens': usage.request_tokens or 0, 'response_tokens': usage.response_tokens or 0},
+        })
+        return response, usage
+
+
+class RecordingModel(Model):
+    """Passes requests to another model and keeps each request and response"""
+
+    def __init__(self, inner: Model):
+        self.inner = inner
+        self.interactions: List[dict] = []
+
+    async def agent_model(self, *, function_tools, allow_text_result, result_tools) -> AgentModel:
+        inner = await self.inner.agent_model(
+            function_tools=function_tools, allow_text_result=allow_text_result, result_tools=result_tools
+        )
+        return _RecordingAgentModel(self, inner, function_tools + result_tools)
+
+    def name(self) -> str:
+        return self.inner.name()
+
+
+class ReplayModel(_CallbackModel):
+    """Answers with a cassette's recorded responses, checking the requests still match"""
+
+    def __init__(self, cassette: dict):
+        self.cassette = cassette
+        self.interactions = cassette['interactions']
+        self.served = 0
+
+    def name(self) -> str:
+        return f"replay:{self.cassette['scenario']}"
+
+    def respond(self, messages, tools):
+        name = self.cassette['scenario']
+        if self.served >= len(self.interactions):
+            raise CassetteMismatch(f"{name}: the agent made a request after the last recorded one")
+        recorded = self.interactions[self.served]
+        self.served += 1
+        request = fingerprint(messages)
+        if request != recorded['request']:
+            raise CassetteMismatch(f"{name}: request {self.served} is {request}, recorded {recorded['request']}")
+        response = load_response(recorded['response'])
+        available = {tool.name for tool in tools}
+        for part in response.parts:
+            if isinstance(part, ToolCallPart) and part.tool_name not in available:
+                raise CassetteMismatch(f"{name}: recorded call to {part.tool_name}, which the agent no longer has")
+        # The recorded prompt tokens, moved by how much the request grew or shrank
+        request_tokens = max(1, recorded['usage']['request_tokens'] + estimate_tokens(messages, tools) - recorded['request_estimate'])
+        response_tokens = recorded['usage']['response_tokens']
+        return response, Usage(request_tokens=request_tokens, response_tokens=response_tokens,
+                               total_tokens=request_tokens + response_tokens)
+
+
+async def run_scenario(scenario: Scenario, model: Model) -> dict:
+    """Run one scenario on `model` as a new user with cold caches"""
+    from app.agents import build_medical_agent
+    from app.agents.tools import MedicalContext
+    from app.services.dose_scheduler import load_active_medications
+
+    user_id = str(uuid.uuid4())
+    stand_in = PostgrestStandIn(scenario.tables(user_id))
+    stand_in.install()
+    await load_active_medications()
+    agent = build_medical_agent(model)
+    calls = stand_in.calls
+
+    started = time.perf_counter()
+    result = await agent.run(scenario.prompt, deps=MedicalContext(user_id=user_id, user_name="Sam Eval"))
+    elapsed = time.perf_counter() - started
+
+    if isinstance(model, ReplayModel) and model.served < len(model.interactions):
+        raise CassetteMismatch(f"{scenario.name}: the agent finished after {model.served} of "
+                               f"{len(model.interactions)} recorded requests")
+    usage = result.usage()
+    return {
+        'tool_calls': sum(
+            isinstance(part, ToolCallPart)
+            for message in result.all_messages() if isinstance(message, ModelResponse)
+            for part in message.parts
+        ),
+        'model_requests': usage.requests,
+        'db_calls': stand_in.calls - calls,
+        'request_tokens': usage.request_tokens or 0,
+        'response_tokens': usage.response_tokens or 0,
+        'wall_ms': round(elapsed * 1000, 1),
+    }
+
+
+def cassette_path(scenario: Scenario) -> Path:
+    return CASSETTES / f"{scenario.name}.json"
+
+
+def load_cassette(scenario: Scenario) -> Optional[dict]:
+    path = cassette_path(scenario)
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def save_cassette(scenario: Scenario, cassette: dict) -> None:
+    CASSETTES.mkdir(exist_ok=True)
+    cassette_path(scenario).write_text(json.dumps(cassette, indent=2) + "\n")
+
+
+async def record(scenario: Scenario, scripted: bool) -> dict:
+    from pydantic_ai.models import infer_model
+
+    from app.agents.medical_agent import MODEL
+
+    model = RecordingModel(ScriptedModel(scenario) if scripted else infer_model(MODEL))
+    await run_scenario(scenario, model)
+    previous = load_cassette(scenario) or {}
+    return {
+        'scenario': scenario.name,
+        'prompt': scenario.prompt,
+        'model': model.name(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'interactions': model.interactions,
+        'baseline': previous.get('baseline'),
+    }
+
+
+def regressions(figures: dict, baseline: dict, tolerance: float, max_slowdown: Optional[float]) -> List[str]:
+    found = []
+    for key in COUNTED:
+        if figures[key] > baseline[key]:
+            found.append(f"{key} {figures[key]} > {baseline[key]}")
+    for key in TOLERATED:
+        if figures[key] > baseline[key] * (1 + tolerance):
+            found.append(f"{key} {figures[key]} > {baseline[key]} + {tolerance:.0%}")
+    if max_slowdown and figures['wall_ms'] > baseline['wall_ms'] * max_slowdown:
+        found.append(f"wall time {figures['wall_ms']} ms > {max_slowdown}x {baseline['wall_ms']} ms")
+    return found
+
+
+async def run(args) -> bool:
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenarios or scenario.name in args.scenarios]
+    unknown = set(args.scenarios) - {scenario.name for scenario in scenarios}
+    if unknown:
+        print("Unknown scenarios:", ", ".join(sorted(unknown)))
+        return False
+
+    ok = True
+    print(f"{'scenario':<28} {'tools':>5} {'model':>5} {'db':>4} {'prompt':>7} {'completion':>10} {'wall ms':>8}")
+    for scenario in scenarios:
+        if args.record:
+            save_cassette(scenario, await record(scenario, args.scripted))
+        cassette = load_cassette(scenario)
+        if cassette is None:
+            print(f"{scenario.name:<28} no cassette; record one with --record")
+            ok = False
+            continue
+        if cassette['prompt'] != scenario.prompt:
+            print(f"{scenario.name:<28} the prompt changed since recording; record it again with --record")
+            ok = False
+            continue
+
+        try:
+            figures = await run_scenario(scenario, ReplayModel(cassette))
+        except CassetteMismatch as e:
+            print(f"{scenario.name:<28} DIVERGED: {e}")
+            ok = False
+            continue
+        print(f"{scenario.name:<28} {figures['tool_calls']:>5} {figures['model_requests']:>5} {figures['db_calls']:>4} "
+              f"{figures['request_tokens']:>7} {figures['response_tokens']:>10} {figures['wall_ms']:>8.1f}")
+
+        if cassette.get('baseline') is None or args.update_baselines:
+            cassette['baseline'] = figures
+            save_cassette(scenario, cassette)
+            continue
+        baseline = cassette['baseline']
+        found = regressions(figures, baseline, args.tolerance, args.max_slowdown)
+        for regression in found:
+            print("  <-", regression)
+        ok = ok and not found
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help="Scenario names (default: all)")
+    parser.add_argument("--record", action="store_true", help="Record the cassettes from the live model first")
+    parser.add_argument("--scripted", action="store_true", help="With --record: record the scenario scripts")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--max-slowdown", type=float, default=None, help="Fail if wall time exceeds the baseline times this")
+    args = parser.parse_args()
+    if args.scripted and not args.record:
+        parser.error("--scripted only applies to --record")
+
+    # Read by app.config on import
+    os.environ.update(STAND_IN_ENVIRONMENT)
+    from app.config import settings
+
+    if args.record and not args.scripted and not settings.GROQ_API_KEY:
+        parser.error("--record needs GROQ_API_KEY (or --scripted)")
+
+    # pydantic-ai reads the tools' docstrings with griffe, which warns about every Returns: section
+    logging.getLogger("griffe").setLevel(logging.ERROR)
+    ok = asyncio.run(run(args))
+    print("OK: every scenario followed its cassette within its baseline" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+In-memory stand-in for PostgREST
+
+Answers the app's Supabase table requests from Python lists, through the
+real client (an httpx transport under the circuit breaker's), so benchmarks
+and checks run the app's own queries without a database or network. It
+supports what the app uses: eq, neq, gt, gte, lt, lte, in and is filters
+(and not.), select lists, order, limit and offset, count=exact, inserts,
+upserts (merging or ignoring duplicates), updates and deletes. RPCs answer
+from `functions` (list results are filtered, ordered and paged like
+tables); anything else gets a 400 so a missing feature shows up
+instead of returning wrong rows. Like PostgREST, no response has more than
+`max_rows` rows (its db-max-rows, 1000 on Supabase).
+
+Inserted rows get ids from a counter, so the same writes in the same order
+get the same ids in every run. `fault` makes every request fail as in an
+outage: "timeout" (after the client's read timeout), "refuse" (connection
+refused) or "gateway" (PostgREST's 503).
+
+    os.environ.update(STAND_IN_ENVIRONMENT)  # before importing the app
+    stand_in = PostgrestStandIn({'medications': [...]})
+    stand_in.install()
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+# Settings the app needs to create its client; the URL is never contacted
+STAND_IN_ENVIRONMENT = {'SUPABASE_URL': "http://stand-in.local", 'SUPABASE_KEY': "stand.in.key"}
+
+# Query parameters that are not filters
+_MODIFIERS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+
+def _scalar(value: Any) -> Any:
+    """A row value or filter operand in a form that compares as Postgres would"""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value)
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if len(text) >= 10 and text[4] == "-" and text[7] == "-":
+        try:
+            moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return text
+
+
+def _compare(a: Any, b: Any) -> int:
+    a, b = _scalar(a), _scalar(b)
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return (str(a) > str(b)) - (str(a) < str(b))
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    if expression.startswith("not."):
+        return not _matches(row, column, expression[4:])
+    operator, _, operand = expression.partition(".")
+    value = row.get(column)
+    if operator == "is":
+        return _scalar(value) is {"null": None, "true": True, "false": False}[operand.lower()]
+    if operator == "in":
+        return any(_compare(value, item.strip().strip('"')) == 0 for item in operand.strip("()").split(","))
+    if value is None:
+        return False
+    order = _compare(value, operand)
+    tests = {
+        'eq': order == 0, 'neq': order != 0,
+        'gt': order > 0, 'gte': order >= 0, 'lt': order < 0, 'lte': order <= 0,
+    }
+    if operator not in tests:
+        raise ValueError(f"Filter {column}={expression} is not supported by the stand-in")
+    return tests[operator]
+
+
+def _sort(rows: List[dict], order: str) -> List[dict]:
+    for term in reversed(order.split(",")):
+        column, *flags = term.split(".")
+        descending = "desc" in flags
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: _Key(row[column]), reverse=descending)
+        # Postgres puts nulls last ascending and first descending
+        rows = missing + present if descending else present + missing
+    return rows
+
+
+class _Key:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "_Key") -> bool:
+        return _compare(self.value, other.value) < 0
+
+
+class PostgrestStandIn:
+    """Tables as lists of rows, served over PostgREST's HTTP interface"""
+
+    def __init__(
+        self,
+        tables: Optional[Dict[str, List[dict]]] = None,
+        functions: Optional[Dict[str, Callable[[dict], Any]]] = None,
+        updated_at_tables: tuple = (
+            "users", "medications", "appointments", "medication_adherence", "metric_stats", "documents", "jobs"
+        ),
+        max_rows: int = 1000,
+    ):
+        self.tables: Dict[str, List[dict]] = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.functions = functions or {}
+        self.updated_at_tables = updated_at_tables
+        self.max_rows = max_rows
+        self.fault: Optional[str] = None
+        self.calls = 0
+        self.calls_by_table: Counter = Counter()
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        """Answer the app's PostgREST requests from now on"""
+        from app.services.database import get_supabase
+
+        get_supabase().postgrest.session._transport.transport = httpx.MockTransport(self.handle)
+
+    def new_id(self) -> str:
+        self._ids += 1
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"stand-in/{self._ids}"))
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/rest/v1/", 1)[-1]
+        with self._lock:
+            self.calls += 1
+            self.calls_by_table[path] += 1
+        if self.fault == "timeout":
+            # As the real transport would after the client's read timeout
+            time.sleep(request.extensions["timeout"]["read"])
+            raise httpx.ReadTimeout("Stand-in timed out", request=request)
+        if self.fault == "refuse":
+            raise httpx.ConnectError("Connection refused", request=request)
+        if self.fault == "gateway":
+            return httpx.Response(503, json={'code': "PGRST000", 'message': "Could not connect to the database"})
+
+        try:
+            with self._lock:
+                if path.startswith("rpc/"):
+                    return self._rpc(path[4:], request)
+                return self._table(path, request)
+        except (KeyError, ValueError) as e:
+            return httpx.Response(400, json={'code': "PGRST100", 'message': str(e)})
+
+    def _rpc(self, name: str, request: httpx.Request) -> httpx.Response:
+        function = self.functions.get(name)
+        if function is None:
+            return httpx.Response(404, json={'code': "PGRST202", 'message': f"Function {name} is not in the stand-in"})
+        result = function(json.loads(request.content or b"{}"))
+        if not isinstance(result, list):
+            return httpx.Response(200, json=result)
+        # Set-returning functions are filtered, ordered and paged like tables
+        return self._select(self._filter(result, request.url.params), request)
+
+    @staticmethod
+    def _filter(rows: List[dict], params) -> List[dict]:
+        filters = [(column, value) for column, value in params.multi_items() if column not in _MODIFIERS]
+        if any(column in ("or", "and") for column, _ in filters):
+            raise ValueError("or/and filters are not supported by the stand-in")
+        return [row for row in rows if all(_matches(row, column, value) for column, value in filters)]
+
+    def _table(self, table: str, request: httpx.Request) -> httpx.Response:
+        rows = self.tables.setdefault(table, [])
+        params = request.url.params
+        matched = self._filter(rows, params)
+        now = datetime.now(timezone.utc).isoformat()
+
+        if request.method == "POST":
+            body = json.loads(request.content)
+            conflict = params["on_conflict"].split(",") if "on_conflict" in params else None
+            ignore_duplicates = "resolution=ignore-duplicates" in request.headers.get("prefer", "")
+            written = []
+            for new in body if isinstance(body, list) else [body]:
+                existing = None
+                if conflict:
+                    existing = next((row for row in rows if all(_compare(row.get(c), new.get(c)) == 0 for c in conflict)), None)
+                if existing is not None and ignore_duplicates:
+                    continue
+                if existing is not None:
+                    existing.update(new)
+                    written.append(existing)
+                    continue
+                row = {'id': self.new_id(), 'created_at': now, **new}
+                if table in self.updated_at_tables:
+                    row.setdefault('updated_at', now)
+                rows.append(row)
+                written.append(row)
+            return self._rows(written, status=201)
+        if request.method == "PATCH":
+            changes = json.loads(request.content)
+            for row in matched:
+                row.update(changes)
+                if table in self.updated_at_tables:
+                    row['updated_at'] = now
+            return self._rows(matched)
+        if request.method == "DELETE":
+            deleted = {id(row) for row in matched}
+            self.tables[table] = [row for row in rows if id(row) not in deleted]
+            return self._rows(matched)
+        return self._select(matched, request)
+
+    def _select(self, matched: List[dict], request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        if "order" in params:
+            matched = _sort(matched, params["order"])
+        total = len(matched)
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", self.max_rows)), self.max_rows)
+        matched = matched[offset:offset + limit]
+        columns = [column.strip() for column in params.get("select", "*").split(",")]
+        if columns != ["*"]:
+            matched = [{column: row.get(column) for column in columns} for row in matched]
+        headers = {}
+        if "count=exact" in request.headers.get("prefer", ""):
+            headers['Content-Range'] = f"{offset}-{offset + len(matched) - 1}/{total}" if matched else f"*/{total}"
+        return self._rows(matched, headers=headers)
+
+    @staticmethod
+    def _rows(rows: List[dict], status: int = 200, headers: Optional[dict] = None) -> httpx.Response:
+        # Serialised, so callers never share rows with the tables
+        return httpx.Response(status, content=json.dumps(rows, default=str).encode(), headers={
+            'Content-Type': "application/json", **(headers or {})
+        })
@@ -3,22 +3,80 @@ Medical Management AI - FastAPI Backend
 Main application entry point
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from loguru import logger
-import sys
+from starlette.exceptions import HTTPException as StarletteHTTPException
+import asyncio
+import math
 
 from app.config import settings
-from app.api import auth, medications, appointments, health_metrics, chat
+from app.api import auth, medications, appointments, health_metrics, chat, dashboard, search, live, documents, jobs, cohorts, admin
+from app.agents.medical_agent import get_medical_agent
+from app.services.compression import CompressionMiddleware
+from app.services.database import DatabaseUnavailable, init_database
+from app.services.dose_scheduler import dose_scheduler, load_active_medications
+from app.services.interactions import get_interaction_index
+from app.services.invalidation import invalidation_bus
+from app.services.jobs import job_queue
+from app.services.logs import configure_logging, shutdown_logging, RequestIdMiddleware
+from app.services import metric_partitions, sync
+from app.services.push import connection_manager
+from app.services.query_cache import StaleDataMiddleware
 
 # Configure logging
-logger.remove()
-logger.add(
-    sys.stdout,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>",
-    level="INFO" if settings.ENVIRONMENT == "production" else "DEBUG"
-)
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create clients and start background services; stop them on shutdown"""
+    try:
+        await init_database()
+        await load_active_medications()
+    except Exception as e:
+        logger.error("Failed to load dose schedules: {}", e)
+    
+    # Compile the drug interaction dataset before the first medication is added
+    try:
+        get_interaction_index()
+    except Exception as e:
+        logger.error("Failed to load drug interaction dataset: {}", e)
+    
+    # Keep per-process caches and indexes consistent across workers
+    if settings.WEB_CONCURRENCY > 1:
+        await invalidation_bus.start()
+    
+    # Build the agent off the event loop so the first chat request doesn't pay for it
+    if settings.GROQ_API_KEY:
+        asyncio.create_task(asyncio.to_thread(get_medical_agent))
+    
+    scheduler_task = asyncio.create_task(dose_scheduler.run())
+    heartbeat_task = asyncio.create_task(connection_manager.heartbeat())
+    # Create upcoming months' health metric partitions (also registers the archival job)
+    partitions_task = asyncio.create_task(metric_partitions.maintain())
+    # Purge deletions older than incremental sync cursors may reach
+    tombstones_task = asyncio.create_task(sync.maintain())
+    await job_queue.start()
+    
+    yield
+    
+    # Let running jobs finish (queued ones stay in the jobs table for the next start)
+    await job_queue.stop(settings.JOB_DRAIN_SECONDS)
+    
+    for task in (scheduler_task, heartbeat_task, partitions_task, tombstones_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    await invalidation_bus.stop()
+    
+    # Flush log lines still queued for the background writer
+    shutdown_logging()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -26,9 +84,16 @@ app = FastAPI(
     description="AI-powered medical management system",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Flag responses served from stale cache entries while the database is unavailable
+app.add_middleware(StaleDataMiddleware)
+
+# Compress large responses for clients that accept it
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -38,12 +103,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request ids for log lines (outermost, so every log line in a request has one)
+app.add_middleware(RequestIdMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_PREFIX}/auth", tags=["Authentication"])
 app.include_router(medications.router, prefix=f"{settings.API_V1_PREFIX}/medications", tags=["Medications"])
 app.include_router(appointments.router, prefix=f"{settings.API_V1_PREFIX}/appointments", tags=["Appointments"])
 app.include_router(health_metrics.router, prefix=f"{settings.API_V1_PREFIX}/health-metrics", tags=["Health Metrics"])
 app.include_router(chat.router, prefix=f"{settings.API_V1_PREFIX}/chat", tags=["AI Chat"])
+app.include_router(dashboard.router, prefix=f"{settings.API_V1_PREFIX}/dashboard", tags=["Dashboard"])
+app.include_router(search.router, prefix=f"{settings.API_V1_PREFIX}/search", tags=["Search"])
+app.include_router(documents.router, prefix=f"{settings.API_V1_PREFIX}/documents", tags=["Documents"])
+app.include_router(jobs.router, prefix=f"{settings.API_V1_PREFIX}/jobs", tags=["Jobs"])
+app.include_router(cohorts.router, prefix=f"{settings.API_V1_PREFIX}/admin/cohorts", tags=["Cohort Analytics"])
+app.include_router(admin.router, prefix=f"{settings.API_V1_PREFIX}/admin", tags=["Admin"])
+app.include_router(live.router, prefix=settings.API_V1_PREFIX, tags=["Live Updates"])
 
 @app.get("/")
 async def root():
@@ -63,10 +138,30 @@ async def health_check():
         "environment": settings.ENVIRONMENT
     }
 
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request, exc):
+    """The database is down or too slow: ask clients to retry instead of failing"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(StarletteHTTPException)
+async def database_error_handler(request, exc):
+    """Routes answer failed database calls with 500; make it 503 when the database was unavailable"""
+    if exc.status_code == 500:
+        cause = exc.__cause__ or exc.__context__
+        while cause is not None and not isinstance(cause, DatabaseUnavailable):
+            cause = cause.__cause__ or cause.__context__
+        if cause is not None:
+            return await database_unavailable_handler(request, cause)
+    return await http_exception_handler(request, exc)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
-    logger.error(f"Unhandled exception: {exc}")
+    logger.error("Unhandled exception: {}", exc)
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
@@ -78,5 +173,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG
+        workers=settings.WEB_CONCURRENCY,
+        # uvicorn cannot combine reload with multiple workers
+        reload=settings.DEBUG and settings.WEB_CONCURRENCY == 1
     )
@@ -0,0 +1,36 @@
+-- Migration 001: dose event log and per-medication adherence bitmaps
+-- Run this in your Supabase SQL Editor on databases created before this change
+
+CREATE TABLE IF NOT EXISTS dose_events (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    medication_id UUID NOT NULL REFERENCES medications(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('taken', 'missed')),
+    scheduled_for TIMESTAMP NOT NULL,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS medication_adherence (
+    medication_id UUID PRIMARY KEY REFERENCES medications(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    origin DATE NOT NULL,
+    slots_per_day SMALLINT NOT NULL,
+    every_days SMALLINT NOT NULL DEFAULT 1,
+    taken TEXT NOT NULL DEFAULT '',
+    missed TEXT NOT NULL DEFAULT '',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_dose_events_medication_id ON dose_events(medication_id, recorded_at);
+
+CREATE TRIGGER update_medication_adherence_updated_at BEFORE UPDATE ON medication_adherence
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE dose_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE medication_adherence ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own dose events" ON dose_events
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own medication adherence" ON medication_adherence
+    FOR ALL USING (auth.uid()::text = user_id::text);
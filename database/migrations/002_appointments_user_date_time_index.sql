@@ -0,0 +1,4 @@
+-- Migration 002: composite index for per-user appointment range queries
+-- Serves GET /appointments?from=&to= (user_id = ? AND date_time range, ordered by date_time)
+
+CREATE INDEX IF NOT EXISTS idx_appointments_user_date_time ON appointments(user_id, date_time);
@@ -0,0 +1,40 @@
+-- Migration 003: running health metric statistics and alerts
+-- Run this in your Supabase SQL Editor on databases created before this change
+
+CREATE TABLE IF NOT EXISTS metric_stats (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric_type VARCHAR(50) NOT NULL,
+    state DOUBLE PRECISION[] NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, metric_type)
+);
+
+CREATE TABLE IF NOT EXISTS health_alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric_id UUID NOT NULL REFERENCES health_metrics(id) ON DELETE CASCADE,
+    metric_type VARCHAR(50) NOT NULL,
+    channel VARCHAR(50) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    severity VARCHAR(20) NOT NULL CHECK (severity IN ('warning', 'critical')),
+    reason VARCHAR(20) NOT NULL CHECK (reason IN ('threshold', 'unusual')),
+    message TEXT NOT NULL,
+    z_score REAL,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    acknowledged BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_health_alerts_user_id ON health_alerts(user_id, created_at DESC);
+
+CREATE TRIGGER update_metric_stats_updated_at BEFORE UPDATE ON metric_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE metric_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_alerts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own metric stats" ON metric_stats
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own health alerts" ON health_alerts
+    FOR ALL USING (auth.uid()::text = user_id::text);
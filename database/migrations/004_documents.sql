@@ -0,0 +1,29 @@
+-- Migration 004: uploaded documents
+-- Run this in your Supabase SQL Editor on databases created before this change
+
+CREATE TABLE IF NOT EXISTS documents (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    title VARCHAR(255) NOT NULL,
+    category VARCHAR(20) NOT NULL DEFAULT 'other'
+        CHECK (category IN ('prescription', 'lab_report', 'imaging', 'insurance', 'other')),
+    filename VARCHAR(255) NOT NULL,
+    content_type VARCHAR(255) NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (user_id, sha256)
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents(sha256);
+
+CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own documents" ON documents
+    FOR ALL USING (auth.uid()::text = user_id::text);
@@ -0,0 +1,85 @@
+-- Migration 006: cohort analytics for clinic administrators
+-- Run this in your Supabase SQL Editor on databases created before this change.
+-- Adding the stored columns rewrites health_metrics; on large tables run it
+-- in a quiet period.
+
+-- Make an administrator with: UPDATE users SET is_admin = TRUE WHERE email = '...';
+ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- The n-th number in a reading's text ("120/80" -> 120, 80), like parse_channels in app/services/anomaly.py
+CREATE OR REPLACE FUNCTION reading_number(p_value TEXT, p_position INTEGER)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT number[1]::DOUBLE PRECISION
+    FROM regexp_matches(p_value, '-?\d{1,300}(?:\.\d+)?', 'g') WITH ORDINALITY AS numbers(number, n)
+    WHERE n = p_position
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Readings parsed once, at write time, in threshold units (mg/dL, °C):
+-- primary_value is the first number (systolic for blood pressure), secondary_value the diastolic
+ALTER TABLE health_metrics ADD COLUMN IF NOT EXISTS primary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+    CASE
+        WHEN metric_type = 'blood_pressure' AND reading_number(value, 2) IS NULL THEN NULL
+        WHEN metric_type = 'blood_sugar' AND lower(unit) LIKE '%mmol%' THEN reading_number(value, 1) * 18
+        WHEN metric_type = 'temperature' AND (replace(lower(unit), '°', '') LIKE '%f%' OR reading_number(value, 1) > 45)
+            THEN (reading_number(value, 1) - 32) * 5 / 9
+        ELSE reading_number(value, 1)
+    END
+) STORED;
+
+ALTER TABLE health_metrics ADD COLUMN IF NOT EXISTS secondary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+    CASE WHEN metric_type = 'blood_pressure' THEN reading_number(value, 2) END
+) STORED;
+
+-- Covers the cohort scans, so they read the index only
+CREATE INDEX IF NOT EXISTS idx_health_metrics_type_recorded_at
+    ON health_metrics(metric_type, recorded_at) INCLUDE (user_id, primary_value, secondary_value);
+
+-- Of the patients with readings in [p_from, p_to), how many have a mean at or above p_threshold
+CREATE OR REPLACE FUNCTION cohort_threshold_share(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_threshold DOUBLE PRECISION,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (patients BIGINT, patients_above BIGINT, readings BIGINT) AS $$
+    SELECT count(*), count(*) FILTER (WHERE mean >= p_threshold), coalesce(sum(n), 0)::BIGINT
+    FROM (
+        SELECT avg(v) AS mean, count(*) AS n
+        FROM (
+            SELECT user_id, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+            FROM health_metrics
+            WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+        ) channel_readings
+        WHERE v IS NOT NULL
+        GROUP BY user_id
+    ) patient_means
+$$ LANGUAGE sql STABLE;
+
+-- Readings and their sum per week (Monday, UTC) and histogram bucket; as width_bucket,
+-- bucket 0 is below p_low and p_buckets + 1 at or above p_high
+CREATE OR REPLACE FUNCTION cohort_weekly_histogram(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_low DOUBLE PRECISION,
+    p_high DOUBLE PRECISION,
+    p_buckets INTEGER,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (week DATE, bucket INTEGER, readings BIGINT, total DOUBLE PRECISION) AS $$
+    SELECT date_trunc('week', recorded_at AT TIME ZONE 'UTC')::DATE, width_bucket(v, p_low, p_high, p_buckets), count(*), sum(v)
+    FROM (
+        SELECT recorded_at, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+        FROM health_metrics
+        WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+    ) channel_readings
+    WHERE v IS NOT NULL
+    GROUP BY 1, 2
+$$ LANGUAGE sql STABLE;
+
+-- Population data: only the backend (service role) may call these
+REVOKE EXECUTE ON FUNCTION cohort_threshold_share(TEXT, INTEGER, DOUBLE PRECISION, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION cohort_threshold_share(TEXT, INTEGER, DOUBLE PRECISION, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+GRANT EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
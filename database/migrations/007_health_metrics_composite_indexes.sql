@@ -0,0 +1,18 @@
+-- Migration 007: composite indexes for per-user health metric queries
+-- Run this in your Supabase SQL Editor on databases created before this change.
+-- Serves, without a sort step:
+--   GET /health-metrics?metric_type=&from=&to=, the dashboard's latest reading per type
+--   and the agent's trend and anomaly history (user_id = ? AND metric_type = ?, recorded_at range, newest first)
+--   GET /health-metrics?from=&to= and the notes index (user_id = ?, recorded_at range, newest first)
+
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_type_recorded_at
+    ON health_metrics(user_id, metric_type, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_recorded_at
+    ON health_metrics(user_id, recorded_at DESC);
+
+-- Leading columns of the indexes above and of idx_health_metrics_type_recorded_at;
+-- they only cost writes now
+DROP INDEX IF EXISTS idx_health_metrics_user_id;
+DROP INDEX IF EXISTS idx_health_metrics_type;
+
+ANALYZE health_metrics;
@@ -0,0 +1,181 @@
+-- Migration 008: monthly partitions for health_metrics, and archival of old months
+-- Run this in your Supabase SQL Editor on databases created before this change.
+-- It copies health_metrics into a partitioned table, so writes to it are
+-- blocked until it finishes; run it in a quiet period.
+--
+-- Partitions are named health_metrics_YYYY_MM and hold the readings recorded
+-- in that month (UTC). The backend creates upcoming months' partitions daily
+-- (ensure_health_metrics_partitions); readings with no partition yet land in
+-- health_metrics_default and move when their month's partition is created.
+-- The archive_health_metrics job writes months past the retention window to
+-- columnar files and drops their partitions (drop_health_metrics_partition).
+
+BEGIN;
+
+-- A foreign key to a partitioned table must include the partition key; the
+-- backend deletes a reading's alerts itself, and alerts outlive archived readings
+ALTER TABLE health_alerts DROP CONSTRAINT IF EXISTS health_alerts_metric_id_fkey;
+
+ALTER TABLE health_metrics RENAME TO health_metrics_unpartitioned;
+ALTER TABLE health_metrics_unpartitioned RENAME CONSTRAINT health_metrics_pkey TO health_metrics_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_health_metrics_user_type_recorded_at;
+DROP INDEX IF EXISTS idx_health_metrics_user_recorded_at;
+DROP INDEX IF EXISTS idx_health_metrics_recorded_at;
+DROP INDEX IF EXISTS idx_health_metrics_type_recorded_at;
+
+CREATE TABLE health_metrics (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric_type VARCHAR(50) NOT NULL,
+    value VARCHAR(100) NOT NULL,
+    unit VARCHAR(50) NOT NULL,
+    notes TEXT,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    primary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+        CASE
+            WHEN metric_type = 'blood_pressure' AND reading_number(value, 2) IS NULL THEN NULL
+            WHEN metric_type = 'blood_sugar' AND lower(unit) LIKE '%mmol%' THEN reading_number(value, 1) * 18
+            WHEN metric_type = 'temperature' AND (replace(lower(unit), '°', '') LIKE '%f%' OR reading_number(value, 1) > 45)
+                THEN (reading_number(value, 1) - 32) * 5 / 9
+            ELSE reading_number(value, 1)
+        END
+    ) STORED,
+    secondary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+        CASE WHEN metric_type = 'blood_pressure' THEN reading_number(value, 2) END
+    ) STORED,
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE health_metrics_default PARTITION OF health_metrics DEFAULT;
+
+CREATE INDEX idx_health_metrics_user_type_recorded_at ON health_metrics(user_id, metric_type, recorded_at DESC);
+CREATE INDEX idx_health_metrics_user_recorded_at ON health_metrics(user_id, recorded_at DESC);
+CREATE INDEX idx_health_metrics_recorded_at ON health_metrics(recorded_at);
+CREATE INDEX idx_health_metrics_type_recorded_at
+    ON health_metrics(metric_type, recorded_at) INCLUDE (user_id, primary_value, secondary_value);
+
+-- Creates the partition for p_month's month, moving in rows the default partition holds for it
+CREATE OR REPLACE FUNCTION create_health_metrics_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_from TIMESTAMP WITH TIME ZONE := date_trunc('month', p_month::TIMESTAMP) AT TIME ZONE 'UTC';
+    v_to TIMESTAMP WITH TIME ZONE := (date_trunc('month', p_month::TIMESTAMP) + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    v_name TEXT := 'health_metrics_' || to_char(p_month, 'YYYY_MM');
+    v_moving BOOLEAN;
+BEGIN
+    -- Workers run this concurrently; one at a time creates a partition
+    PERFORM pg_advisory_xact_lock(hashtext('health_metrics_partitions'));
+    IF to_regclass('public.' || v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    -- A partition can't be created over rows the default partition holds for its range
+    v_moving := EXISTS (SELECT 1 FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to);
+    IF v_moving THEN
+        DROP TABLE IF EXISTS pg_temp.health_metrics_moving;
+        CREATE TEMP TABLE health_metrics_moving ON COMMIT DROP AS
+            SELECT id, user_id, metric_type, value, unit, notes, recorded_at, created_at
+            FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+        DELETE FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF health_metrics FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+    -- API users read partitions only through health_metrics and its policies
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', v_name);
+    EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', v_name);
+
+    IF v_moving THEN
+        INSERT INTO health_metrics (id, user_id, metric_type, value, unit, notes, recorded_at, created_at)
+            SELECT * FROM health_metrics_moving;
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- This month's partition and the next p_months_ahead
+CREATE OR REPLACE FUNCTION ensure_health_metrics_partitions(p_months_ahead INTEGER)
+RETURNS SETOF TEXT AS $$
+    SELECT create_health_metrics_partition((date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => n))::DATE)
+    FROM generate_series(0, p_months_ahead) AS n
+$$ LANGUAGE sql;
+
+-- Monthly partitions, oldest first, with the planner's row estimate
+CREATE OR REPLACE FUNCTION health_metrics_partitions()
+RETURNS TABLE (name TEXT, month DATE, estimated_rows BIGINT) AS $$
+    SELECT c.relname::TEXT, to_date(right(c.relname, 7), 'YYYY_MM'), greatest(c.reltuples, 0)::BIGINT
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.health_metrics'::regclass AND c.relname ~ '^health_metrics_\d{4}_\d{2}$'
+    ORDER BY 2
+$$ LANGUAGE sql STABLE;
+
+-- Drops an archived month's partition, as long as it still holds exactly the rows archived
+CREATE OR REPLACE FUNCTION drop_health_metrics_partition(p_month DATE, p_archived_rows BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    v_name TEXT := 'health_metrics_' || to_char(p_month, 'YYYY_MM');
+    v_rows BIGINT;
+BEGIN
+    IF to_regclass('public.' || v_name) IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- No writes to the month between counting and dropping it
+    EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_name);
+    EXECUTE format('SELECT count(*) FROM %I', v_name) INTO v_rows;
+    IF v_rows <> p_archived_rows THEN
+        RAISE EXCEPTION '% has % rows but % were archived', v_name, v_rows, p_archived_rows;
+    END IF;
+
+    EXECUTE format('ALTER TABLE health_metrics DETACH PARTITION %I', v_name);
+    EXECUTE format('DROP TABLE %I', v_name);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for every month with readings, then the readings
+SELECT create_health_metrics_partition(month::DATE)
+FROM (SELECT DISTINCT date_trunc('month', recorded_at AT TIME ZONE 'UTC') AS month FROM health_metrics_unpartitioned) months;
+SELECT ensure_health_metrics_partitions(3);
+
+INSERT INTO health_metrics (id, user_id, metric_type, value, unit, notes, recorded_at, created_at)
+    SELECT id, user_id, metric_type, value, unit, notes, recorded_at, created_at FROM health_metrics_unpartitioned;
+DROP TABLE health_metrics_unpartitioned;
+
+ALTER TABLE health_metrics ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_metrics_default ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON health_metrics_default FROM anon, authenticated;
+
+CREATE POLICY "Users can view own health metrics" ON health_metrics
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+-- Per-patient sums for threshold shares that also cover archived months (app/services/cohorts.py)
+CREATE OR REPLACE FUNCTION cohort_patient_sums(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (user_id UUID, readings BIGINT, total DOUBLE PRECISION) AS $$
+    SELECT user_id, count(*), sum(v)
+    FROM (
+        SELECT user_id, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+        FROM health_metrics
+        WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+    ) channel_readings
+    WHERE v IS NOT NULL
+    GROUP BY user_id
+$$ LANGUAGE sql STABLE;
+
+-- Partition management and population data: only the backend (service role) may call these
+REVOKE EXECUTE ON FUNCTION create_health_metrics_partition(DATE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ensure_health_metrics_partitions(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION health_metrics_partitions() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_health_metrics_partition(DATE, BIGINT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION cohort_patient_sums(TEXT, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_health_metrics_partition(DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION ensure_health_metrics_partitions(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION health_metrics_partitions() TO service_role;
+GRANT EXECUTE ON FUNCTION drop_health_metrics_partition(DATE, BIGINT) TO service_role;
+GRANT EXECUTE ON FUNCTION cohort_patient_sums(TEXT, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+
+COMMIT;
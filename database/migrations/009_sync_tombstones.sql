@@ -0,0 +1,110 @@
+-- Migration 009: incremental sync (GET /medications/sync, /appointments/sync, /health-metrics/sync)
+-- Run this in your Supabase SQL Editor on databases created before this change.
+--
+-- Deleted rows leave a tombstone, so clients syncing since a cursor learn
+-- which rows to drop. The backend purges tombstones older than
+-- SYNC_TOMBSTONE_DAYS (purge_sync_tombstones); older cursors sync from scratch.
+
+BEGIN;
+
+-- No foreign key to users: a deleted account's tombstones are purged with the rest
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    user_id UUID NOT NULL,
+    resource VARCHAR(50) NOT NULL,  -- medications, appointments or health_metrics
+    record_id UUID NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user_resource ON sync_tombstones(user_id, resource, deleted_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+-- Rows changed since a cursor, in keyset order
+CREATE INDEX IF NOT EXISTS idx_medications_user_updated_at ON medications(user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_user_updated_at ON appointments(user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_created_at ON health_metrics(user_id, created_at, id);
+
+-- The resource is the trigger's argument: on a partitioned table TG_TABLE_NAME is the partition's.
+-- Security definer, so a delete allowed by a table's policies can always write its tombstone.
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Rows moved between health_metrics partitions are not deleted
+    IF current_setting('app.moving_rows', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO sync_tombstones (user_id, resource, record_id) VALUES (OLD.user_id, TG_ARGV[0], OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS record_medications_sync_tombstone ON medications;
+CREATE TRIGGER record_medications_sync_tombstone AFTER DELETE ON medications
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('medications');
+
+DROP TRIGGER IF EXISTS record_appointments_sync_tombstone ON appointments;
+CREATE TRIGGER record_appointments_sync_tombstone AFTER DELETE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('appointments');
+
+-- On the partitioned table, so partitions created later get it too
+DROP TRIGGER IF EXISTS record_health_metrics_sync_tombstone ON health_metrics;
+CREATE TRIGGER record_health_metrics_sync_tombstone AFTER DELETE ON health_metrics
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('health_metrics');
+
+-- Moving rows out of the default partition must not leave tombstones
+CREATE OR REPLACE FUNCTION create_health_metrics_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_from TIMESTAMP WITH TIME ZONE := date_trunc('month', p_month::TIMESTAMP) AT TIME ZONE 'UTC';
+    v_to TIMESTAMP WITH TIME ZONE := (date_trunc('month', p_month::TIMESTAMP) + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    v_name TEXT := 'health_metrics_' || to_char(p_month, 'YYYY_MM');
+    v_moving BOOLEAN;
+BEGIN
+    -- Workers run this concurrently; one at a time creates a partition
+    PERFORM pg_advisory_xact_lock(hashtext('health_metrics_partitions'));
+    IF to_regclass('public.' || v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    -- A partition can't be created over rows the default partition holds for its range
+    v_moving := EXISTS (SELECT 1 FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to);
+    IF v_moving THEN
+        DROP TABLE IF EXISTS pg_temp.health_metrics_moving;
+        CREATE TEMP TABLE health_metrics_moving ON COMMIT DROP AS
+            SELECT id, user_id, metric_type, value, unit, notes, recorded_at, created_at
+            FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+        PERFORM set_config('app.moving_rows', 'on', true);
+        DELETE FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+        PERFORM set_config('app.moving_rows', 'off', true);
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF health_metrics FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+    -- API users read partitions only through health_metrics and its policies
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', v_name);
+    EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', v_name);
+
+    IF v_moving THEN
+        INSERT INTO health_metrics (id, user_id, metric_type, value, unit, notes, recorded_at, created_at)
+            SELECT * FROM health_metrics_moving;
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deletes tombstones older than p_days; returns how many
+CREATE OR REPLACE FUNCTION purge_sync_tombstones(p_days INTEGER)
+RETURNS BIGINT AS $$
+    WITH purged AS (
+        DELETE FROM sync_tombstones WHERE deleted_at < now() - make_interval(days => p_days) RETURNING 1
+    )
+    SELECT count(*) FROM purged
+$$ LANGUAGE sql;
+
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own sync tombstones" ON sync_tombstones
+    FOR SELECT USING (auth.uid()::text = user_id::text);
+
+REVOKE EXECUTE ON FUNCTION purge_sync_tombstones(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION purge_sync_tombstones(INTEGER) TO service_role;
+
+COMMIT;
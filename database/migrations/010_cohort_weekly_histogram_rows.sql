@@ -0,0 +1,42 @@
+-- Migration 010: one cohort_weekly_histogram row per week
+-- Run this in your Supabase SQL Editor on databases created before this change.
+--
+-- The function returned a row per (week, bucket), which passes PostgREST's
+-- max-rows (1000 by default) within a few weeks of blood pressure readings,
+-- silently dropping histogram cells. It now returns a row per week with the
+-- week's non-empty buckets as arrays. Its result type changes, so it is
+-- dropped and created again.
+
+BEGIN;
+
+DROP FUNCTION IF EXISTS cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+
+CREATE FUNCTION cohort_weekly_histogram(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_low DOUBLE PRECISION,
+    p_high DOUBLE PRECISION,
+    p_buckets INTEGER,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (week DATE, buckets INTEGER[], counts BIGINT[], readings BIGINT, total DOUBLE PRECISION) AS $$
+    SELECT week, array_agg(bucket ORDER BY bucket), array_agg(n ORDER BY bucket), sum(n)::BIGINT, sum(s)
+    FROM (
+        SELECT date_trunc('week', recorded_at AT TIME ZONE 'UTC')::DATE AS week,
+            width_bucket(v, p_low, p_high, p_buckets) AS bucket, count(*) AS n, sum(v) AS s
+        FROM (
+            SELECT recorded_at, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+            FROM health_metrics
+            WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+        ) channel_readings
+        WHERE v IS NOT NULL
+        GROUP BY 1, 2
+    ) cells
+    GROUP BY week
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+
+COMMIT;
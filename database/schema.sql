@@ -4,12 +4,21 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- The n-th number in a reading's text ("120/80" -> 120, 80), like parse_channels in app/services/anomaly.py
+CREATE OR REPLACE FUNCTION reading_number(p_value TEXT, p_position INTEGER)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT number[1]::DOUBLE PRECISION
+    FROM regexp_matches(p_value, '-?\d{1,300}(?:\.\d+)?', 'g') WITH ORDINALITY AS numbers(number, n)
+    WHERE n = p_position
+$$ LANGUAGE sql IMMUTABLE;
+
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     email VARCHAR(255) UNIQUE NOT NULL,
     name VARCHAR(255) NOT NULL,
     password VARCHAR(255) NOT NULL,
+    is_admin BOOLEAN NOT NULL DEFAULT FALSE, -- Clinic administrator (cohort analytics)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -43,18 +52,134 @@ CREATE TABLE IF NOT EXISTS appointments (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Health Metrics table
+-- Health Metrics table, partitioned by month of recorded_at (UTC) into
+-- health_metrics_YYYY_MM; see the partition functions below
 CREATE TABLE IF NOT EXISTS health_metrics (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     metric_type VARCHAR(50) NOT NULL,
     value VARCHAR(100) NOT NULL,
     unit VARCHAR(50) NOT NULL,
     notes TEXT,
     recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- Parsed at write time in threshold units (mg/dL, °C): the first number
+    -- (systolic for blood pressure) and the second (diastolic)
+    primary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+        CASE
+            WHEN metric_type = 'blood_pressure' AND reading_number(value, 2) IS NULL THEN NULL
+            WHEN metric_type = 'blood_sugar' AND lower(unit) LIKE '%mmol%' THEN reading_number(value, 1) * 18
+            WHEN metric_type = 'temperature' AND (replace(lower(unit), '°', '') LIKE '%f%' OR reading_number(value, 1) > 45)
+                THEN (reading_number(value, 1) - 32) * 5 / 9
+            ELSE reading_number(value, 1)
+        END
+    ) STORED,
+    secondary_value DOUBLE PRECISION GENERATED ALWAYS AS (
+        CASE WHEN metric_type = 'blood_pressure' THEN reading_number(value, 2) END
+    ) STORED,
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+-- Readings whose month has no partition yet
+CREATE TABLE IF NOT EXISTS health_metrics_default PARTITION OF health_metrics DEFAULT;
+
+-- Dose Events table (append-only log of taken/missed doses)
+CREATE TABLE IF NOT EXISTS dose_events (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    medication_id UUID NOT NULL REFERENCES medications(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('taken', 'missed')),
+    scheduled_for TIMESTAMP NOT NULL,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Medication Adherence table (per-medication taken/missed bitmaps, hex encoded;
+-- bit i is the i-th scheduled dose since the medication's start date)
+CREATE TABLE IF NOT EXISTS medication_adherence (
+    medication_id UUID PRIMARY KEY REFERENCES medications(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    origin DATE NOT NULL,
+    slots_per_day SMALLINT NOT NULL,
+    every_days SMALLINT NOT NULL DEFAULT 1,
+    taken TEXT NOT NULL DEFAULT '',
+    missed TEXT NOT NULL DEFAULT '',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Metric Stats table (running statistics per user and metric type: for each
+-- channel, e.g. systolic/diastolic, [count, mean, M2, EWMA])
+CREATE TABLE IF NOT EXISTS metric_stats (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric_type VARCHAR(50) NOT NULL,
+    state DOUBLE PRECISION[] NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, metric_type)
+);
+
+-- Health Alerts table (readings flagged at write time)
+CREATE TABLE IF NOT EXISTS health_alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric_id UUID NOT NULL, -- health_metrics(id); kept when the reading is archived
+    metric_type VARCHAR(50) NOT NULL,
+    channel VARCHAR(50) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    severity VARCHAR(20) NOT NULL CHECK (severity IN ('warning', 'critical')),
+    reason VARCHAR(20) NOT NULL CHECK (reason IN ('threshold', 'unusual')),
+    message TEXT NOT NULL,
+    z_score REAL,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    acknowledged BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Documents (file content lives in DOCUMENT_STORAGE_DIR, addressed by sha256)
+CREATE TABLE IF NOT EXISTS documents (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    title VARCHAR(255) NOT NULL,
+    category VARCHAR(20) NOT NULL DEFAULT 'other'
+        CHECK (category IN ('prescription', 'lab_report', 'imaging', 'insurance', 'other')),
+    filename VARCHAR(255) NOT NULL,
+    content_type VARCHAR(255) NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (user_id, sha256)
+);
+
+-- Background jobs (run by the in-process job queue; see app/services/jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR(255),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Sync tombstones (deleted rows, for incremental sync; see app/services/sync.py).
+-- No foreign key to users: a deleted account's tombstones are purged with the rest
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    user_id UUID NOT NULL,
+    resource VARCHAR(50) NOT NULL,  -- medications, appointments or health_metrics
+    record_id UUID NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
 -- Chat Messages table (optional - for storing chat history)
 CREATE TABLE IF NOT EXISTS chat_messages (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -69,10 +194,196 @@ CREATE INDEX IF NOT EXISTS idx_medications_user_id ON medications(user_id);
 CREATE INDEX IF NOT EXISTS idx_medications_active ON medications(active);
 CREATE INDEX IF NOT EXISTS idx_appointments_user_id ON appointments(user_id);
 CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments(date_time);
-CREATE INDEX IF NOT EXISTS idx_health_metrics_user_id ON health_metrics(user_id);
-CREATE INDEX IF NOT EXISTS idx_health_metrics_type ON health_metrics(metric_type);
+CREATE INDEX IF NOT EXISTS idx_appointments_user_date_time ON appointments(user_id, date_time);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_type_recorded_at ON health_metrics(user_id, metric_type, recorded_at DESC);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_recorded_at ON health_metrics(user_id, recorded_at DESC);
 CREATE INDEX IF NOT EXISTS idx_health_metrics_recorded_at ON health_metrics(recorded_at);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_type_recorded_at
+    ON health_metrics(metric_type, recorded_at) INCLUDE (user_id, primary_value, secondary_value);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON chat_messages(user_id);
+CREATE INDEX IF NOT EXISTS idx_dose_events_medication_id ON dose_events(medication_id, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_health_alerts_user_id ON health_alerts(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents(sha256);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON jobs(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running_lease ON jobs(lease_expires_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_medications_user_updated_at ON medications(user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_appointments_user_updated_at ON appointments(user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_created_at ON health_metrics(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_user_resource ON sync_tombstones(user_id, resource, deleted_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+-- Cohort analytics (see app/services/cohorts.py)
+-- Of the patients with readings in [p_from, p_to), how many have a mean at or above p_threshold
+CREATE OR REPLACE FUNCTION cohort_threshold_share(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_threshold DOUBLE PRECISION,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (patients BIGINT, patients_above BIGINT, readings BIGINT) AS $$
+    SELECT count(*), count(*) FILTER (WHERE mean >= p_threshold), coalesce(sum(n), 0)::BIGINT
+    FROM (
+        SELECT avg(v) AS mean, count(*) AS n
+        FROM (
+            SELECT user_id, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+            FROM health_metrics
+            WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+        ) channel_readings
+        WHERE v IS NOT NULL
+        GROUP BY user_id
+    ) patient_means
+$$ LANGUAGE sql STABLE;
+
+-- Per week (Monday, UTC): the non-empty histogram buckets with their reading counts, and the week's
+-- readings and sum. As width_bucket, bucket 0 is below p_low and p_buckets + 1 at or above p_high.
+-- One row per week keeps any window the backend allows (260 weeks) under PostgREST's max-rows.
+CREATE OR REPLACE FUNCTION cohort_weekly_histogram(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_low DOUBLE PRECISION,
+    p_high DOUBLE PRECISION,
+    p_buckets INTEGER,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (week DATE, buckets INTEGER[], counts BIGINT[], readings BIGINT, total DOUBLE PRECISION) AS $$
+    SELECT week, array_agg(bucket ORDER BY bucket), array_agg(n ORDER BY bucket), sum(n)::BIGINT, sum(s)
+    FROM (
+        SELECT date_trunc('week', recorded_at AT TIME ZONE 'UTC')::DATE AS week,
+            width_bucket(v, p_low, p_high, p_buckets) AS bucket, count(*) AS n, sum(v) AS s
+        FROM (
+            SELECT recorded_at, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+            FROM health_metrics
+            WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+        ) channel_readings
+        WHERE v IS NOT NULL
+        GROUP BY 1, 2
+    ) cells
+    GROUP BY week
+$$ LANGUAGE sql STABLE;
+
+-- Per-patient sums, for threshold shares that also cover archived months
+CREATE OR REPLACE FUNCTION cohort_patient_sums(
+    p_metric_type TEXT,
+    p_channel INTEGER,
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (user_id UUID, readings BIGINT, total DOUBLE PRECISION) AS $$
+    SELECT user_id, count(*), sum(v)
+    FROM (
+        SELECT user_id, CASE WHEN p_channel = 2 THEN secondary_value ELSE primary_value END AS v
+        FROM health_metrics
+        WHERE metric_type = p_metric_type AND recorded_at >= p_from AND recorded_at < p_to
+    ) channel_readings
+    WHERE v IS NOT NULL
+    GROUP BY user_id
+$$ LANGUAGE sql STABLE;
+
+-- Population data: only the backend (service role) may call these
+REVOKE EXECUTE ON FUNCTION cohort_threshold_share(TEXT, INTEGER, DOUBLE PRECISION, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION cohort_threshold_share(TEXT, INTEGER, DOUBLE PRECISION, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+GRANT EXECUTE ON FUNCTION cohort_weekly_histogram(TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+REVOKE EXECUTE ON FUNCTION cohort_patient_sums(TEXT, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION cohort_patient_sums(TEXT, INTEGER, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+
+-- Monthly partitions of health_metrics (see app/services/metric_partitions.py)
+-- Creates the partition for p_month's month, moving in rows the default partition holds for it
+CREATE OR REPLACE FUNCTION create_health_metrics_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_from TIMESTAMP WITH TIME ZONE := date_trunc('month', p_month::TIMESTAMP) AT TIME ZONE 'UTC';
+    v_to TIMESTAMP WITH TIME ZONE := (date_trunc('month', p_month::TIMESTAMP) + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    v_name TEXT := 'health_metrics_' || to_char(p_month, 'YYYY_MM');
+    v_moving BOOLEAN;
+BEGIN
+    -- Workers run this concurrently; one at a time creates a partition
+    PERFORM pg_advisory_xact_lock(hashtext('health_metrics_partitions'));
+    IF to_regclass('public.' || v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    -- A partition can't be created over rows the default partition holds for its range
+    v_moving := EXISTS (SELECT 1 FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to);
+    IF v_moving THEN
+        DROP TABLE IF EXISTS pg_temp.health_metrics_moving;
+        CREATE TEMP TABLE health_metrics_moving ON COMMIT DROP AS
+            SELECT id, user_id, metric_type, value, unit, notes, recorded_at, created_at
+            FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+        -- Moved, not deleted: no sync tombstones
+        PERFORM set_config('app.moving_rows', 'on', true);
+        DELETE FROM health_metrics_default WHERE recorded_at >= v_from AND recorded_at < v_to;
+        PERFORM set_config('app.moving_rows', 'off', true);
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF health_metrics FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+    -- API users read partitions only through health_metrics and its policies
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', v_name);
+    EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', v_name);
+
+    IF v_moving THEN
+        INSERT INTO health_metrics (id, user_id, metric_type, value, unit, notes, recorded_at, created_at)
+            SELECT * FROM health_metrics_moving;
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- This month's partition and the next p_months_ahead
+CREATE OR REPLACE FUNCTION ensure_health_metrics_partitions(p_months_ahead INTEGER)
+RETURNS SETOF TEXT AS $$
+    SELECT create_health_metrics_partition((date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => n))::DATE)
+    FROM generate_series(0, p_months_ahead) AS n
+$$ LANGUAGE sql;
+
+-- Monthly partitions, oldest first, with the planner's row estimate
+CREATE OR REPLACE FUNCTION health_metrics_partitions()
+RETURNS TABLE (name TEXT, month DATE, estimated_rows BIGINT) AS $$
+    SELECT c.relname::TEXT, to_date(right(c.relname, 7), 'YYYY_MM'), greatest(c.reltuples, 0)::BIGINT
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.health_metrics'::regclass AND c.relname ~ '^health_metrics_\d{4}_\d{2}$'
+    ORDER BY 2
+$$ LANGUAGE sql STABLE;
+
+-- Drops an archived month's partition, as long as it still holds exactly the rows archived
+CREATE OR REPLACE FUNCTION drop_health_metrics_partition(p_month DATE, p_archived_rows BIGINT)
+RETURNS VOID AS $$
+DECLARE
+    v_name TEXT := 'health_metrics_' || to_char(p_month, 'YYYY_MM');
+    v_rows BIGINT;
+BEGIN
+    IF to_regclass('public.' || v_name) IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- No writes to the month between counting and dropping it
+    EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_name);
+    EXECUTE format('SELECT count(*) FROM %I', v_name) INTO v_rows;
+    IF v_rows <> p_archived_rows THEN
+        RAISE EXCEPTION '% has % rows but % were archived', v_name, v_rows, p_archived_rows;
+    END IF;
+
+    EXECUTE format('ALTER TABLE health_metrics DETACH PARTITION %I', v_name);
+    EXECUTE format('DROP TABLE %I', v_name);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only the backend (service role) manages partitions
+REVOKE EXECUTE ON FUNCTION create_health_metrics_partition(DATE) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION ensure_health_metrics_partitions(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION health_metrics_partitions() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_health_metrics_partition(DATE, BIGINT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_health_metrics_partition(DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION ensure_health_metrics_partitions(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION health_metrics_partitions() TO service_role;
+GRANT EXECUTE ON FUNCTION drop_health_metrics_partition(DATE, BIGINT) TO service_role;
+
+REVOKE ALL ON health_metrics_default FROM anon, authenticated;
+SELECT ensure_health_metrics_partitions(3);
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -93,12 +404,68 @@ CREATE TRIGGER update_medications_updated_at BEFORE UPDATE ON medications
 CREATE TRIGGER update_appointments_updated_at BEFORE UPDATE ON appointments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_medication_adherence_updated_at BEFORE UPDATE ON medication_adherence
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_metric_stats_updated_at BEFORE UPDATE ON metric_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_jobs_updated_at BEFORE UPDATE ON jobs
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Incremental sync: a tombstone per deleted row (the resource is the trigger's
+-- argument; on a partitioned table TG_TABLE_NAME is the partition's). Security
+-- definer, so a delete allowed by a table's policies can always write its tombstone.
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Rows moved between health_metrics partitions are not deleted
+    IF current_setting('app.moving_rows', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    INSERT INTO sync_tombstones (user_id, resource, record_id) VALUES (OLD.user_id, TG_ARGV[0], OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER record_medications_sync_tombstone AFTER DELETE ON medications
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('medications');
+
+CREATE TRIGGER record_appointments_sync_tombstone AFTER DELETE ON appointments
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('appointments');
+
+CREATE TRIGGER record_health_metrics_sync_tombstone AFTER DELETE ON health_metrics
+    FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('health_metrics');
+
+-- Deletes tombstones older than p_days; returns how many
+CREATE OR REPLACE FUNCTION purge_sync_tombstones(p_days INTEGER)
+RETURNS BIGINT AS $$
+    WITH purged AS (
+        DELETE FROM sync_tombstones WHERE deleted_at < now() - make_interval(days => p_days) RETURNING 1
+    )
+    SELECT count(*) FROM purged
+$$ LANGUAGE sql;
+
+REVOKE EXECUTE ON FUNCTION purge_sync_tombstones(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION purge_sync_tombstones(INTEGER) TO service_role;
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE medications ENABLE ROW LEVEL SECURITY;
 ALTER TABLE appointments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE health_metrics ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_metrics_default ENABLE ROW LEVEL SECURITY;
 ALTER TABLE chat_messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE dose_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE medication_adherence ENABLE ROW LEVEL SECURITY;
+ALTER TABLE metric_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_alerts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
+ALTER TABLE jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
 
 -- RLS Policies (users can only access their own data)
 CREATE POLICY "Users can view own data" ON users
@@ -115,3 +482,24 @@ CREATE POLICY "Users can view own health metrics" ON health_metrics
 
 CREATE POLICY "Users can view own chat messages" ON chat_messages
     FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own dose events" ON dose_events
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own medication adherence" ON medication_adherence
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own metric stats" ON metric_stats
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own health alerts" ON health_alerts
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own documents" ON documents
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own jobs" ON jobs
+    FOR ALL USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Users can view own sync tombstones" ON sync_tombstones
+    FOR SELECT USING (auth.uid()::text = user_id::text);
@@ -12,11 +12,13 @@ import {
   Plus,
   TrendingUp,
 } from 'lucide-react';
+import { connectLive, dashboardAPI } from '@/lib/api';
 
 export default function DashboardPage() {
   const router = useRouter();
   const [user, setUser] = useState<any>(null);
   const [loading, setLoading] = useState(true);
+  const [summary, setSummary] = useState<any>(null);
 
   useEffect(() => {
     // Check if user is logged in
@@ -30,6 +32,27 @@ export default function DashboardPage() {
 
     setUser(JSON.parse(userData));
     setLoading(false);
+
+    const loadSummary = () =>
+      dashboardAPI
+        .get()
+        .then((response) => setSummary(response.data))
+        .catch((error) => console.error('Failed to load dashboard:', error));
+    loadSummary();
+
+    // Refresh when something changes instead of polling; bursts trigger one reload
+    let reloadTimer: ReturnType<typeof setTimeout> | undefined;
+    const disconnect = connectLive((event) => {
+      if (['change', 'dose_due', 'resync'].includes(event.type)) {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(loadSummary, 300);
+      }
+    });
+
+    return () => {
+      clearTimeout(reloadTimer);
+      disconnect();
+    };
   }, [router]);
 
   const handleLogout = () => {
@@ -123,7 +146,9 @@ export default function DashboardPage() {
               <h3 className="text-lg font-semibold text-gray-900">Active Medications</h3>
               <Pill className="h-6 w-6 text-blue-600" />
             </div>
-            <p className="text-3xl font-bold text-gray-900 mb-2">0</p>
+            <p className="text-3xl font-bold text-gray-900 mb-2">
+              {summary?.active_medications.length ?? 0}
+            </p>
             <p className="text-sm text-gray-600">medications tracked</p>
             <Link
               href="/dashboard/medications"
@@ -140,7 +165,9 @@ export default function DashboardPage() {
               <h3 className="text-lg font-semibold text-gray-900">Upcoming Appointments</h3>
               <Calendar className="h-6 w-6 text-green-600" />
             </div>
-            <p className="text-3xl font-bold text-gray-900 mb-2">0</p>
+            <p className="text-3xl font-bold text-gray-900 mb-2">
+              {summary?.upcoming_appointments.length ?? 0}
+            </p>
             <p className="text-sm text-gray-600">appointments scheduled</p>
             <Link
               href="/dashboard/appointments"
@@ -157,7 +184,9 @@ export default function DashboardPage() {
               <h3 className="text-lg font-semibold text-gray-900">Health Metrics</h3>
               <TrendingUp className="h-6 w-6 text-purple-600" />
             </div>
-            <p className="text-3xl font-bold text-gray-900 mb-2">0</p>
+            <p className="text-3xl font-bold text-gray-900 mb-2">
+              {summary?.metrics_logged ?? 0}
+            </p>
             <p className="text-sm text-gray-600">metrics logged</p>
             <Link
               href="/dashboard/health-metrics"
@@ -52,9 +52,47 @@ export const healthMetricsAPI = {
   delete: (id: string) => api.delete(`/health-metrics/${id}`),
 };
 
+// Dashboard API
+export const dashboardAPI = {
+  get: (appointmentsLimit = 5) =>
+    api.get('/dashboard', { params: { appointments_limit: appointmentsLimit } }),
+};
+
 // Chat API
 export const chatAPI = {
   sendMessage: (message: string) => api.post('/chat', { message }),
 };
 
+// Live updates: pushes change, dose_due, heartbeat and resync events.
+// Reconnects with backoff; call the returned function to close.
+export const connectLive = (onEvent: (event: any) => void) => {
+  const url = `${API_URL.replace(/^http/, 'ws')}/api/v1/ws`;
+  let socket: WebSocket | null = null;
+  let retryDelay = 1000;
+  let retryTimer: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+
+  const open = () => {
+    const token = localStorage.getItem('token');
+    if (closed || !token) return;
+    socket = new WebSocket(`${url}?token=${encodeURIComponent(token)}`);
+    socket.onopen = () => {
+      retryDelay = 1000;
+    };
+    socket.onmessage = (message) => onEvent(JSON.parse(message.data));
+    socket.onclose = () => {
+      if (closed) return;
+      retryTimer = setTimeout(open, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    };
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    socket?.close();
+  };
+};
+
 export default api;